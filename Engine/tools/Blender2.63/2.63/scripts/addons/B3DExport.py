@@ -51,7 +51,7 @@ bl_info = {
 #If you get an error here, it might be
 #because you don't have Python installed.
 import bpy
-import sys,os,os.path,struct,math,string
+import sys,os,os.path,struct,math,string,array
 import mathutils
 import math
 
@@ -63,9 +63,9 @@ b3d_parameters = {}
 texture_flags  = []
 texs_stack     = {}
 brus_stack     = []
-vertex_groups  = []
+vertex_groups  = {}
 bone_stack     = {}
-keys_stack     = []
+keys_stack     = {}
 
 texture_count = 0
 
@@ -140,9 +140,9 @@ def write_b3d_file(filename, objects=[]):
     texture_flags = []
     texs_stack = {}
     brus_stack = []
-    vertex_groups = []
+    vertex_groups = {}
     bone_stack = []
-    keys_stack = []
+    keys_stack = {}
     trimmed_paths = {}
     file_buf = bytearray()
     temp_buf = bytearray()
@@ -546,7 +546,7 @@ def write_node(objects=[]):
             if DEBUG: print("    <mesh name=",obj.name,">")
             
             bone_stack = {}
-            keys_stack = []
+            keys_stack = {}
 
             anim_data = None
             
@@ -744,81 +744,78 @@ def write_node(objects=[]):
                         
                         #bone_matrix = bpy.data.scenes[0].objects[0].pose.bones['Bone'].matrix
                         
-                        for ibone in bone_stack:
+                        bone = bone_stack.get(bone_name)
+                        if bone:
                             
-                            bone = bone_stack[ibone]
+                            if DEBUG: print("            <bone name=",bone_name,">")
                             
-                            if bone[BONE_ITSELF].name == bone_name:
-                                
-                                if DEBUG: print("            <bone id=",ibone,"name=",bone_name,">")
-                                
-                                # == 2.4 exporter ==
-                                #if bone_stack[ibone][1]:
-                                #    par_matrix = Blender.Mathutils.Matrix(arm_pose.bones[bone_stack[ibone][1].name].poseMatrix)
-                                #    bone_matrix *= par_matrix.invert()
-                                #else:
-                                #    if b3d_parameters.get("local-space"):
-                                #        bone_matrix *= TRANS_MATRIX
-                                #    else:
-                                #        bone_matrix *= arm_matrix
-                                #bone_loc = bone_matrix.translationPart()
-                                #bone_rot = bone_matrix.rotationPart().toQuat()
-                                #bone_rot.normalize()
-                                #bone_sca = bone_matrix.scalePart()
-                                #keys_stack.append([frame_count - first_frame.val+1,bone_name,bone_loc,bone_sca,bone_rot])
-                                
-                                # if has parent
-                                if bone[BONE_PARENT]:
-                                    par_matrix = mathutils.Matrix(arm_pose.bones[bone[BONE_PARENT].name].matrix)
-                                    bone_matrix = par_matrix.inverted()*bone_matrix
+                            # == 2.4 exporter ==
+                            #if bone_stack[ibone][1]:
+                            #    par_matrix = Blender.Mathutils.Matrix(arm_pose.bones[bone_stack[ibone][1].name].poseMatrix)
+                            #    bone_matrix *= par_matrix.invert()
+                            #else:
+                            #    if b3d_parameters.get("local-space"):
+                            #        bone_matrix *= TRANS_MATRIX
+                            #    else:
+                            #        bone_matrix *= arm_matrix
+                            #bone_loc = bone_matrix.translationPart()
+                            #bone_rot = bone_matrix.rotationPart().toQuat()
+                            #bone_rot.normalize()
+                            #bone_sca = bone_matrix.scalePart()
+                            #keys_stack.append([frame_count - first_frame.val+1,bone_name,bone_loc,bone_sca,bone_rot])
+                            
+                            # if has parent
+                            if bone[BONE_PARENT]:
+                                par_matrix = mathutils.Matrix(arm_pose.bones[bone[BONE_PARENT].name].matrix)
+                                bone_matrix = par_matrix.inverted()*bone_matrix
+                            else:
+                                if b3d_parameters.get("local-space"):
+                                    bone_matrix = bone_matrix*mathutils.Matrix([[-1,0,0,0],[0,0,1,0],[0,1,0,0],[0,0,0,1]])
                                 else:
-                                    if b3d_parameters.get("local-space"):
-                                        bone_matrix = bone_matrix*mathutils.Matrix([[-1,0,0,0],[0,0,1,0],[0,1,0,0],[0,0,0,1]])
-                                    else:
-                                        
-                                        #if frame_count == 1:
-                                        #    print("====",bone_name,"====")
-                                        #    print("arm_matrix = ", arm_matrix)
-                                        #    print("bone_matrix = ", bone_matrix)
-                                        
-                                        bone_matrix = arm_matrix*bone_matrix
-                                        
-                                        #if frame_count == 1:
-                                        #    print("arm_matrix*bone_matrix", bone_matrix)
-                                        
+                                    
+                                    #if frame_count == 1:
+                                    #    print("====",bone_name,"====")
+                                    #    print("arm_matrix = ", arm_matrix)
+                                    #    print("bone_matrix = ", bone_matrix)
+                                    
+                                    bone_matrix = arm_matrix*bone_matrix
+                                    
+                                    #if frame_count == 1:
+                                    #    print("arm_matrix*bone_matrix", bone_matrix)
+                                    
+                            
+                            #print("bone_matrix =", bone_matrix)
+                            
+                            bone_sca = bone_matrix.to_scale()
+                            bone_loc = bone_matrix.to_translation()
+                            
+                            # FIXME: silly tweaks to resemble the Blender 2.4 exporter output
+                            if b3d_parameters.get("local-space"):
                                 
-                                #print("bone_matrix =", bone_matrix)
+                                bone_rot = bone_matrix.to_quaternion()
+                                bone_rot.normalize()
                                 
-                                bone_sca = bone_matrix.to_scale()
-                                bone_loc = bone_matrix.to_translation()
                                 
-                                # FIXME: silly tweaks to resemble the Blender 2.4 exporter output
-                                if b3d_parameters.get("local-space"):
-                                    
-                                    bone_rot = bone_matrix.to_quaternion()
-                                    bone_rot.normalize()
+                                if not bone[BONE_PARENT]:
+                                    tmp = bone_rot.z
+                                    bone_rot.z = bone_rot.y
+                                    bone_rot.y = tmp
                                     
-                                    
-                                    if not bone[BONE_PARENT]:
-                                        tmp = bone_rot.z
-                                        bone_rot.z = bone_rot.y
-                                        bone_rot.y = tmp
-                                        
-                                        bone_rot.x = -bone_rot.x
-                                    else:
-                                        tmp = bone_loc.z
-                                        bone_loc.z = bone_loc.y
-                                        bone_loc.y = tmp
-
+                                    bone_rot.x = -bone_rot.x
                                 else:
-                                    bone_rot = bone_matrix.to_quaternion()
-                                    bone_rot.normalize()
+                                    tmp = bone_loc.z
+                                    bone_loc.z = bone_loc.y
+                                    bone_loc.y = tmp
 
-                                keys_stack.append([frame_count - first_frame+1, bone_name, bone_loc, bone_sca, bone_rot])
-                                if DEBUG: print("                <loc>", bone_loc, "</loc>")
-                                if DEBUG: print("                <rot>", bone_rot, "</rot>")
-                                if DEBUG: print("                <scale>", bone_sca, "</scale>")
-                                if DEBUG: print("            </bone>")
+                            else:
+                                bone_rot = bone_matrix.to_quaternion()
+                                bone_rot.normalize()
+
+                            keys_stack.setdefault(bone_name, []).append([frame_count - first_frame+1, bone_loc, bone_sca, bone_rot])
+                            if DEBUG: print("                <loc>", bone_loc, "</loc>")
+                            if DEBUG: print("                <rot>", bone_rot, "</rot>")
+                            if DEBUG: print("                <scale>", bone_sca, "</scale>")
+                            if DEBUG: print("            </bone>")
 
                     frame_count += 1
 
@@ -954,7 +951,7 @@ def write_node(objects=[]):
 # ==== Write NODE MESH Chunk ====
 def write_node_mesh(obj,obj_count,arm_action,exp_root):
     global vertex_groups
-    vertex_groups = []
+    vertex_groups = {}
     mesh_buf = bytearray()
     temp_buf = bytearray()
 
@@ -973,194 +970,216 @@ def write_node_mesh(obj,obj_count,arm_action,exp_root):
 
     return mesh_buf
 
-#ids_count = 0
-
-def build_vertex_groups(data):
-    for f in data.tessfaces:
-        for v in f.vertices:
-            vertex_groups.append({})
-
-#time_in_a = 0
-#time_in_b = 0
-#time_in_b1 = 0
-#time_in_b2 = 0
-#time_in_b3 = 0
-#time_in_b4 = 0
+# ==== Transform Vertex Arrays ====
+# (coords is a flat x,y,z array, every row of the matrix is applied to the
+#  whole array in one pass)
+def transform_coords(matrix, coords, translate=True):
+    xs = coords[0::3]
+    ys = coords[1::3]
+    zs = coords[2::3]
+    result = array.array('f', coords)
+
+    for row in range(3):
+        m0, m1, m2 = matrix[row][0], matrix[row][1], matrix[row][2]
+        m3 = matrix[row][3] if translate else 0.0
+        result[row::3] = array.array('f', [m0*x + m1*y + m2*z + m3 for x, y, z in zip(xs, ys, zs)])
+
+    return result
+
+def transform_normals(matrix, normals):
+    result = transform_coords(matrix, normals, False)
+    for i in range(0, len(result), 3):
+        length = math.sqrt(result[i]*result[i] + result[i+1]*result[i+1] + result[i+2]*result[i+2])
+        if length > 0.0:
+            result[i] /= length
+            result[i+1] /= length
+            result[i+2] /= length
+    return result
+
+# ==== Read Vertex Influences ====
+# (reads the deform groups of every vertex once, the influences of vertex i
+#  are group_ids/weights[offsets[i]:offsets[i+1]], strongest first. With
+#  max_influences > 0 only the strongest ones are kept and rescaled to the
+#  original total weight)
+def get_vertex_influences(data, max_influences=0):
+    offsets = array.array('i', [0])
+    group_ids = array.array('i')
+    weights = array.array('f')
+
+    for vertex in data.vertices:
+        influences = [(g.weight, g.group) for g in vertex.groups if g.weight > 0.0]
+        if len(influences) > 1:
+            influences.sort(reverse=True)
+
+        if max_influences and len(influences) > max_influences:
+            total = sum(w for w, g in influences)
+            influences = influences[:max_influences]
+            kept = sum(w for w, g in influences)
+            influences = [(w * total / kept, g) for w, g in influences]
+
+        for w, g in influences:
+            group_ids.append(g)
+            weights.append(w)
+        offsets.append(len(group_ids))
+
+    return offsets, group_ids, weights
 
 # ==== Write NODE MESH VRTS Chunk ====
+# (face corners sharing position, normal, color and uvs are written once,
+#  per_face_vertices maps every face to the ids of its unique vertices)
 def write_node_mesh_vrts(obj, data, obj_count, arm_action, exp_root):
-    #global ids_count
     vrts_buf = bytearray()
     temp_buf = []
     obj_flags = 0
-    ids_count = 0
-    
-    #global time_in_a
-    #global time_in_b
-    #global time_in_b1
-    #global time_in_b2
-    #global time_in_b3
-    #global time_in_b4
-
-    #data = obj.getData(mesh = True)
+
     global the_scene
-    
-    # FIXME: port to 2.5 API?
-    #orig_uvlayer = data.activeUVLayer
 
-    if b3d_parameters.get("vertex-normals"):
+    use_normals = b3d_parameters.get("vertex-normals")
+    use_colors = b3d_parameters.get("vertex-colors") and len(data.tessface_vertex_colors) > 0
+
+    if use_normals:
         obj_flags += 1
 
-    #if b3d_parameters.get("vertex-colors") and data.getColorLayerNames():
-    if b3d_parameters.get("vertex-colors") and len(data.tessface_vertex_colors) > 0:
+    if use_colors:
         obj_flags += 2
 
+    uv_layers_count = len(data.tessface_uv_textures)
+
     temp_buf.append(write_int(obj_flags)) #Flags
-    #temp_buf += write_int(len(data.getUVLayerNames())) #UV Set
-    temp_buf.append(write_int(len(data.tessface_uv_textures))) #UV Set
+    temp_buf.append(write_int(uv_layers_count)) #UV Set
     temp_buf.append(write_int(2)) #UV Set Size
 
-    # ---- Prepare the mesh "stack"
-    build_vertex_groups(data)
-
-    amount = 0
-    
-    # ---- Fill the mesh "stack"
-    if DEBUG: print("")
-    if DEBUG: print("        <!-- Building vertex_groups -->\n")
-
-    ivert = -1
-
-
-    if PROGRESS_VERBOSE:
-        progress = 0
-        print("    vertex_groups, face:",0,"/",len(data.tessfaces))
-    
     the_scene.frame_set(1,subframe=0.0)
-    
+
     if b3d_parameters.get("local-space"):
         mesh_matrix = mathutils.Matrix()
     else:
         mesh_matrix = obj.matrix_world.copy()
-    
-    import time
-    
-    
-    uv_layers_count = len(data.tessface_uv_textures)
-    for face in data.tessfaces:
-        
-        if DEBUG: print("        <!-- Face",face.index,"-->")
-        
-        #if PROGRESS_VERBOSE:
-        #    progress += 1
-        #    if (progress % 50 == 0): print("    vertex_groups, face:",progress,"/",len(data.tessfaces))
-        
-        per_face_vertices[face.index] = []
-        
-        for vertex_id,vert in enumerate(face.vertices):
-            
-            ivert += 1
-                        
-            per_face_vertices[face.index].append(ivert)
-            
-            #a = time.time()
-                            
-            if arm_action:
-                v = mesh_matrix * data.vertices[vert].co
-                vert_matrix = mathutils.Matrix.Translation(v)
-            else:
-                vert_matrix = mathutils.Matrix.Translation(data.vertices[vert].co)
 
-            vert_matrix *= TRANS_MATRIX
-            vcoord = vert_matrix.to_translation()
+    # ---- Read the mesh in bulk
+    num_verts = len(data.vertices)
+    num_faces = len(data.tessfaces)
 
-            temp_buf.append(write_float_triplet(vcoord.x, vcoord.z, vcoord.y))
+    coords = array.array('f', [0.0]) * (num_verts * 3)
+    data.vertices.foreach_get("co", coords)
 
-            #b = time.time()
-            #time_in_a += b - a
-            
-            if b3d_parameters.get("vertex-normals"):
-                norm_matrix = mathutils.Matrix.Translation(data.vertices[vert].normal)
+    face_verts = array.array('i', [0]) * (num_faces * 4)
+    data.tessfaces.foreach_get("vertices_raw", face_verts)
 
-                if arm_action:
-                    norm_matrix *= mesh_matrix
+    normals = None
+    if use_normals:
+        normals = array.array('f', [0.0]) * (num_verts * 3)
+        data.vertices.foreach_get("normal", normals)
 
-                norm_matrix *= TRANS_MATRIX
-                normal_vector = norm_matrix.to_translation()
-                
-                temp_buf.append(write_float_triplet(normal_vector.x,  #NX
-                                                    normal_vector.z,  #NY
-                                                    normal_vector.y)) #NZ
-
-            #c = time.time()
-            #time_in_b += c - b
-
-            if b3d_parameters.get("vertex-colors") and len(data.tessface_vertex_colors) > 0:
-                if vertex_id == 0:
-                    vcolor = data.tessface_vertex_colors[0].data[face.index].color1
-                elif vertex_id == 1:
-                    vcolor = data.tessface_vertex_colors[0].data[face.index].color2
-                elif vertex_id == 2:
-                    vcolor = data.tessface_vertex_colors[0].data[face.index].color3
-                elif vertex_id == 3:
-                    vcolor = data.tessface_vertex_colors[0].data[face.index].color4
-                
-                temp_buf.append(write_float_quad(vcolor.r, #R
-                                                 vcolor.g, #G
-                                                 vcolor.b, #B
-                                                 1.0))     #A (FIXME?)
-            
-            #d = time.time()
-            #time_in_b1 += d - c
-            
-            for vg in obj.vertex_groups:
-                w = 0.0
-                try:
-                    w = vg.weight(vert)
-                except:
-                    pass
-                vertex_groups[ivert][vg.name] = w
-            
-            #e = time.time()
-            #time_in_b2 += e - d
-            
-            # ==== !!bottleneck here!! (40% of the function)
-            if vertex_id == 0:
-                for iuvlayer in range(uv_layers_count):
-                    uv = data.tessface_uv_textures[iuvlayer].data[face.index].uv1
-                    temp_buf.append(write_float_couple(uv[0], 1-uv[1]) ) # U, V
-            elif vertex_id == 1:
-                for iuvlayer in range(uv_layers_count):
-                    uv = data.tessface_uv_textures[iuvlayer].data[face.index].uv2
-                    temp_buf.append(write_float_couple(uv[0], 1-uv[1]) ) # U, V
-            elif vertex_id == 2:
-                for iuvlayer in range(uv_layers_count):
-                    uv = data.tessface_uv_textures[iuvlayer].data[face.index].uv3
-                    temp_buf.append(write_float_couple(uv[0], 1-uv[1]) ) # U, V
-            elif vertex_id == 3:
-                for iuvlayer in range(uv_layers_count):
-                    uv = data.tessface_uv_textures[iuvlayer].data[face.index].uv4
-                    temp_buf.append(write_float_couple(uv[0], 1-uv[1]) ) # U, V
-
-            #f = time.time()
-            #time_in_b3 += f - e
-            # =====================
+    corner_colors = []
+    if use_colors:
+        color_data = data.tessface_vertex_colors[0].data
+        for color_name in ("color1", "color2", "color3", "color4"):
+            colors = array.array('f', [0.0]) * (num_faces * 3)
+            color_data.foreach_get(color_name, colors)
+            corner_colors.append(colors)
 
-    
+    uv_layers = []
+    for iuvlayer in range(uv_layers_count):
+        uvs = array.array('f', [0.0]) * (num_faces * 8)
+        data.tessface_uv_textures[iuvlayer].data.foreach_get("uv_raw", uvs)
+        uv_layers.append(uvs)
+
+    if arm_action:
+        coords = transform_coords(mesh_matrix, coords)
+        if use_normals:
+            normals = transform_normals(mesh_matrix, normals)
+
+    # ---- Build the unique vertex list
     if DEBUG: print("")
-    
-    #c = time.time()
-    #time_in_b += c - b
-    #print("time_in_a = ",time_in_a)
-    #print("time_in_b = ",time_in_b)
-    #print("time_in_b1 = ", time_in_b1)
-    #print("time_in_b2 = ", time_in_b2)
-    #print("time_in_b3 = ", time_in_b3)
-    #print("time_in_b4 = ", time_in_b4)
+    if DEBUG: print("        <!-- Building vertex_groups -->\n")
 
-    if len(temp_buf) > 0:
-        vrts_buf += write_chunk(b"VRTS",b"".join(temp_buf))
-        temp_buf = []
+    vertex_ids = {}
+    num_corners = 0
+    unique_verts = []   # (vertex index, face index, corner) of every unique vertex
+
+    for face_index in range(num_faces):
+        base = face_index * 4
+        corners = 4 if face_verts[base + 3] != 0 else 3
+
+        face_vertices = []
+        for corner in range(corners):
+            vert = face_verts[base + corner]
+            key = [vert]
+            if use_colors:
+                colors = corner_colors[corner]
+                key.extend(colors[face_index*3:face_index*3 + 3])
+            for uvs in uv_layers:
+                key.extend(uvs[face_index*8 + corner*2:face_index*8 + corner*2 + 2])
+            key = tuple(key)
+
+            ivert = vertex_ids.get(key)
+            if ivert == None:
+                ivert = len(unique_verts)
+                vertex_ids[key] = ivert
+                unique_verts.append((vert, face_index, corner))
+            face_vertices.append(ivert)
+
+        num_corners += corners
+        per_face_vertices[face_index] = face_vertices
+
+    if PROGRESS_VERBOSE:
+        print("    vertices:", len(unique_verts), "/", num_corners, "face corners")
+
+    # ---- Fill the mesh "stack"
+    if len(obj.vertex_groups) > 0:
+        group_names = [vg.name for vg in obj.vertex_groups]
+        offsets, group_ids, weights = get_vertex_influences(data, b3d_parameters.get("max-influences"))
+
+        for ivert, (vert, face_index, corner) in enumerate(unique_verts):
+            for i in range(offsets[vert], offsets[vert + 1]):
+                if group_ids[i] >= len(group_names):
+                    continue
+                group_name = group_names[group_ids[i]]
+                if group_name not in vertex_groups:
+                    vertex_groups[group_name] = (array.array('i'), array.array('f'))
+                vert_ids, vert_weights = vertex_groups[group_name]
+                vert_ids.append(ivert)
+                vert_weights.append(weights[i])
+
+    # ---- Interleave the vertex arrays
+    stride = 3 + (3 if use_normals else 0) + (4 if use_colors else 0) + 2 * uv_layers_count
+    num_unique = len(unique_verts)
+    vertex_buf = array.array('f', [0.0]) * (num_unique * stride)
+
+    verts = [v[0] for v in unique_verts]
+    offset = 0
+
+    # positions and normals are written as x, z, y
+    for axis in (0, 2, 1):
+        vertex_buf[offset::stride] = array.array('f', [coords[v*3 + axis] for v in verts])
+        offset += 1
+
+    if use_normals:
+        for axis in (0, 2, 1):
+            vertex_buf[offset::stride] = array.array('f', [normals[v*3 + axis] for v in verts])
+            offset += 1
+
+    if use_colors:
+        for channel in range(3):
+            vertex_buf[offset::stride] = array.array('f', [corner_colors[c][f*3 + channel] for v, f, c in unique_verts])
+            offset += 1
+        vertex_buf[offset::stride] = array.array('f', [1.0]) * num_unique #A (FIXME?)
+        offset += 1
+
+    for uvs in uv_layers:
+        vertex_buf[offset::stride] = array.array('f', [uvs[f*8 + c*2] for v, f, c in unique_verts]) # U
+        vertex_buf[offset + 1::stride] = array.array('f', [1 - uvs[f*8 + c*2 + 1] for v, f, c in unique_verts]) # V
+        offset += 2
+
+    if sys.byteorder != "little":
+        vertex_buf.byteswap()
+    temp_buf.append(vertex_buf.tobytes())
+
+    if DEBUG: print("")
+
+    vrts_buf += write_chunk(b"VRTS",b"".join(temp_buf))
+    temp_buf = []
 
     return vrts_buf
 
@@ -1255,7 +1274,8 @@ def write_node_mesh_tris(obj, data, obj_count,arm_action,exp_root):
             progress += 1
             print("BRUS:",progress,"/",len(dBrushId2Face.keys()))
         
-        temp_buf = [write_int(brus_id)] #Brush ID
+        temp_buf = array.array('i')
+        temp_buf.append(brus_id) #Brush ID
         
         if DEBUG: print("        <brush id=", brus_id, ">")
         
@@ -1269,20 +1289,18 @@ def write_node_mesh_tris(obj, data, obj_count,arm_action,exp_root):
 
             vertices = per_face_vertices[face.index]
 
-            temp_buf.append(write_int(vertices[2])) #A
-            temp_buf.append(write_int(vertices[1])) #B
-            temp_buf.append(write_int(vertices[0])) #C
+            temp_buf.extend((vertices[2], vertices[1], vertices[0])) #A, B, C
 
             if DEBUG: print("            <face id=", vertices[2], vertices[1], vertices[0],"/> <!-- face",face.index,"-->")
 
-            if len(face.vertices) == 4:
-                temp_buf.append(write_int(vertices[3])) #A
-                temp_buf.append(write_int(vertices[2])) #B
-                temp_buf.append(write_int(vertices[0])) #C
+            if len(vertices) == 4:
+                temp_buf.extend((vertices[3], vertices[2], vertices[0])) #A, B, C
                 if DEBUG: print("            <face id=", vertices[3], vertices[2], vertices[0],"/> <!-- face",face.index,"-->")
 
         if DEBUG: print("        </brush>")
-        tris_buf += write_chunk(b"TRIS", b"".join(temp_buf))
+        if sys.byteorder != "little":
+            temp_buf.byteswap()
+        tris_buf += write_chunk(b"TRIS", temp_buf.tobytes())
 
     return tris_buf
 
@@ -1346,13 +1364,12 @@ def write_node_bone(ibone):
 
     my_name = bone_stack[ibone][BONE_ITSELF].name
 
-    for ivert in range(len(vertex_groups)):
-        if my_name in vertex_groups[ivert]:
-            vert_influ = vertex_groups[ivert][my_name]
-            if DEBUG: print("        <bone name=",bone_stack[ibone][BONE_ITSELF].name,"face_vertex_id=", ivert + iuv,
-                            " weigth=", vert_influ[1] , "/>")
-            temp_buf.append(write_int(ivert)) # Face Vertex ID
-            temp_buf.append(write_float(vert_influ)) #Weight
+    if my_name in vertex_groups:
+        vert_ids, vert_weights = vertex_groups[my_name]
+        for ivert, vert_influ in zip(vert_ids, vert_weights):
+            if DEBUG: print("        <bone name=",my_name,"face_vertex_id=", ivert,
+                            " weigth=", vert_influ , "/>")
+            temp_buf.append(struct.pack("<if", ivert, vert_influ)) # Face Vertex ID, Weight
 
     bone_buf += write_chunk(b"BONE", b"".join(temp_buf))
     temp_buf = []
@@ -1368,25 +1385,20 @@ def write_node_keys(ibone):
 
     my_name = bone_stack[ibone][BONE_ITSELF].name
 
-    for ikeys in range(len(keys_stack)):
-        if keys_stack[ikeys][1] == my_name:
-            temp_buf.append(write_int(keys_stack[ikeys][0])) #Frame
+    for frame, position, scale, quat in keys_stack.get(my_name, ()):
+        temp_buf.append(write_int(frame)) #Frame
 
-            position = keys_stack[ikeys][2]
-            # FIXME: we should use the same matrix format everywhere and not require this
-            if b3d_parameters.get("local-space"):
-                temp_buf.append(write_float_triplet(position[0], position[2], position[1]))
-            else:
-                temp_buf.append(write_float_triplet(-position[0], position[1], position[2]))
+        # FIXME: we should use the same matrix format everywhere and not require this
+        if b3d_parameters.get("local-space"):
+            temp_buf.append(write_float_triplet(position[0], position[2], position[1]))
+        else:
+            temp_buf.append(write_float_triplet(-position[0], position[1], position[2]))
 
-            scale = keys_stack[ikeys][3]
-            temp_buf.append(write_float_triplet(scale[0], scale[1], scale[2]))
+        temp_buf.append(write_float_triplet(scale[0], scale[1], scale[2]))
 
-            quat = keys_stack[ikeys][4]
-            quat.normalize()
+        quat.normalize()
 
-            temp_buf.append(write_float_quad(quat.w, -quat.x, quat.y, quat.z))
-            #break
+        temp_buf.append(write_float_quad(quat.w, -quat.x, quat.y, quat.z))
 
     keys_buf += write_chunk(b"KEYS",b"".join(temp_buf))
     temp_buf = []
@@ -1427,6 +1439,7 @@ class B3D_Export_Operator(bpy.types.Operator):
     lights   = bpy.props.BoolProperty(name="Export Lights", default=False)
     mipmap   = bpy.props.BoolProperty(name="Mipmap", default=False)
     localsp  = bpy.props.BoolProperty(name="Use Local Space Coords", default=False)
+    maxinflu = bpy.props.IntProperty(name="Max Bone Influences", description="Strongest bone weights kept per vertex (0 = all)", default=0, min=0, max=16)
 
     overwrite_without_asking  = bpy.props.BoolProperty(name="Overwrite without asking", default=False)
     
@@ -1457,6 +1470,7 @@ class B3D_Export_Operator(bpy.types.Operator):
         b3d_parameters["lights"         ] = self.lights
         b3d_parameters["mipmap"         ] = self.mipmap
         b3d_parameters["local-space"    ] = self.localsp
+        b3d_parameters["max-influences" ] = self.maxinflu
         
         the_scene = context.scene
         
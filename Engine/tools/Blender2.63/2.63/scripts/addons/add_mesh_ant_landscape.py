@@ -76,93 +76,54 @@ from mathutils.noise import *
 from math import *
 
 
-# Create a new mesh (object) from verts/edges/faces.
-# verts/edges/faces ... List of vertices/edges/faces for the
-#                    new mesh (as used in from_pydata).
+# Create a new mesh (object) from flat vertex coordinates and quads.
+# coords ... Flat sequence of vertex coordinates (x, y, z, x, y, z, ...).
+# quads ... Flat sequence of vertex indices, 4 for each quad.
 # name ... Name of the new mesh (& object).
-def create_mesh_object(context, verts, edges, faces, name):
+def create_mesh_object(context, coords, quads, name):
+    from array import array
+
     # Create new mesh
     mesh = bpy.data.meshes.new(name)
 
-    # Make a mesh from a list of verts/edges/faces.
-    mesh.from_pydata(verts, edges, faces)
+    tot_loop = len(quads)
+    tot_poly = tot_loop // 4
+
+    # Fill the mesh in bulk instead of one polygon at a time.
+    mesh.vertices.add(len(coords) // 3)
+    mesh.loops.add(tot_loop)
+    mesh.polygons.add(tot_poly)
+
+    mesh.vertices.foreach_set("co", coords)
+    mesh.loops.foreach_set("vertex_index", quads)
+    mesh.polygons.foreach_set("loop_start", array('i', range(0, tot_loop, 4)))
+    mesh.polygons.foreach_set("loop_total", array('i', [4]) * tot_poly)
 
     # Update mesh geometry after adding stuff.
-    mesh.update()
+    mesh.update(calc_edges=True)
 
     from bpy_extras import object_utils
     return object_utils.object_data_add(context, mesh, operator=None)
 
-# A very simple "bridge" tool.
-# Connects two equally long vertex rows with faces.
-# Returns a list of the new faces (list of  lists)
-#
-# vertIdx1 ... First vertex list (list of vertex indices).
-# vertIdx2 ... Second vertex list (list of vertex indices).
-# closed ... Creates a loop (first & last are closed).
-# flipped ... Invert the normal of the face(s).
+# Quads connecting a grid of vertices, by index arithmetic.
+# Returns a flat array of vertex indices, 4 for each quad.
 #
-# Note: You can set vertIdx1 to a single vertex index to create
-#    a fan/star of faces.
-# Note: If both vertex idx list are the same length they have
-#    to have at least 2 vertices.
-def createFaces(vertIdx1, vertIdx2, closed=False, flipped=False):
-    faces = []
-
-    if not vertIdx1 or not vertIdx2:
-        return None
-
-    if len(vertIdx1) < 2 and len(vertIdx2) < 2:
-        return None
-
-    fan = False
-    if (len(vertIdx1) != len(vertIdx2)):
-        if (len(vertIdx1) == 1 and len(vertIdx2) > 1):
-            fan = True
-        else:
-            return None
+# rows ... Number of vertex rows.
+# cols ... Number of vertices in each row, rows are stored one after the other.
+def grid_quads(rows, cols):
+    from array import array
 
-    total = len(vertIdx2)
+    # first vertex of each quad
+    base = [row * cols + col for row in range(rows - 1) for col in range(cols - 1)]
 
-    if closed:
-        # Bridge the start with the end.
-        if flipped:
-            face = [
-                vertIdx1[0],
-                vertIdx2[0],
-                vertIdx2[total - 1]]
-            if not fan:
-                face.append(vertIdx1[total - 1])
-            faces.append(face)
+    quads = array('i', [0]) * (len(base) * 4)
+    quads[0::4] = array('i', base)
+    quads[1::4] = array('i', [i + cols for i in base])
+    quads[2::4] = array('i', [i + cols + 1 for i in base])
+    quads[3::4] = array('i', [i + 1 for i in base])
+    return quads
 
-        else:
-            face = [vertIdx2[0], vertIdx1[0]]
-            if not fan:
-                face.append(vertIdx1[total - 1])
-            face.append(vertIdx2[total - 1])
-            faces.append(face)
-
-    # Bridge the rest of the faces.
-    for num in range(total - 1):
-        if flipped:
-            if fan:
-                face = [vertIdx2[num], vertIdx1[0], vertIdx2[num + 1]]
-            else:
-                face = [vertIdx2[num], vertIdx1[num],
-                    vertIdx1[num + 1], vertIdx2[num + 1]]
-            faces.append(face)
-        else:
-            if fan:
-                face = [vertIdx1[0], vertIdx2[num], vertIdx2[num + 1]]
-            else:
-                face = [vertIdx1[num], vertIdx2[num],
-                    vertIdx2[num + 1], vertIdx1[num + 1]]
-            faces.append(face)
-
-    return faces
 
-
-###------------------------------------------------------------
 ###------------------------------------------------------------
 # some functions for marble_noise
 def sin_bias(a):
@@ -261,8 +222,10 @@ def strata_hterrain( x,y,z, H, lacunarity, octaves, offset, distort, basis ):
     return ( value * (1.0-0.5) + steps*0.5 )
 
 ###------------------------------------------------------------
-# landscape_gen
-def landscape_gen(x,y,z,falloffsize,options=[0,1.0,1, 0,0,1.0,0,6,1.0,2.0,1.0,2.0,0,0,0, 1.0,0.0,1,0.0,1.0,0,0,0]):
+# landscape_func
+# Parses the options and seeds the noise origin once, and returns a
+# height( x,y,z ) function to evaluate over a whole grid of vertices.
+def landscape_func(falloffsize,options=[0,1.0,1, 0,0,1.0,0,6,1.0,2.0,1.0,2.0,0,0,0, 1.0,0.0,1,0.0,1.0,0,0,0]):
 
     # options
     rseed    = options[0]
@@ -304,41 +267,54 @@ def landscape_gen(x,y,z,falloffsize,options=[0,1.0,1, 0,0,1.0,0,6,1.0,2.0,1.0,2.
         origin_y = ( 0.5 - origin[1] ) * 1000.0
         origin_z = ( 0.5 - origin[2] ) * 1000.0
 
-    # adjust noise size and origin
-    ncoords = ( x / nsize + origin_x, y / nsize + origin_y, z / nsize + origin_z )
-
     # noise basis type's
     if nbasis == 9: nbasis = 14  # to get cellnoise basis you must set 14 instead of 9
     if vlbasis ==9: vlbasis = 14
-    # noise type's
-    if ntype == 0:   value = multi_fractal(        ncoords, dimension, lacunarity, depth, nbasis ) * 0.5
-    elif ntype == 1: value = ridged_multi_fractal( ncoords, dimension, lacunarity, depth, offset, gain, nbasis ) * 0.5
-    elif ntype == 2: value = hybrid_multi_fractal( ncoords, dimension, lacunarity, depth, offset, gain, nbasis ) * 0.5
-    elif ntype == 3: value = hetero_terrain(       ncoords, dimension, lacunarity, depth, offset, nbasis ) * 0.25
-    elif ntype == 4: value = fractal(              ncoords, dimension, lacunarity, depth, nbasis )
-    elif ntype == 5: value = turbulence_vector(    ncoords, depth, hardnoise, nbasis )[0]
-    elif ntype == 6: value = variable_lacunarity(            ncoords, distortion, nbasis, vlbasis ) + 0.5
-    elif ntype == 7: value = marble_noise( x*2.0/falloffsize,y*2.0/falloffsize,z*2/falloffsize, origin, nsize, marbleshape, marblebias, marblesharpnes, distortion, depth, hardnoise, nbasis )
-    elif ntype == 8: value = shattered_hterrain( ncoords[0], ncoords[1], ncoords[2], dimension, lacunarity, depth, offset, distortion, nbasis )
-    elif ntype == 9: value = strata_hterrain( ncoords[0], ncoords[1], ncoords[2], dimension, lacunarity, depth, offset, distortion, nbasis )
-    else:
-        value = 0.0
 
-    # adjust height
-    if invert !=0:
-        value = (1-value) * height + heightoffset
+    # edge falloff, no edge falloff if spherical
+    if sphere != 0:
+        falloff = 0
+    if falloff ==1:
+        radius = (falloffsize/2)**2
     else:
-        value = value * height + heightoffset
+        radius = falloffsize/2
+
+    # strata / terrace / layered
+    if stratatype !='0':
+        strata = strata / height
+    if stratatype == '1':
+        strata *= 2
+
+    def landscape_height(x,y,z):
+        # adjust noise size and origin
+        ncoords = ( x / nsize + origin_x, y / nsize + origin_y, z / nsize + origin_z )
+
+        # noise type's
+        if ntype == 0:   value = multi_fractal(        ncoords, dimension, lacunarity, depth, nbasis ) * 0.5
+        elif ntype == 1: value = ridged_multi_fractal( ncoords, dimension, lacunarity, depth, offset, gain, nbasis ) * 0.5
+        elif ntype == 2: value = hybrid_multi_fractal( ncoords, dimension, lacunarity, depth, offset, gain, nbasis ) * 0.5
+        elif ntype == 3: value = hetero_terrain(       ncoords, dimension, lacunarity, depth, offset, nbasis ) * 0.25
+        elif ntype == 4: value = fractal(              ncoords, dimension, lacunarity, depth, nbasis )
+        elif ntype == 5: value = turbulence_vector(    ncoords, depth, hardnoise, nbasis )[0]
+        elif ntype == 6: value = variable_lacunarity(            ncoords, distortion, nbasis, vlbasis ) + 0.5
+        elif ntype == 7: value = marble_noise( x*2.0/falloffsize,y*2.0/falloffsize,z*2/falloffsize, origin, nsize, marbleshape, marblebias, marblesharpnes, distortion, depth, hardnoise, nbasis )
+        elif ntype == 8: value = shattered_hterrain( ncoords[0], ncoords[1], ncoords[2], dimension, lacunarity, depth, offset, distortion, nbasis )
+        elif ntype == 9: value = strata_hterrain( ncoords[0], ncoords[1], ncoords[2], dimension, lacunarity, depth, offset, distortion, nbasis )
+        else:
+            value = 0.0
+
+        # adjust height
+        if invert !=0:
+            value = (1-value) * height + heightoffset
+        else:
+            value = value * height + heightoffset
 
-    # edge falloff
-    if sphere == 0: # no edge falloff if spherical
+        # edge falloff
         if falloff != 0:
-            fallofftypes = [ 0, sqrt((x*x)**2+(y*y)**2), sqrt(x*x+y*y), sqrt(y*y), sqrt(x*x) ]
-            dist = fallofftypes[ falloff]
-            if falloff ==1:
-                radius = (falloffsize/2)**2
-            else:
-                radius = falloffsize/2
+            if falloff == 1:   dist = sqrt((x*x)**2+(y*y)**2)
+            elif falloff == 2: dist = sqrt(x*x+y*y)
+            elif falloff == 3: dist = sqrt(y*y)
+            else:              dist = sqrt(x*x)
             value = value - sealevel
             if( dist < radius ):
                 dist = dist / radius
@@ -347,84 +323,93 @@ def landscape_gen(x,y,z,falloffsize,options=[0,1.0,1, 0,0,1.0,0,6,1.0,2.0,1.0,2.
             else:
                 value = sealevel
 
-    # strata / terrace / layered
-    if stratatype !='0':
-        strata = strata / height
-    if stratatype == '1':
-        strata *= 2
-        steps = ( sin( value*strata*pi ) * ( 0.1/strata*pi ) )
-        value = ( value * (1.0-0.5) + steps*0.5 ) * 2.0
-    elif stratatype == '2':
-        steps = -abs( sin( value*(strata)*pi ) * ( 0.1/(strata)*pi ) )
-        value =( value * (1.0-0.5) + steps*0.5 ) * 2.0 
-    elif stratatype == '3':
-        steps = abs( sin( value*(strata)*pi ) * ( 0.1/(strata)*pi ) )
-        value =( value * (1.0-0.5) + steps*0.5 ) * 2.0
-    else:
-        value = value
+        # strata / terrace / layered
+        if stratatype == '1':
+            steps = ( sin( value*strata*pi ) * ( 0.1/strata*pi ) )
+            value = ( value * (1.0-0.5) + steps*0.5 ) * 2.0
+        elif stratatype == '2':
+            steps = -abs( sin( value*(strata)*pi ) * ( 0.1/(strata)*pi ) )
+            value =( value * (1.0-0.5) + steps*0.5 ) * 2.0 
+        elif stratatype == '3':
+            steps = abs( sin( value*(strata)*pi ) * ( 0.1/(strata)*pi ) )
+            value =( value * (1.0-0.5) + steps*0.5 ) * 2.0
 
-    # clamp height
-    if ( value < sealevel ): value = sealevel
-    if ( value > platlevel ): value = platlevel
+        # clamp height
+        if ( value < sealevel ): value = sealevel
+        if ( value > platlevel ): value = platlevel
 
-    return value
+        return value
+
+    return landscape_height
+
+###------------------------------------------------------------
+# landscape_gen
+def landscape_gen(x,y,z,falloffsize,options=[0,1.0,1, 0,0,1.0,0,6,1.0,2.0,1.0,2.0,0,0,0, 1.0,0.0,1,0.0,1.0,0,0,0]):
+    return landscape_func(falloffsize,options)(x,y,z)
 
 
 # generate grid
-def grid_gen( sub_d, size_me, options ):
+# Returns a list of ( coords, quads ) for tiles x tiles chunks of the grid,
+# neighbouring tiles share the vertices along their borders.
+def grid_gen( sub_d, size_me, options, tiles=1 ):
+    from array import array
 
-    verts = []
-    faces = []
-    edgeloop_prev = []
+    landscape_height = landscape_func(size_me,options)
 
     delta = size_me / float(sub_d - 1)
     start = -(size_me / 2.0)
+    axis = [start + row * delta for row in range(sub_d)]
 
-    for row_x in range(sub_d):
-        edgeloop_cur = []
-        x = start + row_x * delta
-        for row_y in range(sub_d):
-            y = start + row_y * delta
-            z = landscape_gen(x,y,0.0,size_me,options)
+    # evaluate the whole grid once, tiles take their part of it
+    heights = [landscape_height(x,y,0.0) for x in axis for y in axis]
 
-            edgeloop_cur.append(len(verts))
-            verts.append((x,y,z))
+    # tile borders, in vertex rows
+    tiles = max(1, min(tiles, sub_d - 1))
+    bounds = [(sub_d - 1) * tile // tiles for tile in range(tiles + 1)]
 
-        if len(edgeloop_prev) > 0:
-            faces_row = createFaces(edgeloop_prev, edgeloop_cur)
-            faces.extend(faces_row)
+    chunks = []
+    for tile_x in range(tiles):
+        x_rows = range(bounds[tile_x], bounds[tile_x + 1] + 1)
+        for tile_y in range(tiles):
+            y_rows = range(bounds[tile_y], bounds[tile_y + 1] + 1)
 
-        edgeloop_prev = edgeloop_cur
+            coords = array('f', [co
+                                 for row_x in x_rows
+                                 for row_y in y_rows
+                                 for co in (axis[row_x], axis[row_y], heights[row_x * sub_d + row_y])])
 
-    return verts, faces
+            chunks.append((coords, grid_quads(len(x_rows), len(y_rows))))
+
+    return chunks
 
 
 # generate sphere
+# Returns ( coords, quads ), the poles and seam are merged afterwards.
 def sphere_gen( sub_d, size_me, options ):
+    from array import array
+
+    landscape_height = landscape_func(size_me,options)
 
-    verts = []
-    faces = []
-    edgeloop_prev = []
+    # the same factors are used by every row or column
+    lat_cos = [cos(-pi/2+row_x*pi/(sub_d-1)) for row_x in range(sub_d)]
+    lat_sin = [sin(-pi/2+row_x*pi/(sub_d-1)) for row_x in range(sub_d)]
+    lon_sin = [sin(row_y*pi*2/(sub_d-1)) for row_y in range(sub_d)]
+    lon_cos = [cos(row_y*pi*2/(sub_d-1)) for row_y in range(sub_d)]
 
+    coords = array('f', [0.0]) * (sub_d * sub_d * 3)
+    i = 0
     for row_x in range(sub_d):
-        edgeloop_cur = []
+        w = lat_sin[row_x] * size_me/2
         for row_y in range(sub_d):
-            u = sin(row_y*pi*2/(sub_d-1)) * cos(-pi/2+row_x*pi/(sub_d-1)) * size_me/2
-            v = cos(row_y*pi*2/(sub_d-1)) * cos(-pi/2+row_x*pi/(sub_d-1)) * size_me/2
-            w = sin(-pi/2+row_x*pi/(sub_d-1)) * size_me/2
-            h = landscape_gen(u,v,w,size_me,options) / size_me
-            u,v,w = u+u*h, v+v*h, w+w*h
-
-            edgeloop_cur.append(len(verts))
-            verts.append((u, v, w))
-
-        if len(edgeloop_prev) > 0:
-            faces_row = createFaces(edgeloop_prev, edgeloop_cur)
-            faces.extend(faces_row)
-
-        edgeloop_prev = edgeloop_cur
+            u = lon_sin[row_y] * lat_cos[row_x] * size_me/2
+            v = lon_cos[row_y] * lat_cos[row_x] * size_me/2
+            h = landscape_height(u,v,w) / size_me
+            coords[i] = u+u*h
+            coords[i+1] = v+v*h
+            coords[i+2] = w+w*h
+            i += 3
 
-    return verts, faces
+    return coords, grid_quads(sub_d, sub_d)
 
 
 ###------------------------------------------------------------
@@ -455,6 +440,12 @@ class landscape_add(bpy.types.Operator):
                 default=64,
                 description="Mesh x y subdivisions")
 
+    Tiles = IntProperty(name="Tiles",
+                min=1,
+                max=64,
+                default=1,
+                description="Split the grid into tiles x tiles objects with matching borders")
+
     MeshSize = FloatProperty(name="Mesh Size",
                 min=0.01,
                 max=100000.0,
@@ -651,6 +642,8 @@ class landscape_add(bpy.types.Operator):
         box.prop(self, 'SphereMesh')
         box.prop(self, 'SmoothMesh')
         box.prop(self, 'Subdivision')
+        if self.SphereMesh == False:
+            box.prop(self, 'Tiles')
         box.prop(self, 'MeshSize')
 
         box = layout.box()
@@ -768,28 +761,29 @@ class landscape_add(bpy.types.Operator):
             # Main function
             if self.SphereMesh !=0:
                 # sphere
-                verts, faces = sphere_gen( self.Subdivision, self.MeshSize, options )
+                chunks = [sphere_gen( self.Subdivision, self.MeshSize, options )]
             else:
                 # grid
-                verts, faces = grid_gen( self.Subdivision, self.MeshSize, options )
-
-            # create mesh object
-            obj = create_mesh_object(context, verts, [], faces, "Landscape")
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.normals_make_consistent(inside=False)
-            bpy.ops.object.mode_set(mode='OBJECT')
-            # sphere, remove doubles
-            if self.SphereMesh !=0:
+                chunks = grid_gen( self.Subdivision, self.MeshSize, options, self.Tiles )
+
+            for coords, quads in chunks:
+                # create mesh object
+                obj = create_mesh_object(context, coords, quads, "Landscape")
                 bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.remove_doubles(mergedist=0.0001)
+                bpy.ops.mesh.normals_make_consistent(inside=False)
                 bpy.ops.object.mode_set(mode='OBJECT')
-
-            # Shade smooth
-            if self.SmoothMesh !=0:
-                if bpy.ops.object.shade_smooth.poll():
-                    bpy.ops.object.shade_smooth()
-                else: # edit mode
-                    bpy.ops.mesh.faces_shade_smooth()
+                # sphere, remove doubles
+                if self.SphereMesh !=0:
+                    bpy.ops.object.mode_set(mode='EDIT')
+                    bpy.ops.mesh.remove_doubles(mergedist=0.0001)
+                    bpy.ops.object.mode_set(mode='OBJECT')
+
+                # Shade smooth
+                if self.SmoothMesh !=0:
+                    if bpy.ops.object.shade_smooth.poll():
+                        bpy.ops.object.shade_smooth()
+                    else: # edit mode
+                        bpy.ops.mesh.faces_shade_smooth()
 
             # restore pre operator undo state
             bpy.context.user_preferences.edit.use_global_undo = undo
@@ -30,6 +30,12 @@ bl_info = {
     "category": "Import-Export"}
 
 import os
+import re
+import sys
+import uuid
+import zlib
+import array
+import struct
 from math import radians
 
 import bpy
@@ -44,11 +50,16 @@ class DirectXExporterSettings:
                  RotateX=True,
                  FlipNormals=False,
                  ApplyModifiers=False,
+                 WeldVertices=False,
                  IncludeFrameRate=False,
                  ExportTextures=True,
                  ExportArmatures=False,
                  ExportAnimation=0,
                  ExportMode=1,
+                 MaxInfluences=0,
+                 NormalizeWeights=True,
+                 KeyTolerance=0.0,
+                 FileFormat=1,
                  Verbose=False):
         self.context = context
         self.FilePath = FilePath
@@ -56,14 +67,188 @@ class DirectXExporterSettings:
         self.RotateX = RotateX
         self.FlipNormals = FlipNormals
         self.ApplyModifiers = ApplyModifiers
+        self.WeldVertices = WeldVertices
         self.IncludeFrameRate = IncludeFrameRate
         self.ExportTextures = ExportTextures
         self.ExportArmatures = ExportArmatures
         self.ExportAnimation = int(ExportAnimation)
         self.ExportMode = int(ExportMode)
+        self.MaxInfluences = MaxInfluences
+        self.NormalizeWeights = NormalizeWeights
+        self.KeyTolerance = KeyTolerance
+        self.FileFormat = int(FileFormat)
         self.Verbose = Verbose
 
 
+#Binary .x token ids
+TOKEN_NAME = 1
+TOKEN_STRING = 2
+TOKEN_GUID = 5
+TOKEN_INTEGER_LIST = 6
+TOKEN_FLOAT_LIST = 7
+TOKEN_OBRACE = 10
+TOKEN_CBRACE = 11
+TOKEN_OBRACKET = 14
+TOKEN_CBRACKET = 15
+TOKEN_COMMA = 19
+TOKEN_SEMICOLON = 20
+TOKEN_TEMPLATE = 31
+
+#Template member types and their token ids
+TemplateTypes = {"WORD": 40,
+                 "DWORD": 41,
+                 "FLOAT": 42,
+                 "DOUBLE": 43,
+                 "CHAR": 44,
+                 "UCHAR": 45,
+                 "SWORD": 46,
+                 "SDWORD": 47,
+                 "VOID": 48,
+                 "STRING": 49,
+                 "UNICODE": 50,
+                 "CSTRING": 51,
+                 "ARRAY": 52}
+
+#Matches the comments, strings, guids, numbers, names and punctuation of the
+#text the exporter writes
+TextTokens = re.compile(r'//[^\n]*|"[^"]*"|<[^>]*>|[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?|\w+|[{}\[\];,]')
+
+#MSZIP compresses the token stream in blocks of up to 32KB
+MSZIPBlockSize = 32768
+
+
+#Packs the values of a binary integer list.  The list holds DWORDs, negative
+#values (e.g. animation keys at negative frames) are stored as their two's
+#complement
+def IntegerArray(Values):
+    try:
+        return array.array("I", Values)
+    except OverflowError:
+        return array.array("i", Values)
+
+
+#File object for binary .x output.  The text passed to write() is turned into
+#binary tokens, while WriteIntegers() and WriteFloats() write number lists
+#straight from packed arrays.  The file is written by close(), MSZIP
+#compressed if Compress is set (for other tools, the engine's .x loader
+#doesn't read compressed files).
+class DirectXBinaryFile:
+    def __init__(self, FilePath, Compress=False):
+        self.FilePath = FilePath
+        self.Compress = Compress
+        self.Text = []
+        self.Data = []
+        self.InTemplate = False
+
+    def write(self, Text):
+        self.Text.append(Text)
+
+    def WriteIntegers(self, Values):
+        self.Flush()
+        self.WriteList(TOKEN_INTEGER_LIST, IntegerArray(Values))
+
+    def WriteFloats(self, Values):
+        self.Flush()
+        self.WriteList(TOKEN_FLOAT_LIST, array.array("f", Values))
+
+    def WriteList(self, Token, Values):
+        if sys.byteorder != "little":
+            Values.byteswap()
+        self.Data.append(struct.pack("<HI", Token, len(Values)))
+        self.Data.append(Values.tobytes())
+
+    #Tokenizes the text written since the last flush.  Runs of numbers become
+    #integer or float lists, separators are only kept in templates and after
+    #strings.
+    def Flush(self):
+        if not self.Text:
+            return
+        Text = "".join(self.Text)
+        self.Text = []
+
+        Data = self.Data
+        Numbers = []
+        Floats = False
+        AfterString = False
+        for Match in TextTokens.finditer(Text):
+            Token = Match.group()
+            First = Token[0]
+            if Token.startswith("//"):
+                continue
+            if First in "0123456789.-+":
+                IsFloat = "." in Token or "e" in Token or "E" in Token
+                if Numbers and IsFloat != Floats:
+                    self.WriteList(TOKEN_FLOAT_LIST if Floats else TOKEN_INTEGER_LIST,
+                                   array.array("f", Numbers) if Floats else IntegerArray(Numbers))
+                    Numbers = []
+                Floats = IsFloat
+                Numbers.append(float(Token) if IsFloat else int(Token))
+                continue
+            if Numbers:
+                self.WriteList(TOKEN_FLOAT_LIST if Floats else TOKEN_INTEGER_LIST,
+                               array.array("f", Numbers) if Floats else IntegerArray(Numbers))
+                Numbers = []
+
+            if First == "\"":
+                String = Token[1:-1].encode("utf-8")
+                Data.append(struct.pack("<HI", TOKEN_STRING, len(String)))
+                Data.append(String)
+                AfterString = True
+                continue
+            if First in ";,":
+                if self.InTemplate or AfterString:
+                    Data.append(struct.pack("<H", TOKEN_SEMICOLON if First == ";" else TOKEN_COMMA))
+            elif First == "<":
+                Data.append(struct.pack("<H", TOKEN_GUID))
+                Data.append(uuid.UUID(Token[1:-1]).bytes_le)
+            elif First == "{":
+                Data.append(struct.pack("<H", TOKEN_OBRACE))
+            elif First == "}":
+                Data.append(struct.pack("<H", TOKEN_CBRACE))
+                self.InTemplate = False
+            elif First == "[":
+                Data.append(struct.pack("<H", TOKEN_OBRACKET))
+            elif First == "]":
+                Data.append(struct.pack("<H", TOKEN_CBRACKET))
+            elif Token == "template":
+                Data.append(struct.pack("<H", TOKEN_TEMPLATE))
+                self.InTemplate = True
+            elif self.InTemplate and Token.upper() in TemplateTypes:
+                Data.append(struct.pack("<H", TemplateTypes[Token.upper()]))
+            else:
+                Name = Token.encode("utf-8")
+                Data.append(struct.pack("<HI", TOKEN_NAME, len(Name)))
+                Data.append(Name)
+            AfterString = False
+        if Numbers:
+            self.WriteList(TOKEN_FLOAT_LIST if Floats else TOKEN_INTEGER_LIST,
+                           array.array("f", Numbers) if Floats else IntegerArray(Numbers))
+
+    def close(self):
+        self.Flush()
+        Data = b"".join(self.Data)
+        self.Data = []
+
+        File = open(self.FilePath, "wb")
+        if self.Compress:
+            #The size field counts the 16 byte header of the uncompressed file
+            File.write(b"xof 0303bzip0032")
+            File.write(struct.pack("<I", len(Data) + 16))
+            for Start in range(0, len(Data), MSZIPBlockSize):
+                Block = Data[Start:Start + MSZIPBlockSize]
+                #Each block is compressed on its own, so no preset dictionary
+                #is needed to decompress it
+                Compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+                Compressed = Compressor.compress(Block) + Compressor.flush()
+                File.write(struct.pack("<HH", len(Block), len(Compressed) + 2))
+                File.write(b"CK")
+                File.write(Compressed)
+        else:
+            File.write(b"xof 0303bin 0032")
+            File.write(Data)
+        File.close()
+
+
 def LegalName(Name):
     
     def ReplaceSet(String, OldSet, NewChar):
@@ -98,7 +283,10 @@ def ExportDirectX(Config):
     print("----------\nExporting to {}".format(Config.FilePath))
     if Config.Verbose:
         print("Opening File...")
-    Config.File = open(Config.FilePath, "w")
+    if Config.FileFormat == 1:
+        Config.File = open(Config.FilePath, "w")
+    else:
+        Config.File = DirectXBinaryFile(Config.FilePath, Config.FileFormat == 3)
     if Config.Verbose:
         print("Done")
 
@@ -185,13 +373,6 @@ def GetObjectChildren(Parent):
     return [Object for Object in Parent.children
             if Object.type in {'ARMATURE', 'EMPTY', 'MESH'}]
 
-#Returns the vertex count of Mesh, counting each vertex for every face.
-def GetMeshVertexCount(Mesh):
-    VertexCount = 0
-    for Polygon in Mesh.polygons:
-        VertexCount += len(Polygon.vertices)
-    return VertexCount
-
 #Returns the file path of first image texture from Material.
 def GetMaterialTextureFileName(Material):
     if Material:
@@ -205,7 +386,9 @@ def GetMaterialTextureFileName(Material):
 
 
 def WriteHeader(Config):
-    Config.File.write("xof 0303txt 0032\n\n")
+    #The binary header is written when the file is closed
+    if Config.FileFormat == 1:
+        Config.File.write("xof 0303txt 0032\n\n")
     
     if Config.IncludeFrameRate:
         Config.File.write("template AnimTicksPerSecond {\n\
@@ -358,27 +541,50 @@ def WriteMesh(Config, Object, Mesh):
     Config.File.write("{}Mesh {{ //{} Mesh\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
     Config.Whitespace += 1
 
+    Corners = GetMeshCorners(Config, Mesh)
+    Normals = GetCornerNormals(Config, Mesh)
+    if Mesh.uv_textures:
+        UVCoordinates = GetCornerUVCoordinates(Config, Mesh)
+    else:
+        UVCoordinates = None
+
+    #Corner i is drawn with written vertex CornerVertices[i], and written
+    #vertex j takes its data from corner VertexCorners[j]
+    if Config.WeldVertices:
+        if Config.Verbose:
+            print("      Welding Vertices...")
+        CornerVertices, VertexCorners = WeldCorners(Corners, Normals, UVCoordinates)
+        Normals = SelectVectors(Normals, 3, VertexCorners)
+        if UVCoordinates is not None:
+            UVCoordinates = SelectVectors(UVCoordinates, 2, VertexCorners)
+        VertexSources = array.array("i", [Corners[Corner] for Corner in VertexCorners])
+        if Config.Verbose:
+            print("      Done: {} corners, {} vertices".format(len(Corners), len(VertexCorners)))
+    else:
+        CornerVertices = range(len(Corners))
+        VertexSources = Corners
+
     if Config.Verbose:
         print("      Writing Mesh Vertices...")
-    WriteMeshVertices(Config, Mesh)
+    WriteMeshVertices(Config, Mesh, VertexSources, CornerVertices)
     if Config.Verbose:
         print("      Done\n      Writing Mesh Normals...")
-    WriteMeshNormals(Config, Mesh)
+    WriteMeshNormals(Config, Mesh, Normals, CornerVertices)
     if Config.Verbose:
         print("      Done\n      Writing Mesh Materials...")
     WriteMeshMaterials(Config, Mesh)
     if Config.Verbose:
         print("      Done")
-    if Mesh.uv_textures:
+    if UVCoordinates is not None:
         if Config.Verbose:
             print("      Writing Mesh UV Coordinates...")
-        WriteMeshUVCoordinates(Config, Mesh)
+        WriteMeshUVCoordinates(Config, Mesh, UVCoordinates)
         if Config.Verbose:
             print("      Done")
     if Config.ExportArmatures:
         if Config.Verbose:
             print("      Writing Mesh Skin Weights...")
-        WriteMeshSkinWeights(Config, Object, Mesh)
+        WriteMeshSkinWeights(Config, Object, Mesh, VertexSources)
         if Config.Verbose:
             print("      Done")
 
@@ -386,48 +592,21 @@ def WriteMesh(Config, Object, Mesh):
     Config.File.write("{}}} //End of {} Mesh\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
 
 
-def WriteMeshVertices(Config, Mesh):
-    Index = 0
-    VertexCount = GetMeshVertexCount(Mesh)
-    Config.File.write("{}{};\n".format("  " * Config.Whitespace, VertexCount))
-
+#Returns the vertex index of every polygon corner of Mesh, in the order the
+#corners are written (reversed for left-handed output).
+def GetMeshCorners(Config, Mesh):
+    Corners = array.array("i")
     for Polygon in Mesh.polygons:
         Vertices = list(Polygon.vertices)
-
         if Config.CoordinateSystem == 1:
             Vertices = Vertices[::-1]
+        Corners.extend(Vertices)
+    return Corners
 
-        for Vertex in [Mesh.vertices[Vertex] for Vertex in Vertices]:
-            Position = Vertex.co
-            Config.File.write("{}{:9f};{:9f};{:9f};".format("  " * Config.Whitespace, Position[0], Position[1], Position[2]))
-            Index += 1
-            if Index == VertexCount:
-                Config.File.write(";\n")
-            else:
-                Config.File.write(",\n")
-
-    Index = 0
-    Config.File.write("{}{};\n".format("  " * Config.Whitespace, len(Mesh.polygons)))
-
-    for Polygon in Mesh.polygons:
-        Config.File.write("{}{};".format("  " * Config.Whitespace, len(Polygon.vertices)))
-        for Vertex in Polygon.vertices:
-            Config.File.write("{};".format(Index))
-            Index += 1
-        if Index == VertexCount:
-            Config.File.write(";\n")
-        else:
-            Config.File.write(",\n")
-
-
-def WriteMeshNormals(Config, Mesh):
-    Config.File.write("{}MeshNormals {{ //{} Normals\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
-    Config.Whitespace += 1
-
-    Index = 0
-    VertexCount = GetMeshVertexCount(Mesh)
-    Config.File.write("{}{};\n".format("  " * Config.Whitespace, VertexCount))
 
+#Returns the normal of every polygon corner of Mesh, in corner order.
+def GetCornerNormals(Config, Mesh):
+    Normals = array.array("f")
     for Polygon in Mesh.polygons:
         Vertices = list(Polygon.vertices)
 
@@ -438,27 +617,113 @@ def WriteMeshNormals(Config, Mesh):
                 Normal = Vertex.normal
             else:
                 Normal = Polygon.normal
-            if Config.FlipNormals:
-                Normal = -Normal
-            Config.File.write("{}{:9f};{:9f};{:9f};".format("  " * Config.Whitespace, Normal[0], Normal[1], Normal[2]))
-            Index += 1
-            if Index == VertexCount:
-                Config.File.write(";\n")
-            else:
-                Config.File.write(",\n")
+            Normals.extend(Normal[0:3])
+    if Config.FlipNormals:
+        Normals = array.array("f", [-Value for Value in Normals])
+    return Normals
 
-    Index = 0
-    Config.File.write("{}{};\n".format("  " * Config.Whitespace, len(Mesh.polygons)))
 
+#Returns the active UV coordinates of every polygon corner of Mesh, in corner
+#order and with V flipped.
+def GetCornerUVCoordinates(Config, Mesh):
+    UVCoordinates = Mesh.uv_layers.active.data
+
+    Coordinates = array.array("d")
     for Polygon in Mesh.polygons:
-        Config.File.write("{}{};".format("  " * Config.Whitespace, len(Polygon.vertices)))
-        for Vertex in Polygon.vertices:
-            Config.File.write("{};".format(Index))
-            Index += 1
-        if Index == VertexCount:
-            Config.File.write(";\n")
-        else:
-            Config.File.write(",\n")
+        Vertices = []
+        for Vertex in [UVCoordinates[Vertex] for Vertex in Polygon.loop_indices]:
+            Vertices.append((Vertex.uv[0], 1 - Vertex.uv[1]))
+        if Config.CoordinateSystem == 1:
+            Vertices = Vertices[::-1]
+        for Vertex in Vertices:
+            Coordinates.extend(Vertex)
+    return Coordinates
+
+
+#Welds the corners that share their vertex, normal and UV coordinates.
+#Returns the welded vertex of every corner and the first corner of every
+#welded vertex.
+def WeldCorners(Corners, Normals, UVCoordinates):
+    CornerVertices = array.array("I")
+    VertexCorners = array.array("I")
+    WeldedVertices = {}
+    for Corner, Vertex in enumerate(Corners):
+        Key = (Vertex,) + tuple(Normals[Corner * 3:Corner * 3 + 3])
+        if UVCoordinates is not None:
+            Key += tuple(UVCoordinates[Corner * 2:Corner * 2 + 2])
+        WeldedVertex = WeldedVertices.get(Key)
+        if WeldedVertex is None:
+            WeldedVertex = WeldedVertices[Key] = len(VertexCorners)
+            VertexCorners.append(Corner)
+        CornerVertices.append(WeldedVertex)
+    return CornerVertices, VertexCorners
+
+
+#Returns the Size-component items of Values at Indexes.
+def SelectVectors(Values, Size, Indexes):
+    Selected = array.array(Values.typecode)
+    for Index in Indexes:
+        Selected.extend(Values[Index * Size:(Index + 1) * Size])
+    return Selected
+
+
+#Writes Values, Size components per item, as a vector list preceded by its
+#count.  Text output prints each component with Format.
+def WriteVectorList(Config, Values, Size, Format="{:9f};"):
+    Count = len(Values) // Size
+    if Config.FileFormat != 1:
+        Config.File.WriteIntegers([Count])
+        Config.File.WriteFloats(Values)
+        return
+
+    Whitespace = "  " * Config.Whitespace
+    Config.File.write("{}{};\n".format(Whitespace, Count))
+    if Count:
+        Line = Whitespace + Format * Size
+        Config.File.write(",\n".join([Line.format(*Values[Index:Index + Size])
+                                      for Index in range(0, len(Values), Size)]) + ";\n")
+
+
+#Writes the face list of Mesh, each polygon corner indexing the written
+#vertex CornerVertices gives for it.
+def WriteMeshFaces(Config, Mesh, CornerVertices):
+    Sizes = [len(Polygon.vertices) for Polygon in Mesh.polygons]
+    if Config.FileFormat != 1:
+        Faces = array.array("I", [len(Sizes)])
+        Index = 0
+        for Size in Sizes:
+            Faces.append(Size)
+            Faces.extend(CornerVertices[Index:Index + Size])
+            Index += Size
+        Config.File.WriteIntegers(Faces)
+        return
+
+    Whitespace = "  " * Config.Whitespace
+    Config.File.write("{}{};\n".format(Whitespace, len(Sizes)))
+    Faces = []
+    Index = 0
+    for Size in Sizes:
+        Faces.append("{}{};{}".format(Whitespace, Size, "".join(["{};".format(Vertex) for Vertex in CornerVertices[Index:Index + Size]])))
+        Index += Size
+    if Faces:
+        Config.File.write(",\n".join(Faces) + ";\n")
+
+
+#Writes the positions of the mesh vertices in VertexSources and the faces.
+def WriteMeshVertices(Config, Mesh, VertexSources, CornerVertices):
+    Coordinates = array.array("f", [0.0]) * (len(Mesh.vertices) * 3)
+    Mesh.vertices.foreach_get("co", Coordinates)
+
+    WriteVectorList(Config, SelectVectors(Coordinates, 3, VertexSources), 3)
+    WriteMeshFaces(Config, Mesh, CornerVertices)
+
+
+def WriteMeshNormals(Config, Mesh, Normals, CornerVertices):
+    Config.File.write("{}MeshNormals {{ //{} Normals\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
+    Config.Whitespace += 1
+
+    WriteVectorList(Config, Normals, 3)
+    WriteMeshFaces(Config, Mesh, CornerVertices)
     Config.Whitespace -= 1
     Config.File.write("{}}} //End of {} Normals\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
 
@@ -475,15 +740,14 @@ def WriteMeshMaterials(Config, Mesh):
                 MaterialIndexes[Materials[Polygon.material_index]] = len(MaterialIndexes)
 
         PolygonCount = len(Mesh.polygons)
-        Index = 0
-        Config.File.write("{}{};\n{}{};\n".format("  " * Config.Whitespace, len(MaterialIndexes), "  " * Config.Whitespace, PolygonCount))
-        for Polygon in Mesh.polygons:
-            Config.File.write("{}{}".format("  " * Config.Whitespace, MaterialIndexes[Materials[Polygon.material_index]]))
-            Index += 1
-            if Index == PolygonCount:
-                Config.File.write(";;\n")
-            else:
-                Config.File.write(",\n")
+        FaceIndexes = [MaterialIndexes[Materials[Polygon.material_index]] for Polygon in Mesh.polygons]
+        if Config.FileFormat != 1:
+            Config.File.WriteIntegers([len(MaterialIndexes), PolygonCount] + FaceIndexes)
+        else:
+            Whitespace = "  " * Config.Whitespace
+            Config.File.write("{}{};\n{}{};\n".format(Whitespace, len(MaterialIndexes), Whitespace, PolygonCount))
+            if FaceIndexes:
+                Config.File.write(",\n".join(["{}{}".format(Whitespace, Index) for Index in FaceIndexes]) + ";;\n")
 
         Materials = [Item[::-1] for Item in MaterialIndexes.items()]
         Materials.sort()
@@ -525,35 +789,49 @@ def WriteMaterial(Config, Material=None):
     Config.File.write("{}}}\n".format("  " * Config.Whitespace))
 
 
-def WriteMeshUVCoordinates(Config, Mesh):
+def WriteMeshUVCoordinates(Config, Mesh, UVCoordinates):
     Config.File.write("{}MeshTextureCoords {{ //{} UV Coordinates\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
     Config.Whitespace += 1
 
-    UVCoordinates = Mesh.uv_layers.active.data
-
-    Index = 0
-    VertexCount = GetMeshVertexCount(Mesh)
-    Config.File.write("{}{};\n".format("  " * Config.Whitespace, VertexCount))
-
-    for Polygon in Mesh.polygons:
-        Vertices = []
-        for Vertex in [UVCoordinates[Vertex] for Vertex in Polygon.loop_indices]:
-            Vertices.append(tuple(Vertex.uv))
-        if Config.CoordinateSystem == 1:
-            Vertices = Vertices[::-1]
-        for Vertex in Vertices:
-            Config.File.write("{}{:9f};{:9f};".format("  " * Config.Whitespace, Vertex[0], 1 - Vertex[1]))
-            Index += 1
-            if Index == VertexCount:
-                Config.File.write(";\n")
-            else:
-                Config.File.write(",\n")
+    WriteVectorList(Config, UVCoordinates, 2)
     
     Config.Whitespace -= 1
     Config.File.write("{}}} //End of {} UV Coordinates\n".format("  " * Config.Whitespace, LegalName(Mesh.name)))
 
 
-def WriteMeshSkinWeights(Config, Object, Mesh):
+#Returns the influence table of Mesh: one list of (bone name, weight) tuples per
+#vertex, built from the vertex groups that match a pose bone.  If
+#Config.MaxInfluences is set only the strongest influences are kept.  With
+#Config.NormalizeWeights the remaining weights of each vertex sum to 1.
+def GetVertexInfluences(Config, Object, Mesh, PoseBones):
+    BoneGroups = {i: Group.name for (i, Group) in enumerate(Object.vertex_groups)
+                  if Group.name in PoseBones}
+
+    Influences = []
+    for Vertex in Mesh.vertices:
+        VertexInfluences = [(BoneGroups[Group.group], Group.weight)
+                            for Group in Vertex.groups
+                            if Group.group in BoneGroups]
+
+        if Config.MaxInfluences and len(VertexInfluences) > Config.MaxInfluences:
+            VertexInfluences.sort(key=lambda Influence: Influence[1], reverse=True)
+            del VertexInfluences[Config.MaxInfluences:]
+
+        if Config.NormalizeWeights:
+            WeightTotal = sum(Weight for Name, Weight in VertexInfluences)
+            if WeightTotal:
+                VertexInfluences = [(Name, Weight / WeightTotal)
+                                    for Name, Weight in VertexInfluences]
+            else:
+                VertexInfluences = [(Name, 0.0) for Name, Weight in VertexInfluences]
+
+        Influences.append(VertexInfluences)
+    return Influences
+
+
+#Writes the skin weights of the written vertices, whose mesh vertices are
+#given by VertexSources.
+def WriteMeshSkinWeights(Config, Object, Mesh, VertexSources):
     ArmatureList = [Modifier for Modifier in Object.modifiers if Modifier.type == "ARMATURE"]
     if ArmatureList:
         ArmatureObject = ArmatureList[0].object
@@ -561,26 +839,19 @@ def WriteMeshSkinWeights(Config, Object, Mesh):
 
         PoseBones = ArmatureObject.pose.bones
 
-        MaxInfluences = 0
-        UsedBones = set()
-        #Maps bones to a list of vertices they affect
-        VertexGroups = {}
-        ObjectVertexGroups = {i: Group.name for (i, Group) in enumerate(Object.vertex_groups)}
-        for Vertex in Mesh.vertices:
-            #BoneInfluences contains the bones of the armature that affect the current vertex
-            BoneInfluences = [PoseBone for Group in Vertex.groups
-                              for PoseBone in (PoseBones.get(ObjectVertexGroups.get(Group.group, "")), )
-                              if PoseBone is not None
-                              ]
-
-            if len(BoneInfluences) > MaxInfluences:
-                MaxInfluences = len(BoneInfluences)
-            for Bone in BoneInfluences:
-                UsedBones.add(Bone)
-                if Bone not in VertexGroups:
-                    VertexGroups[Bone] = [Vertex]
-                else:
-                    VertexGroups[Bone].append(Vertex)
+        Influences = GetVertexInfluences(Config, Object, Mesh, PoseBones)
+        MaxInfluences = max([len(VertexInfluences) for VertexInfluences in Influences] or [0])
+
+        #Maps bones to the (written vertex indexes, weights) they affect
+        BoneVertices = {}
+        for Index, Vertex in enumerate(VertexSources):
+            for Name, Weight in Influences[Vertex]:
+                if Name not in BoneVertices:
+                    BoneVertices[Name] = ([], [])
+                Vertices = BoneVertices[Name]
+                Vertices[0].append(Index)
+                Vertices[1].append(Weight)
+        UsedBones = [Bone for Bone in PoseBones if Bone.name in BoneVertices]
         BoneCount = len(UsedBones)
 
         Config.File.write("{}XSkinMeshHeader {{\n".format("  " * Config.Whitespace))
@@ -590,55 +861,21 @@ def WriteMeshSkinWeights(Config, Object, Mesh):
         Config.File.write("{}}}\n".format("  " * Config.Whitespace))
 
         for Bone in UsedBones:
-            VertexCount = 0
-            VertexIndexes = [Vertex.index for Vertex in VertexGroups[Bone]]
-            for Polygon in Mesh.polygons:
-                for Vertex in Polygon.vertices:
-                    if Vertex in VertexIndexes:
-                        VertexCount += 1
+            VertexIndexes, VertexWeights = BoneVertices[Bone.name]
+            VertexCount = len(VertexIndexes)
 
             Config.File.write("{}SkinWeights {{\n".format("  " * Config.Whitespace))
             Config.Whitespace += 1
             Config.File.write("{}\"{}\";\n{}{};\n".format("  " * Config.Whitespace, LegalName(ArmatureObject.name) + "_" + LegalName(Bone.name), "  " * Config.Whitespace, VertexCount))
 
-            VertexWeights = []
-            Index = 0
-            WrittenIndexes = 0
-            for Polygon in Mesh.polygons:
-                PolygonVertices = list(Polygon.vertices)
-                if Config.CoordinateSystem == 1:
-                    PolygonVertices = PolygonVertices[::-1]
-                for Vertex in PolygonVertices:
-                    if Vertex in VertexIndexes:
-                        Config.File.write("{}{}".format("  " * Config.Whitespace, Index))
-
-                        GroupIndexes = {ObjectVertexGroups.get(Group.group): Index
-                                        for Index, Group in enumerate(Mesh.vertices[Vertex].groups)
-                                        if ObjectVertexGroups.get(Group.group, "") in PoseBones}
-
-                        WeightTotal = 0.0
-                        for Weight in (Group.weight for Group in Mesh.vertices[Vertex].groups if ObjectVertexGroups.get(Group.group, "") in PoseBones):
-                            WeightTotal += Weight
-
-                        if WeightTotal:
-                            VertexWeights.append(Mesh.vertices[Vertex].groups[GroupIndexes[Bone.name]].weight / WeightTotal)
-                        else:
-                            VertexWeights.append(0.0)
-
-                        WrittenIndexes += 1
-                        if WrittenIndexes == VertexCount:
-                            Config.File.write(";\n")
-                        else:
-                            Config.File.write(",\n")
-                    Index += 1
+            if Config.FileFormat != 1:
+                Config.File.WriteIntegers(VertexIndexes)
+                Config.File.WriteFloats(VertexWeights)
+            else:
+                Whitespace = "  " * Config.Whitespace
+                Config.File.write(",\n".join(["{}{}".format(Whitespace, Index) for Index in VertexIndexes]) + ";\n")
+                Config.File.write(",\n".join(["{}{:8f}".format(Whitespace, Weight) for Weight in VertexWeights]) + ";\n")
 
-            for Index, Weight in enumerate(VertexWeights):
-                Config.File.write("{}{:8f}".format("  " * Config.Whitespace, Weight))
-                if Index == (VertexCount - 1):
-                    Config.File.write(";\n")
-                else:
-                    Config.File.write(",\n")
-            
             RestBone = ArmatureBones[Bone.name]
             
             #BoneMatrix transforms mesh vertices into the space of the bone.
@@ -987,175 +1224,124 @@ def WriteKeyedAnimationSet(Config):
     Config.Whitespace -= 1
     Config.File.write("{}}} //End of AnimationSet\n".format("  " * Config.Whitespace))
 
+#Returns the frames (key indexes) of the Size-component keys in Values that
+#can't be linearly interpolated from the surrounding kept keys within
+#Tolerance.  The first and last key are always kept.
+def ReduceKeys(Values, Size, Tolerance):
+    Count = len(Values) // Size
+    if Tolerance <= 0.0 or Count < 3:
+        return list(range(Count))
+
+    #Constant tracks (unanimated channels) only need the end keys
+    if all(Values[Index] == Values[Index % Size] for Index in range(len(Values))):
+        return [0, Count - 1]
+
+    Frames = [0]
+    Start = 0
+    for Frame in range(1, Count - 1):
+        End = Frame + 1
+        for Between in range(Start + 1, End):
+            Factor = (Between - Start) / (End - Start)
+            if any(abs(Values[Start * Size + Component] +
+                       (Values[End * Size + Component] - Values[Start * Size + Component]) * Factor -
+                       Values[Between * Size + Component]) > Tolerance
+                   for Component in range(Size)):
+                Frames.append(Frame)
+                Start = Frame
+                break
+    Frames.append(Count - 1)
+    return Frames
+
+
+#Writes an AnimationKey block for the Size-component Values sampled at every
+#frame, reduced with Config.KeyTolerance.
+def WriteAnimationKey(Config, KeyType, Comment, Values, Size):
+    Frames = ReduceKeys(Values, Size, Config.KeyTolerance)
+
+    Config.File.write("{}AnimationKey {{ //{}\n".format("  " * Config.Whitespace, Comment))
+    Config.Whitespace += 1
+    Config.File.write("{}{};\n{}{};\n".format("  " * Config.Whitespace, KeyType, "  " * Config.Whitespace, len(Frames)))
+
+    Whitespace = "  " * Config.Whitespace
+    Keys = []
+    for Frame in Frames:
+        Key = list(Values[Frame * Size:(Frame + 1) * Size])
+        if Size == 4:
+            Key[0] = -Key[0]
+        if Config.FileFormat != 1:
+            Config.File.WriteIntegers([Frame, Size])
+            Config.File.WriteFloats(Key)
+        else:
+            Keys.append("{}{}{};;".format(Whitespace, (str(Frame) + ";{};".format(Size)).ljust(8), ",".join(["{:9f}".format(Value) for Value in Key])))
+    if Keys:
+        Config.File.write(",\n".join(Keys) + ";\n")
+
+    Config.Whitespace -= 1
+    Config.File.write("{}}}\n".format("  " * Config.Whitespace))
+
+
 def WriteFullAnimationSet(Config):
     Config.File.write("{}AnimationSet {{\n".format("  " * Config.Whitespace))
     Config.Whitespace += 1
-    
-    KeyframeCount = bpy.context.scene.frame_end - bpy.context.scene.frame_start + 1
-    
+
+    Scene = bpy.context.scene
+    KeyframeCount = Scene.frame_end - Scene.frame_start + 1
+
+    #Every exported object and, with armatures, pose bone is an animation target
+    Targets = []
     for Object in Config.ObjectList:
-        if Config.Verbose:
-            print("  Writing Animation Data for Object: {}".format(Object.name))
-        
-        Config.File.write("{}Animation {{\n".format("  " * Config.Whitespace))
-        Config.Whitespace += 1
-        Config.File.write("{}{{{}}}\n".format("  " * Config.Whitespace, LegalName(Object.name)))
-        
-        #Position
-        if Config.Verbose:
-            print("    Writing Position...")
-        Config.File.write("{}AnimationKey {{ //Position\n".format("  " * Config.Whitespace))
-        Config.Whitespace += 1
-        Config.File.write("{}2;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-        for Frame in range(0, KeyframeCount):
-            bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-            Position = Object.matrix_local.to_translation()
-            Config.File.write("{}{}{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";3;").ljust(8), Position[0], Position[1], Position[2]))
-            if Frame == KeyframeCount-1:
-                Config.File.write(";\n")
-            else:
-                Config.File.write(",\n")
-        Config.Whitespace -= 1
-        Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-        if Config.Verbose:
-            print("    Done")
-        
-        #Rotation
-        if Config.Verbose:
-            print("    Writing Rotation...")
-        Config.File.write("{}AnimationKey {{ //Rotation\n".format("  " * Config.Whitespace))
-        Config.Whitespace += 1
-        Config.File.write("{}0;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-        for Frame in range(0, KeyframeCount):
-            bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-            Rotation = Object.rotation_euler.to_quaternion()
-            Config.File.write("{}{}{:9f},{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";4;").ljust(8), -Rotation[0], Rotation[1], Rotation[2], Rotation[3]))
-            if Frame == KeyframeCount-1:
-                Config.File.write(";\n")
+        Targets.append((LegalName(Object.name), Object, None))
+        if Config.ExportArmatures and Object.type == "ARMATURE":
+            for Bone in Object.pose.bones:
+                Targets.append((LegalName(Object.name) + "_" + LegalName(Bone.name), Object, Bone))
+
+    #Step the timeline once, capturing the local transforms of all targets
+    if Config.Verbose:
+        print("  Sampling {} Frames...".format(KeyframeCount))
+    Positions = [array.array("d", [0.0]) * (KeyframeCount * 3) for Target in Targets]
+    Rotations = [array.array("d", [0.0]) * (KeyframeCount * 4) for Target in Targets]
+    Scales = [array.array("d", [0.0]) * (KeyframeCount * 3) for Target in Targets]
+    for Frame in range(0, KeyframeCount):
+        Scene.frame_set(Frame + Scene.frame_start)
+        for Index, (Name, Object, Bone) in enumerate(Targets):
+            if Bone is None:
+                Position = Object.matrix_local.to_translation()
+                Rotation = Object.rotation_euler.to_quaternion()
+                Scale = Object.matrix_local.to_scale()
             else:
-                Config.File.write(",\n")
-        Config.Whitespace -= 1
-        Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-        if Config.Verbose:
-            print("    Done")
-        
-        #Scale
+                if Bone.parent:
+                    PoseMatrix = Bone.parent.matrix.inverted()
+                else:
+                    PoseMatrix = Matrix()
+                PoseMatrix *= Bone.matrix
+
+                Position = PoseMatrix.to_translation()
+                Rotation = Object.data.bones[Bone.name].matrix.to_quaternion() * Bone.rotation_quaternion
+                Scale = PoseMatrix.to_scale()
+
+            Positions[Index][Frame * 3:Frame * 3 + 3] = array.array("d", Position[0:3])
+            Rotations[Index][Frame * 4:Frame * 4 + 4] = array.array("d", Rotation[0:4])
+            Scales[Index][Frame * 3:Frame * 3 + 3] = array.array("d", Scale[0:3])
+    if Config.Verbose:
+        print("  Done")
+
+    for Index, (Name, Object, Bone) in enumerate(Targets):
         if Config.Verbose:
-            print("    Writing Scale...")
-        Config.File.write("{}AnimationKey {{ //Scale\n".format("  " * Config.Whitespace))
+            print("  Writing Animation Data for: {}".format(Name))
+
+        Config.File.write("{}Animation {{\n".format("  " * Config.Whitespace))
         Config.Whitespace += 1
-        Config.File.write("{}1;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-        for Frame in range(0, KeyframeCount):
-            bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-            Scale = Object.matrix_local.to_scale()
-            Config.File.write("{}{}{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";3;").ljust(8), Scale[0], Scale[1], Scale[2]))
-            if Frame == KeyframeCount-1:
-                Config.File.write(";\n")
-            else:
-                Config.File.write(",\n")
-        Config.Whitespace -= 1
-        Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-        if Config.Verbose:
-            print("    Done")
-        
+        Config.File.write("{}{{{}}}\n".format("  " * Config.Whitespace, Name))
+
+        WriteAnimationKey(Config, 2, "Position", Positions[Index], 3)
+        WriteAnimationKey(Config, 0, "Rotation", Rotations[Index], 4)
+        WriteAnimationKey(Config, 1, "Scale", Scales[Index], 3)
+
         Config.Whitespace -= 1
         Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-        
-        if Config.ExportArmatures and Object.type == "ARMATURE":
-            if Config.Verbose:
-                print("    Writing Armature Bone Animation Data...")
-            PoseBones = Object.pose.bones
-            Bones = Object.data.bones
-            for Bone in PoseBones:
-                if Config.Verbose:
-                    print("      Writing Bone: {}...".format(Bone.name))
-                
-                Config.File.write("{}Animation {{\n".format("  " * Config.Whitespace))
-                Config.Whitespace += 1
-                Config.File.write("{}{{{}}}\n".format("  " * Config.Whitespace, LegalName(Object.name) + "_" + LegalName(Bone.name)))
-                
-                #Position
-                if Config.Verbose:
-                    print("        Writing Position...")
-                Config.File.write("{}AnimationKey {{ //Position\n".format("  " * Config.Whitespace))
-                Config.Whitespace += 1
-                Config.File.write("{}2;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-                for Frame in range(0, KeyframeCount):
-                    bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-                    
-                    if Bone.parent:
-                        PoseMatrix = Bone.parent.matrix.inverted()
-                    else:
-                        PoseMatrix = Matrix()
-                    PoseMatrix *= Bone.matrix
-                    
-                    Position = PoseMatrix.to_translation()
-                    Config.File.write("{}{}{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";3;").ljust(8), Position[0], Position[1], Position[2]))
-                    if Frame == KeyframeCount-1:
-                        Config.File.write(";\n")
-                    else:
-                        Config.File.write(",\n")
-                Config.Whitespace -= 1
-                Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-                if Config.Verbose:
-                    print("        Done")
-                
-                #Rotation
-                if Config.Verbose:
-                    print("        Writing Rotation...")
-                Config.File.write("{}AnimationKey {{ //Rotation\n".format("  " * Config.Whitespace))
-                Config.Whitespace += 1
-                Config.File.write("{}0;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-                for Frame in range(0, KeyframeCount):
-                    bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-                    
-                    Rotation = Bones[Bone.name].matrix.to_quaternion() * Bone.rotation_quaternion
-                    
-                    Config.File.write("{}{}{:9f},{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";4;").ljust(8), -Rotation[0], Rotation[1], Rotation[2], Rotation[3]))
-                    if Frame == KeyframeCount-1:
-                        Config.File.write(";\n")
-                    else:
-                        Config.File.write(",\n")
-                Config.Whitespace -= 1
-                Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-                if Config.Verbose:
-                    print("        Done")
-                
-                #Scale
-                if Config.Verbose:
-                    print("        Writing Scale...")
-                Config.File.write("{}AnimationKey {{ //Scale\n".format("  " * Config.Whitespace, KeyframeCount))
-                Config.Whitespace += 1
-                Config.File.write("{}1;\n{}{};\n".format("  " * Config.Whitespace, "  " * Config.Whitespace, KeyframeCount))
-                for Frame in range(0, KeyframeCount):
-                    bpy.context.scene.frame_set(Frame + bpy.context.scene.frame_start)
-                    
-                    if Bone.parent:
-                        PoseMatrix = Bone.parent.matrix.inverted()
-                    else:
-                        PoseMatrix = Matrix()
-                    PoseMatrix *= Bone.matrix
-                    
-                    Scale = PoseMatrix.to_scale()
-                    Config.File.write("{}{}{:9f},{:9f},{:9f};;".format("  " * Config.Whitespace, (str(Frame) + ";3;").ljust(8), Scale[0], Scale[1], Scale[2]))
-                    if Frame == KeyframeCount-1:
-                        Config.File.write(";\n")
-                    else:
-                        Config.File.write(",\n")
-                Config.Whitespace -= 1
-                Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-                if Config.Verbose:
-                    print("        Done")
-                
-                Config.Whitespace -= 1
-                Config.File.write("{}}}\n".format("  " * Config.Whitespace))
-                if Config.Verbose:
-                    print("      Done") #Done with Armature Bone
-            if Config.Verbose:
-                print("    Done") #Done with Armature Bone data
         if Config.Verbose:
-            print("  Done")  #Done with Object
-    
+            print("  Done")
+
     Config.Whitespace -= 1
     Config.File.write("{}}} //End of AnimationSet\n".format("  " * Config.Whitespace))
 
@@ -1185,8 +1371,14 @@ ExportModes = (
     ("2", "Selected Objects", ""),
     )
 
+FileFormats = (
+    ("1", "Text", ""),
+    ("2", "Binary", ""),
+    ("3", "Compressed Binary", "MSZIP compressed binary, not supported by the engine's .x loader"),
+    )
+
 
-from bpy.props import StringProperty, EnumProperty, BoolProperty
+from bpy.props import StringProperty, EnumProperty, BoolProperty, IntProperty, FloatProperty
 
 
 class DirectXExporter(bpy.types.Operator):
@@ -1217,6 +1409,12 @@ class DirectXExporter(bpy.types.Operator):
         name="Apply Modifiers",
         description="Apply object modifiers before export",
         default=False)
+    WeldVertices = BoolProperty(
+        name="Weld Vertices",
+        description="Share vertices between polygon corners with the same " \
+                    "position, normal and UV coordinates instead of writing " \
+                    "one vertex per corner",
+        default=False)
     IncludeFrameRate = BoolProperty(
         name="Include Frame Rate",
         description="Include the AnimTicksPerSecond template which is used by " \
@@ -1230,6 +1428,17 @@ class DirectXExporter(bpy.types.Operator):
         name="Export Armatures",
         description="Export the bones of any armatures to deform meshes",
         default=False)
+    MaxInfluences = IntProperty(
+        name="Max Bone Influences",
+        description="Keep only the strongest bone influences of each vertex " \
+                    "(0 = no limit)",
+        default=0,
+        min=0,
+        max=16)
+    NormalizeWeights = BoolProperty(
+        name="Normalize Weights",
+        description="Scale the bone weights of each vertex so they sum to 1",
+        default=True)
     ExportAnimation = EnumProperty(
         name="Animations",
         description="Select the type of animations to export. Only object " \
@@ -1237,6 +1446,14 @@ class DirectXExporter(bpy.types.Operator):
                     "Animation exports every frame",
         items=AnimationModes,
         default="0")
+    KeyTolerance = FloatProperty(
+        name="Key Reduction Tolerance",
+        description="Full Animation only: drop keys that can be linearly " \
+                    "interpolated from their neighbours within this " \
+                    "tolerance (0 = keep every frame)",
+        default=0.0,
+        min=0.0,
+        precision=4)
 
     #Export Mode
     ExportMode = EnumProperty(
@@ -1246,6 +1463,14 @@ class DirectXExporter(bpy.types.Operator):
         items=ExportModes,
         default="1")
 
+    FileFormat = EnumProperty(
+        name="File Format",
+        description="Write a text file or a binary token stream, which " \
+                    "loads faster. Compressed Binary files can't be loaded " \
+                    "by the engine",
+        items=FileFormats,
+        default="1")
+
     Verbose = BoolProperty(
         name="Verbose",
         description="Run the exporter in debug mode. Check the console for output",
@@ -1261,11 +1486,16 @@ class DirectXExporter(bpy.types.Operator):
                                          RotateX=self.RotateX,
                                          FlipNormals=self.FlipNormals,
                                          ApplyModifiers=self.ApplyModifiers,
+                                         WeldVertices=self.WeldVertices,
                                          IncludeFrameRate=self.IncludeFrameRate,
                                          ExportTextures=self.ExportTextures,
                                          ExportArmatures=self.ExportArmatures,
                                          ExportAnimation=self.ExportAnimation,
                                          ExportMode=self.ExportMode,
+                                         MaxInfluences=self.MaxInfluences,
+                                         NormalizeWeights=self.NormalizeWeights,
+                                         KeyTolerance=self.KeyTolerance,
+                                         FileFormat=self.FileFormat,
                                          Verbose=self.Verbose)
 
         ExportDirectX(Config)
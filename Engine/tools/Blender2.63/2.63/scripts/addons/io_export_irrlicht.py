@@ -35,6 +35,14 @@ import platform
 import zipfile
 import glob
 import collections
+import array
+import io
+import re
+import hashlib
+import json
+import concurrent.futures
+import itertools
+import operator
 
 # Notes:
 #
@@ -177,6 +185,15 @@ EVT_STANDARD = 0
 EVT_2TCOORDS = 1
 EVT_TANGENTS = 2
 
+# incremental export manifest (irrb.manifest) format version
+MANIFEST_VERSION = 1
+
+# number of vertices/indices/weights formatted per .irrmesh write
+WRITE_CHUNK_SIZE = 4096
+
+# shape key deltas at or below this are ignored
+MORPH_EPSILON = 1e-6
+
 E_COMPARISON_FUNC = {
     'ECFN_NEVER': 0,
     'ECFN_LESSEQUAL': 1,
@@ -266,6 +283,9 @@ _G = {
         'pack': False,
         'makeexec': False,
         'binary': False,
+        'incremental': False,
+        'jobs': 1,
+        'morph_quantize': 0.0,
         'debug': True,
         'walktest': True,
         'out_directory': '',
@@ -550,6 +570,89 @@ def getGUIInterface(itype):
     else:
         return IGUIDebug()
 
+#=============================================================================
+#                        i E x p o r t P i p e l i n e
+#=============================================================================
+# Serialization stage of the exporter.  Geometry is extracted from bpy on the
+# Blender thread, the bpy independent jobs (mesh file writing, zip packing)
+# are handed to a pool of worker processes.  Results are collected in
+# submission order so logs, stats and the manifest don't depend on worker
+# scheduling.  With jobs <= 1, or without fork() (the Windows Blender
+# executable can't host multiprocessing workers), jobs run inline.
+class iExportPipeline:
+    def __init__(self, jobs=1):
+        self.jobs = max(1, jobs)
+        self.executor = None
+        self.pending = []
+
+        if (self.jobs > 1) and hasattr(os, 'fork'):
+            try:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.jobs)
+            except (ImportError, NotImplementedError, OSError):
+                self.executor = None
+
+    #=========================================================================
+    #                           i s P a r a l l e l
+    #=========================================================================
+    def isParallel(self):
+        return self.executor != None
+
+    #=========================================================================
+    #                              s u b m i t
+    #=========================================================================
+    # Arguments are pickled asynchronously when running in parallel - they
+    # must not be modified after submit().
+    def submit(self, name, fn, *args):
+        if self.executor == None:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            # bound the number of in flight jobs (and their memory)
+            running = [f for n, f in self.pending if not f.done()]
+            if len(running) >= self.jobs * 2:
+                concurrent.futures.wait(running,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+            future = self.executor.submit(fn, *args)
+
+        self.pending.append((name, future))
+        return future
+
+    #=========================================================================
+    #                               w a i t
+    #=========================================================================
+    # Waits for all submitted jobs, returns [(name, exception), ...] for the
+    # failed ones in submission order.
+    def wait(self):
+        errors = []
+        for name, future in self.pending:
+            if future.cancelled():
+                continue
+            e = future.exception()
+            if e != None:
+                errors.append((name, e))
+        self.pending = []
+        return errors
+
+    #=========================================================================
+    #                              c a n c e l
+    #=========================================================================
+    def cancel(self):
+        for name, future in self.pending:
+            future.cancel()
+        self.wait()
+
+    #=========================================================================
+    #                            s h u t d o w n
+    #=========================================================================
+    def shutdown(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
+
 #=============================================================================
 #                             _ z i p F i l e s
 #=============================================================================
@@ -715,79 +818,147 @@ def getIrrMaterial(name):
     return None
 
 #=============================================================================
-#                               w r i t e T G A
+#                              _ e n c o d e T G A
 #=============================================================================
-def writeTGA(bImage, outFilename, RLE=True, callBack=None):
-    file = open(outFilename, 'wb')
-
-    width, height = bImage.size
-    bpp = bImage.depth
-
-    if bpp < 24:
-        file.close()
-        print('writeTGA only handles 24 or 32 bit images')
-        return 1
-
-    header = [chr(0) for x in range(18)]
-    if RLE:
-        header[2] = chr(10)     # rle bgra image
-    else:
-        header[2] = chr(2)      # bgra image
-    header[13] = chr(width / 256)
-    header[12] = chr(width % 256)
-    header[15] = chr(height / 256)
-    header[14] = chr(height % 256)
-    header[16] = chr(bpp)       # 24 or 32 bpp
-    if bpp == 32:
-        header[17] = chr(3)    # 00vhaaaa - useful alpha data
+# Encodes RGBA float pixels (bImage.pixels layout - bottom row first) as a
+# 24 or 32 bit (optionally RLE compressed) TGA and writes it with a single
+# write.  bpy independent, so it can run in an iExportPipeline worker.
+_tgaHeader = struct.Struct('<B B B H H B H H H H B B')
+_tgaLevels = None
+def _encodeTGA(outFilename, width, height, bpp, pixels, RLE=True,
+    callBack=None):
+    global _tgaLevels
 
     #
-    # write header
+    # quantize to 8 bit rgba.  8 bit images hold k/255 floats which are
+    # mapped back through a (float bits -> k) table, float images fall back
+    # to clamping & rounding each value.
     #
-    for byte in header:
-        file.write(byte)
+    if _tgaLevels == None:
+        scale = array.array('f', [1.0 / 255.0])[0]
+        levels = array.array('f', [k / 255.0 for k in range(256)] +
+            [k * scale for k in range(256)])
+        keys = array.array('I')
+        keys.frombytes(levels.tobytes())
+        _tgaLevels = dict(zip(keys, list(range(256)) * 2))
+
+    bits = array.array('I')
+    bits.frombytes(array.array('f', pixels).tobytes())
+    try:
+        rgba = bytes(map(_tgaLevels.__getitem__, bits))
+    except KeyError:
+        if (min(pixels) < 0.0) or (max(pixels) > 1.0):
+            pixels = [min(max(v, 0.0), 1.0) for v in pixels]
+        rgba = bytes([int(v * 255.0 + 0.5) for v in pixels])
+
+    # swizzle to bgra, 24 bit images compare/store their pixels with an
+    # opaque alpha so it doesn't split runs.
+    bgra = bytearray(rgba)
+    bgra[0::4] = rgba[2::4]
+    bgra[2::4] = rgba[0::4]
+    if bpp == 24:
+        bgra[3::4] = b'\xff' * (width * height)
+
+    if bpp == 32:
+        data = bgra
+        descriptor = 8      # 00vhaaaa - 8 bits of alpha, bottom left origin
+    else:
+        data = bytearray(width * height * 3)
+        data[0::3] = bgra[0::4]
+        data[1::3] = bgra[1::4]
+        data[2::3] = bgra[2::4]
+        descriptor = 0
+
+    header = _tgaHeader.pack(0, 0, 10 if RLE else 2, 0, 0, 0, 0, 0,
+        width, height, bpp, descriptor)
+
+    if not RLE:
+        file = open(outFilename, 'wb')
+        file.write(header + data)
+        file.close()
+        return 0
 
     #
-    # write data
+    # run-length encode each row.  Runs of equal pixels (found with
+    # C level compares of the packed pixel values) become run packets, the
+    # pixels between them raw packets.  Packets never cross a row.
     #
+    values = array.array('I')
+    values.frombytes(bytes(bgra))
+    psize = bpp // 8
+    out = [header]
+    neverEqual = [False]
     for y in range(height):
-        if (callBack != None) and ((y % 10) == 0):
+        if (callBack != None) and ((y % 64) == 0):
             callBack(y)
-        runLength = 1
-        first = True
-        lastPixel = ''
-        for x in range(width):
-            p = bImage.getPixelI(x, y)   # rgba
-            pixel = chr(p[2]) + chr(p[1]) + chr(p[0])
-            if bpp == 32:
-                pixel += chr(p[3])
-
-            if not RLE:
-                file.write(pixel)
-            else:
-                if first:
-                    lastPixel = pixel
-                    first = False
-                else:
-                    if (pixel != lastPixel) or (runLength == 128):
-                        packet = chr(128 + runLength - 1)
-                        rleData = packet + lastPixel
-                        file.write(rleData)
-                        lastPixel = pixel
-                        runLength = 1
-                    else:
-                        runLength += 1
-        #
-        # write last run
-        #
-        if RLE:
-            packet = chr(128 + runLength - 1)
-            rleData = packet + lastPixel
-            file.write(rleData)
 
+        row = values[y * width:(y + 1) * width]
+        rdata = data[y * width * psize:(y + 1) * width * psize]
+
+        # equal[i] - pixel i + 1 equals pixel i
+        equal = list(map(operator.eq, row[1:], row[:-1]))
+        starts = itertools.compress(itertools.count(),
+            map(operator.gt, equal, neverEqual + equal[:-1]))
+        ends = itertools.compress(itertools.count(1),
+            map(operator.gt, equal, equal[1:] + neverEqual))
+
+        x = 0
+        for first, last in zip(starts, ends):
+            # raw packets up to the run
+            while x < first:
+                count = min(first - x, 128)
+                out.append(bytes((count - 1,)))
+                out.append(rdata[x * psize:(x + count) * psize])
+                x += count
+
+            # run packets
+            pixel = rdata[first * psize:(first + 1) * psize]
+            while x <= last:
+                count = min(last - x + 1, 128)
+                out.append(bytes((128 + count - 1,)))
+                out.append(pixel)
+                x += count
+
+        while x < width:
+            count = min(width - x, 128)
+            out.append(bytes((count - 1,)))
+            out.append(rdata[x * psize:(x + count) * psize])
+            x += count
+
+    file = open(outFilename, 'wb')
+    file.write(b''.join(out))
     file.close()
     return 0
 
+#=============================================================================
+#                            _ g e t T G A P i x e l s
+#=============================================================================
+# Grabs the whole pixel buffer in one go, returns (width, height, bpp,
+# pixels) or None if the image can't be written as a TGA.
+def _getTGAPixels(bImage):
+    width, height = bImage.size
+    bpp = bImage.depth
+
+    if bpp < 24:
+        print('writeTGA only handles 24 or 32 bit images')
+        return None
+
+    if bpp != 24:
+        bpp = 32
+
+    return (width, height, bpp, array.array('f', bImage.pixels[:]))
+
+#=============================================================================
+#                               w r i t e T G A
+#=============================================================================
+def writeTGA(bImage, outFilename, RLE=True, callBack=None):
+    result = _getTGAPixels(bImage)
+    if result == None:
+        return 1
+
+    width, height, bpp, pixels = result
+    return _encodeTGA(outFilename, width, height, bpp, pixels, RLE, callBack)
+
 #=============================================================================
 #                         a d d S t a r t M e s s a g e
 #=============================================================================
@@ -865,6 +1036,20 @@ def _formatFloats(ftuple, prefix=', '):
         
     return res            
 
+#=============================================================================
+#                          _ t r i m F l o a t s
+#=============================================================================
+# Applies the _formatFloats trimming rules to a block of space separated
+# '{:.6f}' formatted values: trailing zeros (and '.') are removed and '-0'
+# becomes '0'.  Hex colors & integers are left untouched.
+_reZeroFraction = re.compile(r'\.0+(?=[ \n])')
+_reTrailingZeros = re.compile(r'(\.\d*?[1-9])0+(?=[ \n])')
+_reNegativeZero = re.compile(r'(?<![\w.])-0(?=[ \n])')
+def _trimFloats(block):
+    block = _reZeroFraction.sub('', block)
+    block = _reTrailingZeros.sub(r'\1', block)
+    return _reNegativeZero.sub('0', block)
+
 #=============================================================================
 #                               o p e n L o g
 #=============================================================================
@@ -1321,7 +1506,8 @@ def getDirectory(scene, base, dname):
 def write(filename, operator, context, OutDirectory, CreateSceneFile,
     SelectedOnly, ExportLights, ExportCameras, ExportAnimations,
      ExportAnimationTails, ExportPhysics, ExportPack, ExportExec, ExportBinary,
-     runWalkTest, IrrlichtVersion):
+     runWalkTest, IrrlichtVersion, ExportIncremental=False, ExportJobs=1,
+     ExportMorphQuantize=0.0):
     
     if ('save_on_export' in _G['export']) and (_G['export']['save_on_export']): 
         _saveConfig()
@@ -1350,7 +1536,8 @@ def write(filename, operator, context, OutDirectory, CreateSceneFile,
                 ExportLights, ExportCameras, ExportAnimations, ExportAnimationTails, 
                 ExportPhysics, ExportPack, ExportExec, ExportBinary,
                 True, runWalkTest, gVersionList[IrrlichtVersion],
-                gMeshCvtPath, WalkTestPath)
+                gMeshCvtPath, WalkTestPath, ExportIncremental, ExportJobs,
+                ExportMorphQuantize)
 
     exporter.doExport()
     operator.report({'INFO'}, 'irrb Export Done.')
@@ -1401,6 +1588,24 @@ def _registerIrrbProperties():
         description='Pack files into a single {scene}.zip file', default=_G['export']['pack'],
         options=emptySet)
 
+    bpy.types.Scene.irrb_export_incremental = BoolProperty(
+        name='Incremental',
+        description='Only rewrite meshes & images that changed since the ' \
+            'last export (irrb.manifest)',
+        default=_G['export']['incremental'], options=emptySet)
+
+    bpy.types.Scene.irrb_export_jobs = IntProperty(name='Jobs',
+        description='Number of worker processes used to write mesh & ' \
+            'pack files (1 = write on the Blender thread)',
+        default=_G['export']['jobs'], min=1, max=64, options=emptySet)
+
+    bpy.types.Scene.irrb_export_morph_quantize = FloatProperty(
+        name='Shape Key Precision',
+        description='Snap shape key (morph target) deltas to multiples of ' \
+            'this value, smaller moves are dropped (0 = exact)',
+        default=float(_G['export']['morph_quantize']), min=0.0,
+        precision=4, options=emptySet)
+
     bpy.types.Scene.irrb_export_makeexec = BoolProperty(name='Make Executable',
         description='Make scene file executable', default=False,
         options=emptySet)
@@ -3416,7 +3621,7 @@ class iMesh:
         # get mesh shape keys
         self.bKey = self.bMesh.shape_keys
         if self.bKey:
-            self.bKeyBlocks = self.bKey.keys
+            self.bKeyBlocks = self.bKey.key_blocks
 
         # get mesh armatures - ignore parent armatures for now, currently when
         # an object is parented to an armature, it is also added to objects
@@ -3561,7 +3766,7 @@ class iMesh:
         count = 0
 
         for buf in self.meshBuffers:
-            count += len(buf.vertices)
+            count += buf.getVertexCount()
 
         return count
 
@@ -3571,7 +3776,7 @@ class iMesh:
     def getFaceCount(self):
         count = 0
         for buf in self.meshBuffers:
-            count += len(buf.faces)
+            count += buf.getFaceCount()
 
         return count
 
@@ -3637,25 +3842,186 @@ class iMesh:
         return (matName, bMaterial)
 
     #=========================================================================
-    #                    c r e a t e M e s h B u f f e r s
+    #                       _ g e t M e s h B u f f e r
     #=========================================================================
-    def createMeshBuffers(self):
-        if self.debug:
-            self._writeDebugInfo()
+    def _getMeshBuffer(self, face):
+        #
+        # 'matName' is assigned based on blender material name and
+        # uv texture image data.  This allows for faces to be assigned
+        # unique images within uv layers.
+        #
+        matName, bMaterial = self._getMaterialInfo(face)
+
+        # check if we have already created a meshbuffer for this material
+        if matName in self.materials:
+            return self.materials[matName]
+
+        material = iMaterial(self.bObject, self.bMesh, matName, self.exporter,
+            bMaterial, face)
+
+        # create the meshbuffer and update the material dict & mesh
+        # buffer list
+        meshBuffer = iMeshBuffer(self.exporter, self.bObject, self.bMesh,
+                material, matName, len(self.meshBuffers), self.armatures)
+        self.materials[matName] = meshBuffer
+        self.meshBuffers.append(meshBuffer)
+        return meshBuffer
+
+    #=========================================================================
+    #                  _ g e t C o r n e r C o l o r s
+    #=========================================================================
+    # returns a flat array of SColor values, 4 per face (one per corner).
+    def _getCornerColors(self, colorData, alphaData, tfaces):
+        result = array.array('I', [0]) * (tfaces * 4)
+        channels = []
+        for name in ('color1', 'color2', 'color3', 'color4'):
+            colors = array.array('f', [0.0]) * (tfaces * 3)
+            colorData.foreach_get(name, colors)
+            alphas = None
+            if alphaData:
+                alphas = array.array('f', [0.0]) * (tfaces * 3)
+                alphaData.foreach_get(name, alphas)
+            channels.append((colors, alphas))
+
+        for c in range(4):
+            colors, alphas = channels[c]
+            for f in range(tfaces):
+                i = f * 3
+                a = 255
+                if alphas:
+                    a = int(alphas[i] * 255.0)
+                result[f * 4 + c] = (a << 24) | \
+                    (int(colors[i] * 255.0) << 16) | \
+                    (int(colors[i + 1] * 255.0) << 8) | \
+                    int(colors[i + 2] * 255.0)
+        return result
+
+    #=========================================================================
+    #               _ c r e a t e M e s h B u f f e r s B u l k
+    #=========================================================================
+    # Pulls face, vertex, uv & color data from Blender with "foreach_get"
+    # into flat arrays and builds the array backed mesh buffers from them.
+    # Face corners are de-duplicated using a numeric key (blender vertex
+    # index, SColor, uv1, uv2).
+    def _createMeshBuffersBulk(self):
+        bMesh = self.bMesh
+        faces = bMesh.tessfaces
+        tfaces = len(faces)
+        tverts = len(bMesh.vertices)
+        mcount = 1000
+
+        self.gui.updateStatus('Analyzing Mesh Faces: {}, ' \
+            '(reading data)'.format(bMesh.name))
+
+        fverts = array.array('i', [0]) * (tfaces * 4)
+        faces.foreach_get('vertices_raw', fverts)
+        fmats = array.array('i', [0]) * tfaces
+        faces.foreach_get('material_index', fmats)
+
+        #
+        # if shape keys exist, use the positions from the "basis" key.
+        #
+        vcos = array.array('f', [0.0]) * (tverts * 3)
+        if self.bKeyBlocks:
+            self.bKeyBlocks[0].data.foreach_get('co', vcos)
+        else:
+            bMesh.vertices.foreach_get('co', vcos)
+        vnos = array.array('f', [0.0]) * (tverts * 3)
+        bMesh.vertices.foreach_get('normal', vnos)
+
+        # face corner uv's - 8 floats per face
+        uvLayers = []
+        for layerNumber in range(min(2, len(bMesh.tessface_uv_textures))):
+            fuvs = array.array('f', [0.0]) * (tfaces * 8)
+            bMesh.tessface_uv_textures[layerNumber].data.foreach_get('uv_raw',
+                fuvs)
+            uvLayers.append(fuvs)
+        fuv1 = fuv2 = None
+        if len(uvLayers) > 0:
+            fuv1 = uvLayers[0]
+        if len(uvLayers) > 1:
+            fuv2 = uvLayers[1]
+
+        fcolors = None
+        if bMesh.tessface_vertex_colors.active:
+            alphaData = None
+            if 'alpha' in bMesh.tessface_vertex_colors:
+                alphaData = bMesh.tessface_vertex_colors['alpha'].data
+            fcolors = self._getCornerColors(
+                bMesh.tessface_vertex_colors.active.data, alphaData, tfaces)
+
+        #
+        # without uv images the buffer (material name) only depends on the
+        # face material index.
+        #
+        bufByMatIndex = None
+        if self.uvImageCount == 0:
+            bufByMatIndex = {}
+
+        for f in range(tfaces):
+            if (f % mcount) == 0:
+                if self.gui.isExportCanceled():
+                    return False
+                self.gui.updateStatus('Analyzing Mesh Faces: {}, ({} ' \
+                    'of {})'.format(bMesh.name, f, tfaces))
+
+            if bufByMatIndex == None:
+                meshBuffer = self._getMeshBuffer(faces[f])
+            else:
+                meshBuffer = bufByMatIndex.get(fmats[f])
+                if meshBuffer == None:
+                    meshBuffer = self._getMeshBuffer(faces[f])
+                    bufByMatIndex[fmats[f]] = meshBuffer
+
+            vertref = meshBuffer.vertref
+            base = f * 4
+            corners = 3
+            if fverts[base + 3] != 0:
+                corners = 4
+
+            irrIdx = [0, 0, 0, 0]
+            for c in range(corners):
+                vidx = fverts[base + c]
+                color = 0
+                if fcolors:
+                    color = fcolors[base + c]
+                uv1 = uv2 = (0.0, 0.0)
+                if fuv1:
+                    i = (base + c) * 2
+                    uv1 = uv2 = (fuv1[i], fuv1[i + 1])
+                    if fuv2:
+                        uv2 = (fuv2[i], fuv2[i + 1])
+
+                vKey = (vidx, color, uv1, uv2)
+                idx = vertref.get(vKey)
+                if idx == None:
+                    i = vidx * 3
+                    idx = meshBuffer.appendVertex(vidx, vcos[i:i + 3],
+                        vnos[i:i + 3], color, uv1, uv2)
+                    vertref[vKey] = idx
+                irrIdx[c] = idx
+
+            meshBuffer.indices.extend((irrIdx[0], irrIdx[1], irrIdx[2]))
+            if corners == 4:
+                meshBuffer.indices.extend((irrIdx[3], irrIdx[0], irrIdx[2]))
+
+        return True
+
+    #=========================================================================
+    #            _ c r e a t e M e s h B u f f e r s P e r F a c e
+    #=========================================================================
+    def _createMeshBuffersPerFace(self):
         #
         # Loop through faces and create a new "MeshBuffer" instance for each
         # unique material assigned to a face.  Also add the corresponding
         # face/vertex info into the MeshBuffer.
         #
-        result = True
         faces = self.bMesh.tessfaces
 
         fcount = 0
         tfaces = len(faces)
         mcount = 100
 
-        #tangents = self.bMesh.getTangents()
-
         for face in faces:
 
             if self.gui.isExportCanceled():
@@ -3666,32 +4032,44 @@ class iMesh:
                 self.gui.updateStatus('Analyzing Mesh Faces: {}, ({} ' \
                     'of {})'.format(self.bMesh.name, fcount, tfaces))
 
-            #
-            # 'matName' is assigned based on blender material name and
-            # uv texture image data.  This allows for faces to be assigned
-            # unique images within uv layers.
-            #
-            matName, bMaterial = self._getMaterialInfo(face)
-            
-            # check if we have already created a meshbuffer for this material
-            if matName in self.materials:
-                meshBuffer = self.materials[matName]
-            else:
-                material = iMaterial(self.bObject, self.bMesh, matName, self.exporter,
-                    bMaterial, face)
+            meshBuffer = self._getMeshBuffer(face)
 
-                # create the meshbuffer and update the material dict & mesh
-                # buffer list
-                meshBuffer = iMeshBuffer(self.exporter, self.bObject, self.bMesh, 
-                        material, matName, len(self.meshBuffers), self.armatures)
-                self.materials[matName] = meshBuffer
-                self.meshBuffers.append(meshBuffer)
-
-            #todo - figure if tangents exist or need to be calculated
+            # tangents are calculated per buffer once all faces are added
             tangent = mathutils.Vector()
             tangents = [tangent, tangent, tangent, tangent]
             meshBuffer.addFace(face, tangents, self.bKeyBlocks)
 
+        return True
+
+    #=========================================================================
+    #                    c r e a t e M e s h B u f f e r s
+    #=========================================================================
+    def createMeshBuffers(self):
+        if self.debug:
+            self._writeDebugInfo()
+
+        #
+        # use the bulk (foreach_get) path when possible and fall back to
+        # walking the faces one at a time.
+        #
+        try:
+            result = self._createMeshBuffersBulk()
+        except (AttributeError, TypeError, ValueError, RuntimeError):
+            debug('Bulk mesh buffer creation failed ({}), using per face ' \
+                'path.'.format(sys.exc_info()[1]))
+            self.releaseMeshBuffers()
+            result = self._createMeshBuffersPerFace()
+
+        if result:
+            for meshBuffer in self.meshBuffers:
+                if self.gui.isExportCanceled():
+                    return False
+                if meshBuffer.material.getVertexType() == EVT_TANGENTS:
+                    self.gui.updateStatus('Calculating Tangents: {}, ' \
+                        'buf: {}'.format(self.bMesh.name,
+                        meshBuffer.bufNumber))
+                    meshBuffer.calculateTangents()
+
         self.gui.updateStatus('Analyzing Mesh Faces: {}, Done.'.format
                         (self.bMesh.name))
         if self.debug:
@@ -3703,56 +4081,121 @@ class iMesh:
         return result
 
     #=========================================================================
-    #                       w r i t e M e s h D a t a
+    #                            p r e p a r e
     #=========================================================================
-    def writeMeshData(self, file):
-
-        file.write('<?xml version="1.0"?>\n')
-        file.write('<mesh xmlns="http://irrlicht.sourceforge.net/' \
-            'IRRMESH_09_2007" version="1.0">\n')
-        file.write('<!-- Created {} by irrb {} - ' \
-                '"Irrlicht/Blender Exporter" ' \
-                '-->\n'.format(datetime2str(time.localtime()), getversion()))
+    # see iMeshBuffer.prepare()
+    def prepare(self):
+        morphDeltas = None
+        if self.exporter.gExportAnimations and self.bKeyBlocks and \
+           (len(self.bKeyBlocks) > 1):
+            morphDeltas = self._getMorphDeltas(self.exporter.gMorphQuantize)
 
         for buffer in self.meshBuffers:
-            buffer.writeBufferData(file)
+            buffer.prepare(morphDeltas)
+
+    #=========================================================================
+    #                       _ g e t M o r p h D e l t a s
+    #=========================================================================
+    # Computes the deltas of all shape keys against the basis key in one
+    # pass over flat coordinate arrays.  Returns [(name, changed, dx, dy, dz),
+    # ...] per non basis key, where changed[i] is true for the (blender)
+    # vertices that move more than MORPH_EPSILON.  With quantize > 0 deltas
+    # are snapped to multiples of quantize and smaller moves are dropped.
+    def _getMorphDeltas(self, quantize=0.0):
+        tverts = len(self.bMesh.vertices)
+        basis = array.array('f', [0.0]) * (tverts * 3)
+        self.bKeyBlocks[0].data.foreach_get('co', basis)
+        bases = (basis[0::3], basis[1::3], basis[2::3])
+
+        epsilon = MORPH_EPSILON
+        if quantize > 0.0:
+            epsilon = max(epsilon, quantize * 0.5)
+        epsilons = itertools.repeat(epsilon)
+
+        result = []
+        coords = array.array('f', [0.0]) * (tverts * 3)
+        for idx in range(1, len(self.bKeyBlocks)):
+            if self.gui.isExportCanceled():
+                return []
+
+            block = self.bKeyBlocks[idx]
+            block.data.foreach_get('co', coords)
+
+            deltas = []
+            changed = None
+            for axis in range(3):
+                delta = array.array('f', map(operator.sub, coords[axis::3],
+                    bases[axis]))
+                moved = map(operator.gt, map(abs, delta), epsilons)
+                if changed == None:
+                    changed = list(moved)
+                else:
+                    changed = list(map(operator.or_, changed, moved))
+                deltas.append(delta)
 
-        file.write('</mesh>\n')
+            if quantize > 0.0:
+                for i in itertools.compress(range(tverts), changed):
+                    for delta in deltas:
+                        delta[i] = round(delta[i] / quantize) * quantize
+
+            result.append((block.name, bytes(changed), deltas[0], deltas[1],
+                deltas[2]))
+
+        return result
 
 #=============================================================================
-#                                 i V e r t e x
+#                          w r i t e M e s h D a t a
 #=============================================================================
-class iVertex:
-    #=========================================================================
-    #                               _ i n i t _
-    #=========================================================================
-    def __init__(self, bVertex, irrIdx, bKeyBlocks, color, alpha, tangent):
-        self.bVertex = bVertex
-        self.index = bVertex.index
-        self.irrIdx = irrIdx
-        self.vcolor = color
-        self.valpha = alpha
-        self.UV1 = None
-        self.UV2 = None
-        #
-        # if shape keys exist, use the position from the "basis" key.
-        #
-        self.pos = []
-        if bKeyBlocks != None:
-            self.pos = []
-            for i in range(len(bKeyBlocks)):
-                self.pos.append(bKeyBlocks[i].data[bVertex.index].co)
-        else:
-            self.pos.append(self.bVertex.co)
-        n = self.bVertex.normal
-        self.normal = mathutils.Vector((n.x, n.y, n.z))
-        if tangent != None:
-            self.tangent = mathutils.Vector((tangent.x, tangent.y, tangent.z))
-        else:
-            self.tangent = mathutils.Vector()
+def writeMeshData(file, meshBuffers):
+
+    file.write('<?xml version="1.0"?>\n')
+    file.write('<mesh xmlns="http://irrlicht.sourceforge.net/' \
+        'IRRMESH_09_2007" version="1.0">\n')
+    file.write('<!-- Created {} by irrb {} - ' \
+            '"Irrlicht/Blender Exporter" ' \
+            '-->\n'.format(datetime2str(time.localtime()), getversion()))
+
+    for buffer in meshBuffers:
+        buffer.writeBufferData(file)
+
+    file.write('</mesh>\n')
+
+#=============================================================================
+#                           _ c o n v e r t M e s h
+#=============================================================================
+# Converts an .irrmesh file to binary (.irrbmesh) using "imeshcvt".  The
+# .irrbmesh layout is defined by the engine's loader, which isn't part of
+# this tree, so imeshcvt stays the only writer for it.
+def _convertMesh(meshcvt, version, iname, oname, baseDir):
+    directory = os.path.dirname(meshcvt)
 
-        self.binormal = self.normal.cross(self.tangent)
-        self.binormal.normalize()
+    cmdline = '{} -v {} -i "{}" -o "{}" -a "{}"'.format(meshcvt,
+        version, iname, oname, filterPath(baseDir))
+
+    try:
+        subprocess.call(cmdline, shell=True, cwd=directory)
+    except:
+        raise IOError('Error Converting To Binary Mesh. ' \
+            'Check imeshcvt setup.')
+
+#=============================================================================
+#                          _ w r i t e M e s h F i l e
+#=============================================================================
+# Serialization job for a prepared mesh (see iMesh.prepare()), runs inline
+# or in an iExportPipeline worker process.  "convert" holds the
+# _convertMesh() arguments when a binary mesh is requested.
+def _writeMeshFile(fileName, meshBuffers, convert=None):
+    file = open(fileName, 'w')
+    writeMeshData(file, meshBuffers)
+    file.close()
+
+    #
+    # if requested, convert to binary (.irrbmesh) using "imeshcvt".
+    #
+    if convert != None:
+        _convertMesh(*convert)
+
+    return fileName
 
 #=============================================================================
 #                              i M e s h B u f f e r
@@ -3785,14 +4228,54 @@ class iMeshBuffer:
 
         self.material = material
         self.uvMatName = uvMatName
-        self.vertref = {}   # vertex dict key: 'blender vertex index:vertex color'
-        self.vertices = []
-        self.faces = []     # list of irr indexes {{i0,i1,i2},{},...}
+        self.vertref = {}   # vertex dict key -> irr vertex index
+
+        #
+        # compact, array backed vertex data - one entry (or 2/3 floats) per
+        # irr vertex.  Tangents & binormals are only filled in for
+        # EVT_TANGENTS buffers.
+        #
+        self.vIndices = array.array('i')    # blender vertex index
+        self.vPositions = array.array('f')  # x, y, z (blender coordinates)
+        self.vNormals = array.array('f')    # x, y, z
+        self.vColors = array.array('I')     # SColor (argb)
+        self.vUV1 = array.array('f')        # u, v
+        self.vUV2 = array.array('f')        # u, v
+        self.vTangents = array.array('f')   # x, y, z
+        self.vBinormals = array.array('f')  # x, y, z
+        self.indices = array.array('I')     # triangle list i0, i1, i2, ...
         self.hasUVTextures = len(self.bMesh.uv_textures) > 0
 
         self.relMeshDir = os.path.relpath(self.exporter.gMeshDir,
             self.exporter.gBaseDir) + '/'
 
+        # bpy independent write state, filled in by prepare()
+        self.meshName = self.bMesh.name
+        self.vertexType = EVT_STANDARD
+        self.materialData = ''
+        self.scolor = None
+        self.skinWeights = []
+        self.morphTargets = []
+
+    #=========================================================================
+    #                      _ g e t s t a t e _
+    #=========================================================================
+    # Only the prepared, bpy independent state is pickled when the buffer is
+    # handed to a serialization worker (see iExportPipeline).
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('bObject', 'bMesh', 'vertexColorData', 'vertexColorAlpha',
+                'exporter', 'gui', 'armatures', 'material', 'vertref'):
+            state.pop(key, None)
+        return state
+
+    #=========================================================================
+    #                      _ s e t s t a t e _
+    #=========================================================================
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.gui = IGUINull()
+
     #=========================================================================
     #                      _ w r i t e D e b u g I n f o
     #=========================================================================
@@ -3801,54 +4284,64 @@ class iMeshBuffer:
         self.material._writeDebugInfo()
 
     #=========================================================================
-    #                        _ w r i t e V e r t e x
+    #                     _ f o r m a t V e r t i c e s
     #=========================================================================
-    def _writeVertex(self, file, vert, vtype, idx=0):
-        pos = vert.pos[idx]
-        normal = vert.normal
-        color = vert.vcolor
-        alpha = vert.valpha
-        uv1 = vert.UV1
-        if uv1 == None:
-            uv1 = (0.0, 0.0)
-        uv2 = vert.UV2
-        if uv2 == None:
-            uv2 = uv1
-
-        tangent = vert.tangent
-        binormal = vert.binormal
+    # Formats vertices [first, last) as a single block of .irrmesh lines.
+    def _formatVertices(self, first, last, vtype, scolor=None):
+        count = last - first
+        p0 = first * 3
+        p1 = last * 3
+        u0 = first * 2
+        u1 = last * 2
 
-        spos = '{} '.format(_formatFloats((pos.x, pos.z, pos.y), ' '))
-        snormal = '{} '.format(_formatFloats((normal.x, normal.z,
-            normal.y), ' '))
-
-        if color != None and self.material.useVertexColor:
-            scolor = bc2SColor(color, alpha) + ' '
+        stride = 9
+        fmt = '         ' + '{:.6f} ' * 6 + '{} {:.6f} {:.6f} \n'
+        if vtype == EVT_2TCOORDS:
+            stride = 11
+            fmt = '         ' + '{:.6f} ' * 6 + '{} ' + '{:.6f} ' * 4 + '\n'
+        elif vtype == EVT_TANGENTS:
+            stride = 15
+            fmt = '         ' + '{:.6f} ' * 6 + '{} ' + '{:.6f} ' * 8 + '\n'
+
+        values = [0.0] * (count * stride)
+        pos = self.vPositions
+        values[0::stride] = pos[p0:p1:3]
+        values[1::stride] = pos[p0 + 2:p1:3]
+        values[2::stride] = pos[p0 + 1:p1:3]
+        normal = self.vNormals
+        values[3::stride] = normal[p0:p1:3]
+        values[4::stride] = normal[p0 + 2:p1:3]
+        values[5::stride] = normal[p0 + 1:p1:3]
+        if scolor == None:
+            values[6::stride] = ['{:08x}'.format(c) for c in
+                self.vColors[first:last]]
         else:
-            scolor = del2SColor(self.material.getDiffuse()) + ' '
-        suv = '{} '.format(_formatFloats((uv1[0], 1 - uv1[1]), ' '))
-
-        if vtype == EVT_STANDARD:
-            file.write('         ' + spos + snormal + scolor + suv + '\n')
-            return
+            values[6::stride] = [scolor] * count
+        uv = self.vUV1
+        values[7::stride] = uv[u0:u1:2]
+        values[8::stride] = [1.0 - v for v in uv[u0 + 1:u1:2]]
 
         if vtype == EVT_2TCOORDS:
-            suv2 = '{} '.format(_formatFloats((uv2[0], 1 - uv2[1]), ' '))
-            file.write((9 * ' ') + spos + snormal + scolor + suv + suv2 + '\n')
-            return
-
-        stangent = '{} '.format(_formatFloats((tangent.x, tangent.z,
-            tangent.y), ' '))
-        sbinormal = '{} '.format(_formatFloats((binormal.x,
-            binormal.z, binormal.y), ' '))
-        file.write('{}{}{}{}{}{}{}\n'.format(9 * ' ', spos, snormal,
-                   scolor, suv, stangent, sbinormal))
+            uv = self.vUV2
+            values[9::stride] = uv[u0:u1:2]
+            values[10::stride] = [1.0 - v for v in uv[u0 + 1:u1:2]]
+        elif vtype == EVT_TANGENTS and len(self.vTangents):
+            tangent = self.vTangents
+            values[9::stride] = tangent[p0:p1:3]
+            values[10::stride] = tangent[p0 + 2:p1:3]
+            values[11::stride] = tangent[p0 + 1:p1:3]
+            binormal = self.vBinormals
+            values[12::stride] = binormal[p0:p1:3]
+            values[13::stride] = binormal[p0 + 2:p1:3]
+            values[14::stride] = binormal[p0 + 1:p1:3]
+
+        return _trimFloats((fmt * count).format(*values))
 
     #=========================================================================
     #                       _ w r i t e V e r t i c e s
     #=========================================================================
     def _writeVertices(self, file):
-        vtype = self.material.getVertexType()
+        vtype = self.vertexType
 
         if vtype == EVT_STANDARD:
             svtype = 'standard'
@@ -3857,165 +4350,151 @@ class iMeshBuffer:
         elif vtype == EVT_TANGENTS:
             svtype = 'tangents'
 
+        tverts = self.getVertexCount()
         file.write('      <vertices type="{}" vertexCount="{}">\n'.format
-                (svtype, len(self.vertices)))
+                (svtype, tverts))
 
-        meshName = self.bMesh.name
-        tverts = len(self.vertices)
-        vcount = 0
-        mcount = 100
+        scolor = self.scolor
+        meshName = self.meshName
         bnum = self.bufNumber
-        if tverts > 10000:
-            mcount = 1000
-        for vert in self.vertices:
+        for first in range(0, tverts, WRITE_CHUNK_SIZE):
             if self.gui.isExportCanceled():
                 return
 
-            self._writeVertex(file, vert, vtype)
-            vcount += 1
-            if (vcount % mcount) == 0:
-                self.gui.updateStatus('Exporting Mesh: {}, buf: {} ' \
-                    'writing vertices({} of {})'.format(meshName, bnum,
-                    vcount, tverts))
+            last = min(first + WRITE_CHUNK_SIZE, tverts)
+            file.write(self._formatVertices(first, last, vtype, scolor))
+            self.gui.updateStatus('Exporting Mesh: {}, buf: {} ' \
+                'writing vertices({} of {})'.format(meshName, bnum,
+                last, tverts))
         file.write('      </vertices>\n')
 
     #=========================================================================
     #                         _ w r i t e F a c e s
     #=========================================================================
     def _writeFaces(self, file):
+        indices = self.indices
+        tindices = len(indices)
         file.write('      <indices ' \
-            'indexCount="{}">\n'.format(len(self.faces) * 3))
-        line = 8 * ' '
-        iCount = 0
+            'indexCount="{}">\n'.format(tindices))
 
-        meshName = self.bMesh.name
-        tfaces = len(self.faces)
-        fcount = 0
+        # 12 triangles per line, winding reversed.
+        lineCount = 36
+        chunkSize = (WRITE_CHUNK_SIZE // lineCount) * lineCount
+        meshName = self.meshName
+        tfaces = self.getFaceCount()
         bnum = self.bufNumber
-        for face in self.faces:
+        for first in range(0, tindices, chunkSize):
             if self.gui.isExportCanceled():
                 return
-            line += (' {} {} {}'.format(face[2], face[1], face[0]))
-            iCount += 1
-            if iCount == 12:
-                file.write(line + '\n')
-                line = 8 * ' '
-                iCount = 0
-            fcount += 1
-            if (fcount % 100) == 0:
-                self.gui.updateStatus('Exporting Mesh: {}, buf: {} ' \
-                    'writing faces({} of {}'.format(meshName, bnum,
-                    fcount, tfaces))
 
-        if iCount > 0:
-            file.write(line + '\n')
+            last = min(first + chunkSize, tindices)
+            values = indices[first:last]
+            values[0::3] = indices[first + 2:last:3]
+            values[2::3] = indices[first:last:3]
+
+            full = (last - first) // lineCount
+            block = ('        ' + ' {}' * lineCount + '\n') * full
+            rest = (last - first) - full * lineCount
+            if rest:
+                block += '        ' + ' {}' * rest + '\n'
+            file.write(block.format(*values))
+
+            self.gui.updateStatus('Exporting Mesh: {}, buf: {} ' \
+                'writing faces({} of {}'.format(meshName, bnum,
+                last // 3, tfaces))
 
         file.write('      </indices>\n')
 
     #=========================================================================
-    #                     _ w r i t e M o r p h T a r g e t
+    #                     _ w r i t e M o r p h T a r g e t s
     #=========================================================================
-    def _writeMorphTarget(self, file, idx):
-        #
-        # count the number of vertices we'll be writing
-        #
-        block = self.bKeyBlocks[idx]
-        vidx = 0
-        for vert in self.vertices:
-            if iGUI.exportCancelled():
-                return
-
-            bvert = vert.pos[0]
-            pos = vert.pos[idx]
+    # Writes the sparse (changed vertices only) morph targets built by
+    # prepare().
+    def _writeMorphTargets(self, file):
+        meshName = self.meshName
+        bnum = self.bufNumber
+        for name, indices, positions in self.morphTargets:
+            vcount = len(indices)
+            file.write('      <morph-target name="{}" ' \
+                'vertexCount="{}">\n'.format(name, vcount))
 
-            if (bvert.x != pos.x) or (bvert.y != pos.y) or (bvert.z != pos.z):
-                vidx += 1
+            for first in range(0, vcount, WRITE_CHUNK_SIZE):
+                if self.gui.isExportCanceled():
+                    return
 
-        file.write('      <morph-target name="{}" ' \
-            'vertexCount="{}">\n'.format(block.name, vidx))
+                last = min(first + WRITE_CHUNK_SIZE, vcount)
+                count = last - first
+                values = [0.0] * (count * 4)
+                values[0::4] = indices[first:last]
+                values[1::4] = positions[first * 3:last * 3:3]
+                values[2::4] = positions[first * 3 + 2:last * 3:3]
+                values[3::4] = positions[first * 3 + 1:last * 3:3]
+                file.write(_trimFloats(('         {} {:.6f} {:.6f} {:.6f} ' \
+                    '\n' * count).format(*values)))
+                self.gui.updateStatus('Exporting Mesh: {}, buf: {} ' \
+                    'writing morph target {}({} of {})'.format(meshName,
+                    bnum, name, last, vcount))
 
-        meshName = self.bMesh.name
-        tverts = len(self.vertices)
-        vcount = 0
-        mcount = 100
-        bnum = self.bufNumber
-        if tverts > 10000:
-            mcount = 1000
-        vidx = 0
-        for vert in self.vertices:
-            if iGUI.exportCancelled():
-                return
+            file.write('      </morph-target>\n')
 
-            bvert = vert.pos[0]
+    #=========================================================================
+    #                     _ g e t S k i n W e i g h t s
+    #=========================================================================
+    # returns (irr vertex indices, bone indices, weights) arrays for the
+    # deforming bones of the given armature object.
+    def _getSkinWeights(self, aobj):
+        obj_vgroups = self.bObject.vertex_groups
+        bVertices = self.bMesh.vertices
+        arm = aobj.data
 
-            pos = vert.pos[idx]
+        bidx = 0
+        boneDict = {}
+        for bone in arm.bones:
+            if bone.name in obj_vgroups and bone.use_deform:
+                boneDict[obj_vgroups[bone.name].index] = bidx
+            bidx += 1
 
-            if (bvert.x != pos.x) or (bvert.y != pos.y) or (bvert.z != pos.z):
-                spos = '{} {:.6f} {:.6f} {:.6f} '.format(vidx, pos.x,
-                    pos.z, pos.y)
-                file.write(9 * ' ' + spos + '\n')
-            vidx += 1
-            vcount += 1
-            if (vcount % mcount) == 0:
-                iGUI.updateStatus('Exporting Mesh: {}, buf: {} ' \
-                    'writing vertices({} of {})'.format(meshName, bnum,
-                    vcount, tverts))
+        vertices = array.array('I')
+        bones = array.array('I')
+        weights = array.array('f')
+        for irrIdx in range(len(self.vIndices)):
+            for group in bVertices[self.vIndices[irrIdx]].groups:
+                if group.group in boneDict:
+                    vertices.append(irrIdx)
+                    bones.append(boneDict[group.group])
+                    weights.append(group.weight)
 
-        file.write('      </morph-target>\n')
+        return (vertices, bones, weights)
 
     #=========================================================================
     #                   _ w r i t e S k i n W e i g h t s
     #=========================================================================
     def _writeSkinWeights(self, file):
-        obj_vgroups = self.bObject.vertex_groups
-        for aobj in self.armatures:
-            arm = aobj.data
-
-            bidx = 0
-            boneDict = {}
-            for bone in arm.bones:
-                if bone.name in obj_vgroups and bone.use_deform:
-                    boneDict[obj_vgroups[bone.name].index] = (bidx, bone.name)
-                bidx += 1
-
-            wcount = 0
-            for v in self.vertices:
-                for group in v.bVertex.groups:
-                    if group.group in boneDict:
-                        wcount += 1
-
-            if wcount == 0:
-                continue
-
-            skelName = '{}.irrskel'.format(arm.name)
+        # 5 weights (vertex, bone, weight) per line.
+        lineCount = 5
+        chunkSize = (WRITE_CHUNK_SIZE // lineCount) * lineCount
+        for skelName, vertices, bones, weights in self.skinWeights:
+            wcount = len(vertices)
             file.write('      <skinWeights weightCount="{}" link="{}">\n'.format(wcount, skelName))
-            oidx = 0
-
-            for v in self.vertices:
-                for group in v.bVertex.groups:
-                    if group.group in boneDict:
-                        bidx, bname = boneDict[group.group]
-                        weight = group.weight
-                        if weight == 1.0:
-                            sweight = "1"
-                        elif weight == 0.0:
-                            sweight = "0"
-                        else:
-                            sweight = _formatFloats((weight,))
-                        if oidx == 0:
-                            line = '         {} {} {}'.format(v.irrIdx,
-                                bidx, sweight)
-                        else:
-                            line += ' {} {} {}'.format(v.irrIdx,
-                                bidx, sweight)
-                        oidx += 1
-                        if oidx == 5:
-                            oidx = 0
-                            line += '\n'
-                            file.write(line)
-            if oidx > 0:
-                line += '\n'
-                file.write(line)
+
+            for first in range(0, wcount, chunkSize):
+                if self.gui.isExportCanceled():
+                    return
+
+                last = min(first + chunkSize, wcount)
+                count = last - first
+                values = [0] * (count * 3)
+                values[0::3] = vertices[first:last]
+                values[1::3] = bones[first:last]
+                values[2::3] = weights[first:last]
+
+                full = count // lineCount
+                block = ('        ' + ' {} {} {:.6f}' * lineCount + '\n') * \
+                    full
+                rest = count - full * lineCount
+                if rest:
+                    block += '        ' + ' {} {} {:.6f}' * rest + '\n'
+                file.write(_trimFloats(block.format(*values)))
 
             file.write('      </skinWeights>\n')
 
@@ -4246,8 +4725,10 @@ class iMeshBuffer:
     #=========================================================================
     def release(self):
         self.vertref.clear()
-        self.vertices[:] = []
-        self.faces[:] = []
+        for data in (self.vIndices, self.vPositions, self.vNormals,
+                self.vColors, self.vUV1, self.vUV2, self.vTangents,
+                self.vBinormals, self.indices):
+            del data[:]
 
     #=========================================================================
     #                         g e t M a t e r i a l T y p e
@@ -4262,13 +4743,147 @@ class iMeshBuffer:
         return self.material
 
     #=========================================================================
-    #                             a d d V e r t e x
+    #                       g e t V e r t e x C o u n t
+    #=========================================================================
+    def getVertexCount(self):
+        return len(self.vIndices)
+
+    #=========================================================================
+    #                          g e t F a c e C o u n t
     #=========================================================================
-    def addVertex(self, bVertex):
-        vertex = Vertex(bVertex)
-        self.vertices.append(vertex)
-        # return our index
-        return len(self.vertices)
+    def getFaceCount(self):
+        return len(self.indices) // 3
+
+    #=========================================================================
+    #                           a p p e n d V e r t e x
+    #=========================================================================
+    # Appends a new irr vertex to the buffer arrays and returns its index.
+    def appendVertex(self, bIndex, pos, normal, color, uv1, uv2):
+        irrIdx = len(self.vIndices)
+        self.vIndices.append(bIndex)
+        self.vPositions.extend(pos)
+        self.vNormals.extend(normal)
+        self.vColors.append(color)
+        self.vUV1.extend(uv1)
+        self.vUV2.extend(uv2)
+        return irrIdx
+
+    #=========================================================================
+    #                      c a l c u l a t e T a n g e n t s
+    #=========================================================================
+    # Calculates per vertex tangents & binormals from the buffer triangles
+    # and uv1 (MikkTSpace style: per triangle directions weighted by the
+    # corner angle, orthogonalized against the vertex normal).  The
+    # binormal follows the exported (flipped) v direction so Irrlicht can
+    # use the values as is.
+    def calculateTangents(self):
+        tverts = self.getVertexCount()
+        pos = self.vPositions
+        uv = self.vUV1
+        indices = self.indices
+        sqrt = math.sqrt
+        acos = math.acos
+
+        tsum = [0.0] * (tverts * 3)
+        bsum = [0.0] * (tverts * 3)
+
+        for t in range(0, len(indices), 3):
+            tri = (indices[t], indices[t + 1], indices[t + 2])
+            p = [pos[i * 3:i * 3 + 3] for i in tri]
+            u = [uv[i * 2] for i in tri]
+            v = [-uv[i * 2 + 1] for i in tri]
+
+            du1 = u[1] - u[0]
+            dv1 = v[1] - v[0]
+            du2 = u[2] - u[0]
+            dv2 = v[2] - v[0]
+            det = du1 * dv2 - du2 * dv1
+            if fuzzyZero(det):
+                continue
+            e1 = (p[1][0] - p[0][0], p[1][1] - p[0][1], p[1][2] - p[0][2])
+            e2 = (p[2][0] - p[0][0], p[2][1] - p[0][1], p[2][2] - p[0][2])
+
+            tx = e1[0] * dv2 - e2[0] * dv1
+            ty = e1[1] * dv2 - e2[1] * dv1
+            tz = e1[2] * dv2 - e2[2] * dv1
+            bx = e2[0] * du1 - e1[0] * du2
+            by = e2[1] * du1 - e1[1] * du2
+            bz = e2[2] * du1 - e1[2] * du2
+            tlen = sqrt(tx * tx + ty * ty + tz * tz)
+            blen = sqrt(bx * bx + by * by + bz * bz)
+            if fuzzyZero(tlen) or fuzzyZero(blen):
+                continue
+            # the sign of det keeps mirrored uv's consistent
+            if det < 0.0:
+                tlen = -tlen
+                blen = -blen
+            tx /= tlen
+            ty /= tlen
+            tz /= tlen
+            bx /= blen
+            by /= blen
+            bz /= blen
+
+            for c in range(3):
+                a = p[c]
+                b = p[(c + 1) % 3]
+                d = p[(c + 2) % 3]
+                ex = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+                fx = (d[0] - a[0], d[1] - a[1], d[2] - a[2])
+                elen = sqrt(ex[0] * ex[0] + ex[1] * ex[1] + ex[2] * ex[2])
+                flen = sqrt(fx[0] * fx[0] + fx[1] * fx[1] + fx[2] * fx[2])
+                if fuzzyZero(elen) or fuzzyZero(flen):
+                    continue
+                cos = (ex[0] * fx[0] + ex[1] * fx[1] + ex[2] * fx[2]) / \
+                    (elen * flen)
+                angle = acos(max(-1.0, min(1.0, cos)))
+
+                i = tri[c] * 3
+                tsum[i] += tx * angle
+                tsum[i + 1] += ty * angle
+                tsum[i + 2] += tz * angle
+                bsum[i] += bx * angle
+                bsum[i + 1] += by * angle
+                bsum[i + 2] += bz * angle
+
+        tangents = array.array('f', [0.0]) * (tverts * 3)
+        binormals = array.array('f', [0.0]) * (tverts * 3)
+        normals = self.vNormals
+        for i in range(0, tverts * 3, 3):
+            nx, ny, nz = normals[i], normals[i + 1], normals[i + 2]
+            tx, ty, tz = tsum[i], tsum[i + 1], tsum[i + 2]
+
+            # Gram-Schmidt orthogonalize
+            d = nx * tx + ny * ty + nz * tz
+            tx -= nx * d
+            ty -= ny * d
+            tz -= nz * d
+            tlen = sqrt(tx * tx + ty * ty + tz * tz)
+            if fuzzyZero(tlen):
+                # no usable uv's - any vector perpendicular to the normal
+                if abs(nx) < 0.9:
+                    tx, ty, tz = 0.0, nz, -ny
+                else:
+                    tx, ty, tz = -nz, 0.0, nx
+                tlen = sqrt(tx * tx + ty * ty + tz * tz)
+                if fuzzyZero(tlen):
+                    continue
+            tx /= tlen
+            ty /= tlen
+            tz /= tlen
+
+            # binormal = normal x tangent, pointing along the uv binormal
+            bx = ny * tz - nz * ty
+            by = nz * tx - nx * tz
+            bz = nx * ty - ny * tx
+            if (bx * bsum[i] + by * bsum[i + 1] + bz * bsum[i + 2]) < 0.0:
+                bx, by, bz = -bx, -by, -bz
+
+            tangents[i:i + 3] = array.array('f', (tx, ty, tz))
+            binormals[i:i + 3] = array.array('f', (bx, by, bz))
+
+        self.vTangents = tangents
+        self.vBinormals = binormals
 
     #=========================================================================
     #                           c r e a t e V e r t e x
@@ -4309,17 +4924,28 @@ class iMeshBuffer:
             int(255 * vAlpha), suv1, suv2)
 
         if vKey in self.vertref:
-            vertex = self.vertices[self.vertref[vKey]]
+            return self.vertref[vKey]
+
+        #
+        # if shape keys exist, use the position from the "basis" key.
+        #
+        if bKeyBlocks != None:
+            pos = bKeyBlocks[0].data[bVertex.index].co
         else:
-            irrIdx = len(self.vertices)
-            self.vertref[vKey] = irrIdx
-            vertex = iVertex(bVertex, irrIdx, bKeyBlocks, vColor,
-                             vAlpha, tangent)
-            vertex.UV1 = UV1
-            vertex.UV2 = UV2
-            self.vertices.append(vertex)
+            pos = bVertex.co
 
-        return vertex
+        color = 0
+        if vColor != None:
+            color = rgb2SColor((vColor.r, vColor.g, vColor.b, vAlpha))
+        if UV1 == None:
+            UV1 = (0.0, 0.0)
+        if UV2 == None:
+            UV2 = UV1
+
+        irrIdx = self.appendVertex(bVertex.index, pos, bVertex.normal, color,
+            UV1, UV2)
+        self.vertref[vKey] = irrIdx
+        return irrIdx
 
     #=========================================================================
     #                              a d d F a c e
@@ -4329,36 +4955,83 @@ class iMeshBuffer:
             v1 = self.createVertex(bFace, 0, bKeyBlocks, faceTangents[0])
             v2 = self.createVertex(bFace, 1, bKeyBlocks, faceTangents[1])
             v3 = self.createVertex(bFace, 2, bKeyBlocks, faceTangents[2])
-            self.faces.append((v1.irrIdx, v2.irrIdx, v3.irrIdx))
+            self.indices.extend((v1, v2, v3))
         elif (len(bFace.vertices) == 4):
             v1 = self.createVertex(bFace, 0, bKeyBlocks, faceTangents[0])
             v2 = self.createVertex(bFace, 1, bKeyBlocks, faceTangents[1])
             v3 = self.createVertex(bFace, 2, bKeyBlocks, faceTangents[2])
             v4 = self.createVertex(bFace, 3, bKeyBlocks, faceTangents[3])
-            self.faces.append((v1.irrIdx, v2.irrIdx, v3.irrIdx))
-            self.faces.append((v4.irrIdx, v1.irrIdx, v3.irrIdx))
+            self.indices.extend((v1, v2, v3))
+            self.indices.extend((v4, v1, v3))
         else:
             print('Ignored face with {} edges.'.format(len(bFace.vertices)))
 
+    #=========================================================================
+    #                            p r e p a r e
+    #=========================================================================
+    # Resolves everything the buffer writers need from bpy (material block,
+    # vertex color mode, skin weights) and writes the skeleton files.  Must
+    # run on the Blender thread; afterwards writeBufferData() only uses
+    # plain Python data and can run in a serialization worker.
+    def prepare(self, morphDeltas=None):
+        self.vertexType = self.material.getVertexType()
+
+        mfile = io.StringIO()
+        self.material.write(mfile)
+        self.materialData = mfile.getvalue()
+
+        # without vertex colors every vertex uses the material diffuse color
+        self.scolor = None
+        if (self.vertexColorData == None) or \
+           (not self.material.useVertexColor):
+            self.scolor = del2SColor(self.material.getDiffuse())
+
+        self.skinWeights = []
+        if self.exporter.gExportAnimations and (len(self.armatures) > 0):
+            for aobj in self.armatures:
+                vertices, bones, weights = self._getSkinWeights(aobj)
+                if len(vertices) == 0:
+                    continue
+                self.skinWeights.append(('{}.irrskel'.format(aobj.data.name),
+                    vertices, bones, weights))
+
+            for armature in self.armatures:
+                self._writeSkeletons(armature)
+
+        #
+        # morph targets - target positions of the irr vertices whose
+        # blender vertex is moved by the shape key.
+        #
+        self.morphTargets = []
+        if morphDeltas:
+            vIndices = self.vIndices
+            pos = self.vPositions
+            for name, changed, dx, dy, dz in morphDeltas:
+                indices = array.array('I', itertools.compress(
+                    itertools.count(), map(changed.__getitem__, vIndices)))
+                positions = array.array('f')
+                for i in indices:
+                    bidx = vIndices[i]
+                    p = i * 3
+                    positions.extend((pos[p] + dx[bidx], pos[p + 1] + dy[bidx],
+                        pos[p + 2] + dz[bidx]))
+                self.morphTargets.append((name, indices, positions))
+
     #=========================================================================
     #                              w r i t e
     #=========================================================================
     def writeBufferData(self, file):
         file.write('   <buffer>\n')
-        self.material.write(file)
+        file.write(self.materialData)
         self._writeVertices(file)
         self._writeFaces(file)
 
-        if self.exporter.gExportAnimations and (len(self.armatures) > 0):
+        if len(self.skinWeights):
             self._writeSkinWeights(file)
 
-            for armature in self.armatures:
-                self._writeSkeletons(armature)
+        if len(self.morphTargets):
+            self._writeMorphTargets(file)
 
-        # todo
-        #if self.bKeyBlocks:
-        #    for i in range(1,len(self.bKeyBlocks)):
-        #        self._writeMorphTarget(file,i)
         file.write('   </buffer>\n')
 
 #=============================================================================
@@ -4374,7 +5047,8 @@ class iExporter:
             SelectedObjectsOnly, ExportLights, ExportCameras,
             ExportAnimations, ExportAnimationTails, ExportPhysics, ExportPack,
             ExportExec, Binary, Debug, runWalkTest, IrrlichtVersion,
-            MeshCvtPath, WalkTestPath):
+            MeshCvtPath, WalkTestPath, Incremental=False, Jobs=1,
+            MorphQuantize=0.0):
 
         # Load the default/saved configuration values
         self.gOperator = Operator
@@ -4418,6 +5092,11 @@ class iExporter:
             self.gExportPack = True
 
         self.gBinary = Binary
+        self.gIncremental = Incremental
+        self.gManifest = None
+        self.gJobs = Jobs
+        self.gMorphQuantize = MorphQuantize
+        self.gPipeline = None
         self.gDebug = Debug
         self.gMeshFileName = ''
         self.gSceneFileName = ''
@@ -4443,6 +5122,10 @@ class iExporter:
         debug('   Mesh Directory: ' + self.gMeshDir)
         debug('  Image Directory: ' + self.gTexDir)
         debug('           Binary: ' + ('True' if self.gBinary else 'False'))
+        debug('      Incremental: ' +
+            ('True' if self.gIncremental else 'False'))
+        debug('             Jobs: {}'.format(self.gJobs))
+        debug('   Morph Quantize: {}'.format(self.gMorphQuantize))
         debug('   Export Cameras: ' +
             ('True' if self.gExportCameras else 'False'))
         debug('    Export Lights: ' +
@@ -5000,21 +5683,155 @@ class iExporter:
         self.gExportedSkelsLC.append(skelName.lower())
 
     #=========================================================================
-    #                           _ c o n v e r t M e s h
+    #                         _ l o a d M a n i f e s t
     #=========================================================================
-    def _convertMesh(self, iname, oname):
-        self.gGUI.updateStatus('Creating Binary Mesh: ' + oname)
-        meshcvt = self.gMeshCvtPath
-        directory = os.path.dirname(meshcvt)
+    # The export manifest (irrb.manifest, next to irrb.log) records a
+    # content hash for each exported mesh and the source mtime/size for each
+    # copied image so incremental exports can skip unchanged data.
+    def _loadManifest(self):
+        self.gManifestName = self.gBaseDir + 'irrb.manifest'
+        self.gManifest = {'version': MANIFEST_VERSION, 'meshes': {},
+            'images': {}}
+        if not self.gIncremental or not os.path.exists(self.gManifestName):
+            return
+
+        try:
+            file = open(self.gManifestName, 'r')
+            manifest = json.load(file)
+            file.close()
+        except:
+            addWarning('Error reading manifest {}, doing a full ' \
+                'export.'.format(self.gManifestName))
+            return
+
+        if manifest.get('version') == MANIFEST_VERSION:
+            self.gManifest = manifest
 
-        cmdline = '{} -v {} -i "{}" -o "{}" -a "{}"'.format(meshcvt,
-            self.gIrrlichtVersion, iname, oname, filterPath(self.gBaseDir))
+    #=========================================================================
+    #                         _ s a v e M a n i f e s t
+    #=========================================================================
+    def _saveManifest(self):
+        if not self.gIncremental:
+            return
 
         try:
-            subprocess.call(cmdline, shell=True, cwd=directory)
+            file = open(self.gManifestName, 'w')
+            json.dump(self.gManifest, file, indent=1, sort_keys=True)
+            file.close()
         except:
-            self.gFatalError = 'Error Converting To Binary Mesh. ' \
-                'Check imeshcvt setup.'
+            addWarning('Error writing manifest {}'.format(self.gManifestName))
+
+    #=========================================================================
+    #                          _ g e t M e s h H a s h
+    #=========================================================================
+    # Hash of everything that ends up in the mesh (and skeleton) files:
+    # geometry, uv/color layers, face images, modifiers, materials,
+    # skinning/animation data and the relevant export options.
+    def _getMeshHash(self, bObject):
+        bMesh = bObject.data
+        if not len(bMesh.tessfaces):
+            bMesh.update(calc_tessface=True)
+
+        md5 = hashlib.md5()
+
+        def addText(value):
+            md5.update(str(value).encode('utf-8'))
+            md5.update(b'\0')
+
+        def addArray(collection, attr, typecode, count):
+            data = array.array(typecode, [0]) * count
+            collection.foreach_get(attr, data)
+            md5.update(data.tobytes())
+
+        def addProperties(bData, names):
+            for name in names:
+                value = getattr(bData, name, None)
+                if isinstance(value, (bool, int, float, str)):
+                    addText(value)
+                elif hasattr(value, 'name'):
+                    addText(value.name)
+                elif value != None:
+                    addText(tuple(value))
+
+        addText((iversion, self.gBinary, self.gExportAnimations,
+            self.gExportAnimationTails, self.gMorphQuantize,
+            self.gIrrlichtVersion,
+            self.gBaseDir, self.gMeshDir, self.gTexDir, self.gTexExtension))
+        addText(bObject.name)
+
+        tverts = len(bMesh.vertices)
+        tfaces = len(bMesh.tessfaces)
+        addText((tverts, tfaces))
+        addArray(bMesh.vertices, 'co', 'f', tverts * 3)
+        addArray(bMesh.vertices, 'normal', 'f', tverts * 3)
+        addArray(bMesh.tessfaces, 'vertices_raw', 'i', tfaces * 4)
+        addArray(bMesh.tessfaces, 'material_index', 'i', tfaces)
+        for layer in bMesh.tessface_uv_textures:
+            addText(layer.name)
+            addArray(layer.data, 'uv_raw', 'f', tfaces * 8)
+        for layer in bMesh.uv_textures:
+            addText(layer.name)
+            addText([(d.image.name, d.image.filepath) if d.image else ''
+                for d in layer.data])
+        if bMesh.tessface_vertex_colors.active:
+            addText(bMesh.tessface_vertex_colors.active.name)
+        for layer in bMesh.tessface_vertex_colors:
+            addText(layer.name)
+            for name in ('color1', 'color2', 'color3', 'color4'):
+                addArray(layer.data, name, 'f', tfaces * 3)
+        if bMesh.shape_keys:
+            for block in bMesh.shape_keys.key_blocks:
+                addText(block.name)
+                addArray(block.data, 'co', 'f', tverts * 3)
+
+        for mod in bObject.modifiers:
+            addText((mod.name, mod.type))
+            if mod.type == 'ARMATURE' and mod.object:
+                addText(mod.object.name)
+
+        for bMaterial in bMesh.materials:
+            if bMaterial == None:
+                addText(None)
+                continue
+            addText(bMaterial.name)
+            addProperties(bMaterial, sorted([name for name in dir(bMaterial)
+                if name.startswith('irrb_')]))
+            addProperties(bMaterial, ('diffuse_color', 'specular_color',
+                'use_vertex_color_paint'))
+            for tslot in bMaterial.texture_slots:
+                if tslot and tslot.texture:
+                    addProperties(tslot, ('texture_coords', 'uv_layer'))
+                    addProperties(tslot.texture, ('name', 'type'))
+                    addProperties(tslot.texture, ('image',))
+                    image = getattr(tslot.texture, 'image', None)
+                    if image:
+                        addText(image.filepath)
+
+        if self.gExportAnimations and self._hasArmature(bObject):
+            addText([vg.name for vg in bObject.vertex_groups])
+            for vertex in bMesh.vertices:
+                addText([(g.group, g.weight) for g in vertex.groups])
+            render = self.gBScene.render
+            addText((render.fps, render.fps_base))
+            for mod in bObject.modifiers:
+                if mod.type != 'ARMATURE' or not mod.object:
+                    continue
+                arm = mod.object
+                for bone in arm.data.bones:
+                    addText((bone.name, bone.use_deform,
+                        bone.parent.name if bone.parent else '',
+                        tuple(bone.tail_local)))
+                for bone in arm.pose.bones:
+                    addText((bone.name, tuple(bone.location),
+                        tuple(bone.rotation_euler), tuple(bone.scale)))
+            for action in bpy.data.actions:
+                addText((action.name, tuple(action.frame_range)))
+                for curve in action.fcurves:
+                    addText((curve.data_path, curve.array_index))
+                    addArray(curve.keyframe_points, 'co', 'f',
+                        len(curve.keyframe_points) * 2)
+
+        return md5.hexdigest()
 
     #=========================================================================
     #                      _ s a v e P a c k e d T e x t u r e
@@ -5023,7 +5840,12 @@ class iExporter:
         self.gGUI.updateStatus('Saving Packed Texture ' + filename + '...')
 
         if self.gTexExtension != '.???':
-            iTGAWriter.writeTGA(bImage, filename, True)
+            # pixels are grabbed here, encoding happens in the pipeline.
+            result = _getTGAPixels(bImage)
+            if result != None:
+                width, height, bpp, pixels = result
+                self.gPipeline.submit(filename, _encodeTGA, filename, width,
+                    height, bpp, pixels, True)
         else:
             if os.path.exists(filename):
                 os.unlink(filename)
@@ -5039,10 +5861,26 @@ class iExporter:
     #=========================================================================
     def _copyExternalImage(self, bImage, filename):
         ofilename = os.path.normpath(bpy.path.abspath(bImage.filepath))
+
+        info = None
+        if self.gIncremental:
+            try:
+                stat = os.stat(ofilename)
+                info = {'source': ofilename, 'mtime': stat.st_mtime,
+                    'size': stat.st_size}
+            except:
+                pass
+            if info and os.path.exists(filename) and \
+               (self.gManifest['images'].get(filename) == info):
+                debug('Image unchanged, skipping copy: {}'.format(filename))
+                return
+
         self.gGUI.updateStatus('Copying external image ;' \
             '{} to {}'.format(ofilename, filename))
         try:
             shutil.copy2(ofilename, filename)
+            if info:
+                self.gManifest['images'][filename] = info
         except:
             self.gGUI.updateStatus('Error copying external image ' \
                 '{}'.format(ofilename))
@@ -5098,53 +5936,96 @@ class iExporter:
                 fname, fext = os.path.splitext(meshFileName)
                 sceneMeshFileName = fname + '.irrbmesh'
 
+        #
+        # has the mesh changed since the last (incremental) export?
+        #
+        meshHash = None
+        if not alreadyExported and self.gIncremental:
+            meshHash = self._getMeshHash(bObject)
+            entry = self.gManifest['meshes'].get(meshData.name)
+            if entry and (entry['hash'] == meshHash) and \
+               (entry['file'] == self.gMeshFileName) and \
+               os.path.exists(self.gMeshFileName):
+                debug('Mesh unchanged, skipping: {}'.format(meshData.name))
+                self._addMeshToExportedList(meshData.name,
+                    self.gMeshFileName, sceneMeshFileName)
+                for skelName, skelFileName, relSkelName in entry['skels']:
+                    self._addSkelToExportedList(skelName, skelFileName,
+                        relSkelName)
+                for imageName in entry['images']:
+                    if imageName in bpy.data.images:
+                        self._saveImage(bpy.data.images[imageName])
+                self.gVertCount += entry['verts']
+                self.gFaceCount += entry['faces']
+                self.gUnchangedMeshCount += 1
+                alreadyExported = True
+
         #
         # have we already exported this mesh data block?
         #
         if not alreadyExported:
 
-            try:
-                file = open(self.gMeshFileName, 'w')
-            except:
-                pass
-
             irrMesh = iMesh(bObject, self, True)
             if irrMesh.createMeshBuffers() == True:
                 if self.gGUI.isExportCanceled():
-                    file.close()
                     return
 
-                irrMesh.writeMeshData(file)
+                # bpy dependent data is resolved here, the mesh file itself
+                # is written by the serialization pipeline.
+                irrMesh.prepare()
+                meshBuffers = irrMesh.meshBuffers
+                convert = None
+                if self.gBinary:
+                    self.gGUI.updateStatus('Creating Binary Mesh: ' +
+                        binaryMeshFileName)
+                    convert = (self.gMeshCvtPath, self.gIrrlichtVersion,
+                        self.gMeshFileName, binaryMeshFileName,
+                        self.gBaseDir)
+                self.gPipeline.submit(meshData.name, _writeMeshFile,
+                    self.gMeshFileName, meshBuffers, convert)
                 self._addMeshToExportedList(meshData.name,
                     self.gMeshFileName, sceneMeshFileName)
 
                 if self.gGUI.isExportCanceled():
-                    file.close()
                     return
 
                 self.gVertCount += irrMesh.getVertexCount()
                 self.gFaceCount += irrMesh.getFaceCount()
 
                 # write image(s) if any
+                imageNames = []
                 for k, v in irrMesh.getMaterials().items():
                     if self.gGUI.isExportCanceled():
-                        file.close()
                         return
 
                     images = v.getMaterial().getImages()
                     for image in images:
                         self._saveImage(image)
-
-                # release mesh buffer memory
-                irrMesh.releaseMeshBuffers()
-
-            file.close()
-            file = None
-            #
-            # if requested, convert to binary (.irrbmesh) using "imeshcvt".
-            #
-            if self.gBinary:
-                self._convertMesh(self.gMeshFileName, binaryMeshFileName)
+                        imageNames.append(image.name)
+
+                if meshHash:
+                    skels = []
+                    for arm in irrMesh.armatures:
+                        if arm.name in self.gExportedSkels:
+                            skelFileName, relSkelName = \
+                                self.gExportedSkels[arm.name]
+                            skels.append((arm.name, skelFileName,
+                                relSkelName))
+                    self.gManifest['meshes'][meshData.name] = {
+                        'hash': meshHash,
+                        'file': self.gMeshFileName,
+                        'skels': skels,
+                        'images': imageNames,
+                        'verts': irrMesh.getVertexCount(),
+                        'faces': irrMesh.getFaceCount()}
+
+                # release mesh buffer memory - buffers queued for a worker
+                # process are released once they've been written.
+                if self.gPipeline.isParallel():
+                    irrMesh.meshBuffers = []
+                    irrMesh.materials = {}
+                else:
+                    irrMesh.releaseMeshBuffers()
 
         # write mesh scene node data to scene (.irr) file
         if self.sfile != None:
@@ -5354,6 +6235,9 @@ class iExporter:
 
         debug('irrb log ' + iversion)
 
+        self._loadManifest()
+        self.gPipeline = iExportPipeline(self.gJobs)
+
         self._dumpGeneralInfo()
         self._dumpOptions()
         self._dumpSceneInfo()
@@ -5373,6 +6257,7 @@ class iExporter:
         self.gCameraCount = 0
         self.gVertCount = 0
         self.gFaceCount = 0
+        self.gUnchangedMeshCount = 0
 
         # export object/node animations (loc/rot/scale) to scene file.
         if self.gExportAnimations and self.gCreateScene and self.sfile:
@@ -5389,6 +6274,18 @@ class iExporter:
             self.sfile.close()
             self.sfile = None
 
+        # wait for the queued mesh & image files
+        if self.gGUI.isExportCanceled():
+            self.gPipeline.cancel()
+        else:
+            self.gGUI.updateStatus('Writing Mesh & Image Files...')
+        for name, e in self.gPipeline.wait():
+            debug('Error writing: {}, {}'.format(name, e))
+            if self.gManifest != None:
+                self.gManifest['meshes'].pop(name, None)
+            if self.gFatalError == None:
+                self.gFatalError = 'Error Writing: {} ({})'.format(name, e)
+
         if editMode:
             bpy.ops.object.mode_set(mode='EDIT', toggle=False)
 
@@ -5403,6 +6300,9 @@ class iExporter:
         else:
             temp = '{} Meshes'
         stats.append(temp.format(mcount))
+        if self.gIncremental:
+            stats.append('{} Unchanged Mesh(es)'.format(
+                self.gUnchangedMeshCount))
         stats.append('{} Light(s)'.format(self.gLightCount))
         stats.append('{} Image(s)'.format(len(self.gExportedImages)))
         stats.append('{}/{} Verts/Tris'.format(self.gVertCount,
@@ -5418,6 +6318,7 @@ class iExporter:
             stats.append(self.gFatalError)
 
         self._dumpStats(stats)
+        self._saveManifest()
 
         # setup walktest/executable config parms
         if self.gRunWalkTest:
@@ -5436,19 +6337,8 @@ class iExporter:
             for name in self.gExportedImages.keys():
                 files.append(self.gExportedImages[name][1])
 
-            # delete original files
-            if _zipFiles(zipFileName, files, self.gBScene.name + '.irr'):
-                os.unlink(self.gSceneDir + self.gBScene.name + '.irr')
-                for name in self.gExportedMeshes.keys():
-                    meshFileName = self.gExportedMeshes[name][0]
-                    os.unlink(meshFileName)
-                    if self.gBinary:
-                        fname, fext = os.path.splitext(meshFileName)
-                        os.unlink(fname + '.irrbmesh')
-
-                for name in self.gExportedImages.keys():
-                    if os.path.exists(self.gExportedImages[name][0]):
-                        os.unlink(self.gExportedImages[name][0])
+            zipJob = self.gPipeline.submit(zipFileName, _zipFiles,
+                zipFileName, files, self.gBScene.name + '.irr')
 
         exeFileName = None
         if self.gExportExec:
@@ -5460,11 +6350,36 @@ class iExporter:
                 shutil.rmtree(dstDatDir)
             shutil.copytree(srcDatDir, dstDatDir)
 
+            # packed in parallel with the scene archive
             datFileName = self.gSceneDir + 'data.zip'
-            _zipFiles(datFileName, ['data'], '', False)
+            self.gPipeline.submit(datFileName, _zipFiles, datFileName,
+                ['data'], '', False)
             #datFileName = self.gSceneDir + 'data' + os.sep + 'data.zip'
             #E_zipFiles(datFileName, ['fnt','gui','tex'], '', False)
 
+        for name, e in self.gPipeline.wait():
+            debug('Error packing: {}, {}'.format(name, e))
+            try:
+                self.gPipeline.shutdown()
+            finally:
+                closeLog()
+            raise e
+
+        # delete original files
+        if self.gExportPack and zipJob.result():
+            os.unlink(self.gSceneDir + self.gBScene.name + '.irr')
+            for name in self.gExportedMeshes.keys():
+                meshFileName = self.gExportedMeshes[name][0]
+                os.unlink(meshFileName)
+                if self.gBinary:
+                    fname, fext = os.path.splitext(meshFileName)
+                    os.unlink(fname + '.irrbmesh')
+
+            for name in self.gExportedImages.keys():
+                if os.path.exists(self.gExportedImages[name][0]):
+                    os.unlink(self.gExportedImages[name][0])
+
+        if self.gExportExec:
             ext = os.path.splitext(os.path.basename(wtEnv).split()[0])[1]
             exeFileName = '{}{}{}'.format(self.gSceneDir,
                 self.gBScene.name, ext)
@@ -5482,6 +6397,7 @@ class iExporter:
             os.unlink(datFileName)
             shutil.rmtree(dstDatDir)
 
+        self.gPipeline.shutdown()
         closeLog()
         self.gGUI.setStatus(stats)
         self.gActions.clear()
@@ -5544,6 +6460,9 @@ class IrrbExportOp(bpy.types.Operator):
             _G['export']['binary'] = scene.irrb_export_binary
             if scene.irrb_export_binary:
                 exportBinary = True
+        _G['export']['incremental'] = scene.irrb_export_incremental
+        _G['export']['jobs'] = scene.irrb_export_jobs
+        _G['export']['morph_quantize'] = scene.irrb_export_morph_quantize
 
         walktest = False
         if gHaveWalkTest:
@@ -5579,6 +6498,9 @@ class IrrbExportOp(bpy.types.Operator):
               exportBinary,
               runWalkTest,
               2,  # irrlicht version index
+              scene.irrb_export_incremental,
+              scene.irrb_export_jobs,
+              scene.irrb_export_morph_quantize,
              )
 
         return {'FINISHED'}
@@ -5685,6 +6607,7 @@ class IrrbSceneProps(bpy.types.Panel):
         lcol.prop(context.scene, 'irrb_export_animations')
         if context.scene.irrb_export_animations:
             lcol.prop(context.scene, 'irrb_export_animation_tails')
+            lcol.prop(context.scene, 'irrb_export_morph_quantize')
 
         rcol = split.column()
         sub = rcol.column()
@@ -5704,6 +6627,9 @@ class IrrbSceneProps(bpy.types.Panel):
         sub.active = ('IMESHCVT' in os.environ) & sceneEnabled
         sub.prop(context.scene, 'irrb_export_binary')
 
+        rcol.prop(context.scene, 'irrb_export_incremental')
+        rcol.prop(context.scene, 'irrb_export_jobs')
+
         sub = rcol.column()
         sub.active = gHaveWalkTest & sceneEnabled
         sub.prop(context.scene, 'irrb_export_walktest')
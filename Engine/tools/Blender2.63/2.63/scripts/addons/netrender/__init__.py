@@ -45,6 +45,8 @@ if "init_data" in locals():
     imp.reload(repath)
     imp.reload(versioning)
     imp.reload(baking)
+    imp.reload(cache)
+    imp.reload(worker)
 else:
     from netrender import model
     from netrender import operators
@@ -58,6 +60,8 @@ else:
     from netrender import repath
     from netrender import versioning
     from netrender import baking
+    from netrender import cache
+    from netrender import worker
 
 jobs = []
 slaves = []
@@ -0,0 +1,217 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os, re, shutil
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from netrender.utils import *
+
+# signatures come from the master, only accept plain hex digests as file names
+signature_pattern = re.compile("^[0-9a-fA-F]+$")
+
+def linkFile(source, dest):
+    if os.path.lexists(dest):
+        os.remove(dest)
+
+    # hardlinks survive eviction from the cache, fall back on symlinks then copies
+    try:
+        os.link(source, dest)
+        return
+    except (OSError, AttributeError):
+        pass
+
+    try:
+        os.symlink(source, dest)
+        return
+    except (OSError, AttributeError, NotImplementedError):
+        pass
+
+    shutil.copyfile(source, dest)
+
+def lockFile(f):
+    """Lock an open file for this process without waiting. Returns False
+    when another process holds the lock"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except (IOError, OSError):
+        return False
+
+    return True
+
+class FileCache:
+    """Job files downloaded by a slave, stored by signature and linked into
+    the job directories so jobs sharing files only download them once.
+    Least recently used files are removed above max_size bytes.
+
+    Entries are only tracked in memory, so a cache directory belongs to one
+    slave process at a time. Slaves running at the same time on a working
+    path each lock their own directory: path, then path_1, path_2..."""
+    def __init__(self, path, max_size):
+        self.path, self.lock_file = self.claim(path)
+        self.max_size = max_size
+        self.entries = OrderedDict() # signature -> size, least recently used first
+        self.total_size = 0
+        self.pinned = set() # used by the current job, never evicted
+
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0 # bytes not downloaded
+
+        self.scan()
+
+    def claim(self, path):
+        index = 0
+        while True:
+            cache_path = path if index == 0 else "%s_%i" % (path, index)
+            verifyCreateDir(cache_path)
+
+            lock_file = open(os.path.join(cache_path, "lock"), "wb")
+            if lockFile(lock_file):
+                return cache_path, lock_file
+
+            lock_file.close()
+            index += 1
+
+    def close(self):
+        # let another slave use this directory
+        self.lock_file.close()
+
+    def scan(self):
+        # files left by a previous session, oldest first
+        found = []
+        for name in os.listdir(self.path):
+            if signature_pattern.match(name):
+                info = os.stat(os.path.join(self.path, name))
+                found.append((info.st_mtime, name, info.st_size))
+
+        found.sort()
+
+        for mtime, signature, size in found:
+            self.entries[signature] = size
+            self.total_size += size
+
+        self.evict()
+
+    def filePath(self, signature):
+        return os.path.join(self.path, signature)
+
+    def accepts(self, signature):
+        return signature is not None and signature_pattern.match(signature) is not None
+
+    def use(self, signature):
+        self.entries.move_to_end(signature)
+        self.pinned.add(signature)
+        # keep the order across sessions
+        os.utime(self.filePath(signature), None)
+
+    def holds(self, signature, file_path):
+        """Test if file_path is already linked to the cached file, which then
+        doesn't need to be hashed again"""
+        if not self.accepts(signature) or signature not in self.entries:
+            return False
+
+        try:
+            linked = os.path.samefile(file_path, self.filePath(signature))
+        except OSError:
+            linked = False
+
+        if linked:
+            self.use(signature)
+
+        return linked
+
+    def link(self, signature, dest):
+        """Link the cached file with that signature to dest. Returns False
+        when the file isn't cached and has to be downloaded"""
+        if not self.accepts(signature):
+            return False
+
+        if signature in self.entries and not os.path.exists(self.filePath(signature)):
+            # removed behind our back
+            self.total_size -= self.entries.pop(signature)
+
+        if signature not in self.entries:
+            self.misses += 1
+            return False
+
+        linkFile(self.filePath(signature), dest)
+        self.use(signature)
+
+        self.hits += 1
+        self.saved += self.entries[signature]
+
+        return True
+
+    def add(self, signature, file_path, dest):
+        """Move a downloaded and verified file in the cache, then link it to dest"""
+        cache_path = self.filePath(signature)
+
+        if signature in self.entries:
+            self.total_size -= self.entries.pop(signature)
+
+        shutil.move(file_path, cache_path)
+
+        size = os.path.getsize(cache_path)
+        self.entries[signature] = size
+        self.total_size += size
+        self.pinned.add(signature)
+
+        self.evict()
+
+        linkFile(cache_path, dest)
+
+    def release(self):
+        # files of the previous job can be evicted again
+        self.pinned.clear()
+        self.evict()
+
+    def evict(self):
+        for signature in list(self.entries):
+            if self.total_size <= self.max_size:
+                break
+
+            if signature in self.pinned:
+                continue
+
+            self.total_size -= self.entries.pop(signature)
+
+            try:
+                os.remove(self.filePath(signature))
+            except OSError:
+                pass
+
+    def statsHeaders(self):
+        # totals for this session, sent to the master with job requests
+        return {
+                    "cache-hits": str(self.hits),
+                    "cache-misses": str(self.misses),
+                    "cache-saved": str(self.saved)
+                }
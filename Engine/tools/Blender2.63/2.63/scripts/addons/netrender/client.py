@@ -243,12 +243,7 @@ def sendJobBaking(conn, scene, can_save = True):
     # if not ACCEPTED (but not processed), send files
     if response.status == http.client.ACCEPTED:
         for rfile in job.files:
-            f = open(rfile.filepath, "rb")
-            with ConnectionContext():
-                conn.request("PUT", fileURL(job_id, rfile.index), f)
-            f.close()
-            response = conn.getresponse()
-            response.read()
+            uploadFile(conn, fileURL(job_id, rfile.index), rfile.filepath)
 
     # server will reply with ACCEPTED until all files are found
 
@@ -333,12 +328,7 @@ def sendJobBlender(conn, scene, anim = False, can_save = True):
     # if not ACCEPTED (but not processed), send files
     if response.status == http.client.ACCEPTED:
         for rfile in job.files:
-            f = open(rfile.filepath, "rb")
-            with ConnectionContext():
-                conn.request("PUT", fileURL(job_id, rfile.index), f)
-            f.close()
-            response = conn.getresponse()
-            response.read()
+            uploadFile(conn, fileURL(job_id, rfile.index), rfile.filepath)
 
     # server will reply with ACCEPTED until all files are found
 
@@ -17,11 +17,11 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import sys, os
-import http, http.client, http.server, socket, socketserver
-import shutil, time, hashlib
+import http, http.client, http.server, socket
+import shutil, time, hashlib, io
+import threading, queue
 import pickle
 import zipfile
-import select # for select.error
 import json
 
 
@@ -31,16 +31,21 @@ import netrender.balancing
 import netrender.master_html
 import netrender.thumbnail as thumbnail
 
+# seconds between slave timeout checks, usage updates and address broadcasts
+HOUSEKEEPING_INTERVAL = 2
+
 class MRenderFile(netrender.model.RenderFile):
     def __init__(self, filepath, index, start, end, signature):
         super().__init__(filepath, index, start, end, signature)
         self.found = False
 
-    def updateStatus(self):
+    def updateStatus(self, found_signature = None):
         self.found = os.path.exists(self.filepath)
         
         if self.found and self.signature != None:
-            found_signature = hashFile(self.filepath)
+            # the upload handler hashes while writing, don't read the file again
+            if found_signature is None:
+                found_signature = hashFile(self.filepath)
             self.found = self.signature == found_signature
             if not self.found:
                 print("Signature mismatch", self.signature, found_signature)
@@ -102,6 +107,17 @@ class MRenderJob(netrender.model.RenderJob):
         for rfile in self.files:
             rfile.force = force
 
+    def getFilePath(self, file_index):
+        rfile = self.files[file_index]
+        main_file = self.files[0].original_path # original path of the first file
+
+        main_path, main_name = os.path.split(main_file)
+
+        if file_index > 0:
+            return createLocalPath(rfile, self.save_path, main_path, True)
+        else:
+            return os.path.join(self.save_path, main_name)
+
     def initInfo(self):
         if not self.resolution:
             self.resolution = tuple(getFileInfo(self.files[0].filepath, ["bpy.context.scene.render.resolution_x", "bpy.context.scene.render.resolution_y", "bpy.context.scene.render.resolution_percentage"]))
@@ -134,10 +150,7 @@ class MRenderJob(netrender.model.RenderJob):
         return True
 
     def testFinished(self):
-        for f in self.frames:
-            if f.status == netrender.model.FRAME_QUEUED or f.status == netrender.model.FRAME_DISPATCHED:
-                break
-        else:
+        if not self.countFrames(netrender.model.FRAME_QUEUED) and not self.countFrames(netrender.model.FRAME_DISPATCHED):
             self.status = netrender.model.JOB_FINISHED
             self.finish_time=time.time()
 
@@ -168,7 +181,7 @@ class MRenderJob(netrender.model.RenderJob):
 
     def addFrame(self, frame_number, command):
         frame = MRenderFrame(frame_number, command)
-        self.frames.append(frame)
+        self.appendFrame(frame)
         return frame
 
     def reset(self, all):
@@ -179,13 +192,9 @@ class MRenderJob(netrender.model.RenderJob):
             self.status = netrender.model.JOB_QUEUED
 
     def getFrames(self):
-        frames = []
-        for f in self.frames:
-            if f.status == netrender.model.FRAME_QUEUED:
-                self.last_dispatched = time.time()
-                frames.append(f)
-                if len(frames) >= self.chunks:
-                    break
+        frames = self.queuedFrames(max(1, self.chunks))
+        if frames:
+            self.last_dispatched = time.time()
 
         return frames
     
@@ -231,15 +240,65 @@ cancel_pattern = re.compile("/cancel_([a-zA-Z0-9]+)")
 pause_pattern = re.compile("/pause_([a-zA-Z0-9]+)")
 edit_pattern = re.compile("/edit_([a-zA-Z0-9]+)")
 
+range_pattern = re.compile("bytes=([0-9]+)-$")
+content_range_pattern = re.compile("bytes ([0-9]+)-([0-9]+)/([0-9]+)")
+
 class RenderHandler(http.server.BaseHTTPRequestHandler):
-    def write_file(self, file_path, mode = 'wb'):
+    # don't let a dead connection hold on to a worker thread forever
+    timeout = 60
+
+    # Requests share the jobs, slaves and balancer of the server. Handlers
+    # only hold the server lock while looking up or changing them, never
+    # while reading or writing the connection, so a slow client doesn't
+    # block the other requests. Anything found under the lock can be
+    # removed once it's released: handlers look their job up again before
+    # changing it after a transfer.
+
+    def write_file(self, file_path, mode = 'wb', offset = 0, hashed = False):
+        """Write the request body to file_path in blocks, appending at offset
+        for resumed uploads. When hashed, returns the md5 of the whole file"""
         length = int(self.headers['content-length'])
-        f = open(file_path, mode)
-        buf = self.rfile.read(length)
-        f.write(buf)
+        hasher = hashlib.md5() if hashed else None
+
+        if offset:
+            f = open(file_path, 'r+b')
+            f.truncate(offset)
+            if hasher:
+                copyStream(f, None, offset, hasher) # prefix from the interrupted upload
+            f.seek(offset)
+        else:
+            f = open(file_path, mode)
+
+        try:
+            copied = copyStream(self.rfile, f.write, length, hasher)
+        finally:
+            f.close()
+
+        if copied < length:
+            raise socket.error("Connection closed after %i of %i bytes" % (copied, length))
+
+        if hasher:
+            return hasher.hexdigest()
+
+    def send_file(self, file_path, content = "application/octet-stream"):
+        size = os.path.getsize(file_path)
+        offset = 0
+
+        # resume an interrupted download
+        match = range_pattern.match(self.headers.get('range', ""))
+        if match:
+            offset = int(match.groups()[0])
+
+        f = open(file_path, 'rb')
+        if 0 < offset < size:
+            f.seek(offset)
+            self.send_head(http.client.PARTIAL_CONTENT, content = content, headers = {"content-range": "bytes %i-%i/%i" % (offset, size - 1, size), "content-length": str(size - offset)})
+        else:
+            self.send_head(content = content, headers = {"content-length": str(size)})
+
+        copyStream(f, self.wfile.write)
         f.close()
-        del buf
-        
+
     def log_message(self, format, *args):
         # override because the original calls self.address_string(), which
         # is extremely slow due to some timeout..
@@ -254,9 +313,25 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
         else:
             return {}
 
+    def getJobFrame(self, job_id, frame_number):
+        """Job and frame for these ids, either can be None"""
+        with self.server.lock:
+            job = self.server.getJobID(job_id)
+            frame = job[frame_number] if job else None
+
+        return job, frame
+
+    def getJobFile(self, job_id, file_index):
+        """Job and job file for these ids, either can be None"""
+        with self.server.lock:
+            job = self.server.getJobID(job_id)
+            rfile = job.files[file_index] if job and 0 <= file_index < len(job.files) else None
+
+        return job, rfile
+
     def send_head(self, code = http.client.OK, headers = {}, content = "application/octet-stream"):
         self.send_response(code)
-        
+
         if code == http.client.OK and content:
             self.send_header("Content-type", content)
 
@@ -271,11 +346,9 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             job_id = self.headers.get('job-id', "")
             job_frame = int(self.headers.get('job-frame', -1))
 
-            job = self.server.getJobID(job_id)
-            if job:
-                frame = job[job_frame]
-
+            job, frame = self.getJobFrame(job_id, job_frame)
 
+            if job:
                 if frame:
                     self.send_head(http.client.OK)
                 else:
@@ -284,6 +357,26 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             else:
                 # no such job id
                 self.send_head(http.client.NO_CONTENT)
+        # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+        elif self.path.startswith("/file"):
+            # how much of a job file was received, to resume an upload
+            match = file_pattern.match(self.path)
+
+            if match:
+                job_id = match.groups()[0]
+                file_index = int(match.groups()[1])
+
+                job, rfile = self.getJobFile(job_id, file_index)
+
+                if rfile:
+                    file_path = job.getFilePath(file_index)
+                    size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                    self.send_head(headers = {"file-size": str(size)})
+                else:
+                    # no such job or file
+                    self.send_head(http.client.NOT_FOUND)
+            else: # invalid url
+                self.send_head(http.client.NO_CONTENT)
 
     # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
     # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
@@ -305,24 +398,21 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
                 job_id = match.groups()[0]
                 frame_number = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, frame_number)
 
                 if job:
-                    frame = job[frame_number]
-
                     if frame:
-                        if frame.status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
+                        status = frame.status
+
+                        if status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
                             self.send_head(http.client.ACCEPTED)
-                        elif frame.status == netrender.model.FRAME_DONE:
+                        elif status == netrender.model.FRAME_DONE:
                             self.server.stats("", "Sending result to client")
 
                             filename = job.getResultPath(frame.getRenderFilename())
 
-                            f = open(filename, 'rb')
-                            self.send_head(content = "image/x-exr")
-                            shutil.copyfileobj(f, self.wfile)
-                            f.close()
-                        elif frame.status == netrender.model.FRAME_ERROR:
+                            self.send_file(filename, content = "image/x-exr")
+                        elif status == netrender.model.FRAME_ERROR:
                             self.send_head(http.client.PARTIAL_CONTENT)
                     else:
                         # no such frame
@@ -340,25 +430,25 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             if match:
                 job_id = match.groups()[0]
 
-                job = self.server.getJobID(job_id)
+                with self.server.lock:
+                    job = self.server.getJobID(job_id)
+
+                    if job:
+                        results = [filename for frame in job.frames if frame.status == netrender.model.FRAME_DONE for filename in frame.results]
 
                 if job:
                     self.server.stats("", "Sending result to client")
 
                     zip_filepath = job.getResultPath("results.zip")
+
                     with zipfile.ZipFile(zip_filepath, "w") as zfile:
-                        for frame in job.frames:
-                            if frame.status == netrender.model.FRAME_DONE:
-                                for filename in frame.results:
-                                    filepath = job.getResultPath(filename)
-                                    
-                                    zfile.write(filepath, filename)
-                                    
-                    
-                    f = open(zip_filepath, 'rb')
-                    self.send_head(content = "application/x-zip-compressed")
-                    shutil.copyfileobj(f, self.wfile)
-                    f.close()
+                        for filename in results:
+                            filepath = job.getResultPath(filename)
+
+                            zfile.write(filepath, filename)
+
+
+                    self.send_file(zip_filepath, content = "application/x-zip-compressed")
                 else:
                     # no such job id
                     self.send_head(http.client.NO_CONTENT)
@@ -373,28 +463,25 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
                 job_id = match.groups()[0]
                 frame_number = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, frame_number)
 
                 if job:
-                    frame = job[frame_number]
-
                     if frame:
-                        if frame.status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
+                        status = frame.status
+
+                        if status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
                             self.send_head(http.client.ACCEPTED)
-                        elif frame.status == netrender.model.FRAME_DONE:
+                        elif status == netrender.model.FRAME_DONE:
                             filename = job.getResultPath(frame.getRenderFilename())
 
                             thumbname = thumbnail.generate(filename)
 
                             if thumbname:
-                                f = open(thumbname, 'rb')
-                                self.send_head(content = "image/jpeg")
-                                shutil.copyfileobj(f, self.wfile)
-                                f.close()
+                                self.send_file(thumbname, content = "image/jpeg")
                             else: # thumbnail couldn't be generated
                                 self.send_head(http.client.PARTIAL_CONTENT)
                                 return
-                        elif frame.status == netrender.model.FRAME_ERROR:
+                        elif status == netrender.model.FRAME_ERROR:
                             self.send_head(http.client.PARTIAL_CONTENT)
                     else:
                         # no such frame
@@ -413,23 +500,18 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
                 job_id = match.groups()[0]
                 frame_number = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, frame_number)
 
                 if job:
-                    frame = job[frame_number]
-
                     if frame:
-                        if not frame.log_path or frame.status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
+                        log_path = frame.log_path
+
+                        if not log_path or frame.status in (netrender.model.FRAME_QUEUED, netrender.model.FRAME_DISPATCHED):
                             self.send_head(http.client.PROCESSING)
                         else:
                             self.server.stats("", "Sending log to client")
-                            f = open(frame.log_path, 'rb')
-
-                            self.send_head(content = "text/plain")
 
-                            shutil.copyfileobj(f, self.wfile)
-
-                            f.close()
+                            self.send_file(log_path, content = "text/plain")
                     else:
                         # no such frame
                         self.send_head(http.client.NO_CONTENT)
@@ -444,31 +526,33 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             job_id = self.headers.get('job-id', "")
             job_frame = int(self.headers.get('job-frame', -1))
 
-            if job_id:
+            with self.server.lock:
+                if job_id:
 
-                job = self.server.getJobID(job_id)
-                if job:
-                    if job_frame != -1:
-                        frame = job[frame]
+                    job = self.server.getJobID(job_id)
+                    if job:
+                        if job_frame != -1:
+                            frame = job[job_frame]
 
-                        if frame:
-                            message = frame.serialize()
+                            if frame:
+                                message = frame.serialize()
+                            else:
+                                # no such frame
+                                message = None
                         else:
-                            # no such frame
-                            self.send_heat(http.client.NO_CONTENT)
-                            return
+                            message = job.serialize()
                     else:
-                        message = job.serialize()
-                else:
-                    # no such job id
-                    self.send_head(http.client.NO_CONTENT)
-                    return
-            else: # status of all jobs
-                message = []
+                        # no such job id
+                        message = None
+                else: # status of all jobs
+                    message = []
 
-                for job in self.server:
-                    message.append(job.serialize())
+                    for job in self.server:
+                        message.append(job.serialize())
 
+            if message is None:
+                self.send_head(http.client.NO_CONTENT)
+                return
 
             self.server.stats("", "Sending status")
             self.send_head()
@@ -476,36 +560,47 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
         elif self.path == "/job":
-            self.server.balance()
-
             slave_id = self.headers['slave-id']
+            message = None
 
-            slave = self.server.getSeenSlave(slave_id)
+            with self.server.lock:
+                self.server.balance()
 
-            if slave: # only if slave id is valid
-                job, frames = self.server.newDispatch(slave)
+                slave = self.server.getSeenSlave(slave_id)
 
-                if job and frames:
-                    for f in frames:
-                        print("dispatch", f.number)
-                        f.status = netrender.model.FRAME_DISPATCHED
-                        f.slave = slave
+                if slave: # only if slave id is valid
+                    if 'cache-hits' in self.headers:
+                        slave.cache_hits = int(self.headers['cache-hits'])
+                        slave.cache_misses = int(self.headers['cache-misses'])
+                        slave.cache_saved = int(self.headers['cache-saved'])
 
-                    slave.job = job
-                    slave.job_frames = [f.number for f in frames]
+                    job, frames = self.server.newDispatch(slave)
 
-                    self.send_head(headers={"job-id": job.id})
+                    if job and frames:
+                        for f in frames:
+                            print("dispatch", f.number)
+                            f.status = netrender.model.FRAME_DISPATCHED
+                            f.slave = slave
 
-                    message = job.serialize(frames)
-                    self.wfile.write(bytes(json.dumps(message), encoding='utf8'))
+                        slave.job = job
+                        slave.job_frames = [f.number for f in frames]
 
-                    self.server.stats("", "Sending job to slave")
-                else:
-                    # no job available, return error code
-                    slave.job = None
-                    slave.job_frames = []
+                        job_id = job.id
+                        message = job.serialize(frames)
+                    else:
+                        # no job available
+                        slave.job = None
+                        slave.job_frames = []
+
+            if message:
+                self.send_head(headers={"job-id": job_id})
 
-                    self.send_head(http.client.ACCEPTED)
+                self.wfile.write(bytes(json.dumps(message), encoding='utf8'))
+
+                self.server.stats("", "Sending job to slave")
+            elif slave:
+                # no job available, return error code
+                self.send_head(http.client.ACCEPTED)
             else: # invalid slave id
                 self.send_head(http.client.NO_CONTENT)
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
@@ -514,28 +609,24 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             if match:
                 slave_id = self.headers['slave-id']
-                slave = self.server.getSeenSlave(slave_id)
-
-                if not slave:
-                    # invalid slave id
-                    print("invalid slave id")
 
                 job_id = match.groups()[0]
                 file_index = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                with self.server.lock:
+                    slave = self.server.getSeenSlave(slave_id)
 
-                if job:
-                    render_file = job.files[file_index]
+                job, render_file = self.getJobFile(job_id, file_index)
+
+                if not slave:
+                    # invalid slave id
+                    print("invalid slave id")
 
+                if job:
                     if render_file:
                         self.server.stats("", "Sending file to slave")
-                        f = open(render_file.filepath, 'rb')
-
-                        self.send_head()
-                        shutil.copyfileobj(f, self.wfile)
 
-                        f.close()
+                        self.send_file(render_file.filepath)
                     else:
                         # no such file
                         self.send_head(http.client.NO_CONTENT)
@@ -550,16 +641,29 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             self.server.stats("", "Sending slaves status")
 
-            for slave in self.server.slaves:
-                message.append(slave.serialize())
+            with self.server.lock:
+                for slave in self.server.slaves:
+                    message.append(slave.serialize())
 
             self.send_head()
 
             self.wfile.write(bytes(json.dumps(message), encoding='utf8'))
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
         else:
-            # hand over the rest to the html section
-            netrender.master_html.get(self)
+            # hand over the rest to the html section, the page is built
+            # in memory under the lock and sent once it's released
+            wfile = self.wfile
+            self.wfile = io.BytesIO()
+
+            try:
+                with self.server.lock:
+                    netrender.master_html.get(self)
+
+                page = self.wfile.getvalue()
+            finally:
+                self.wfile = wfile
+
+            self.wfile.write(page)
 
     # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
     # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
@@ -574,20 +678,24 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             length = int(self.headers['content-length'])
 
             job_info = netrender.model.RenderJob.materialize(json.loads(str(self.rfile.read(length), encoding='utf8')))
-            job_id = self.server.nextJobID()
 
-            job = MRenderJob(job_id, job_info)
-            
-            job.setForceUpload(self.server.force)
+            with self.server.lock:
+                job_id = self.server.nextJobID()
+
+                job = MRenderJob(job_id, job_info)
+
+                job.setForceUpload(self.server.force)
+
+                for frame in job_info.frames:
+                    frame = job.addFrame(frame.number, frame.command)
 
-            for frame in job_info.frames:
-                frame = job.addFrame(frame.number, frame.command)
+                self.server.addJob(job)
 
-            self.server.addJob(job)
+                started = job.testStart()
 
             headers={"job-id": job_id}
 
-            if job.testStart():
+            if started:
                 self.server.stats("", "New job, started")
                 self.send_head(headers=headers, content = None)
             else:
@@ -600,12 +708,15 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             if match:
                 job_id = match.groups()[0]
 
-                job = self.server.getJobID(job_id)
+                info_map = self.getInfoMap()
 
-                if job:
-                    info_map = self.getInfoMap()
+                with self.server.lock:
+                    job = self.server.getJobID(job_id)
+
+                    if job:
+                        job.edit(info_map)
 
-                    job.edit(info_map)
+                if job:
                     self.send_head(content = None)
                 else:
                     # no such job id
@@ -616,22 +727,26 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
         elif self.path == "/balance_limit":
             info_map = self.getInfoMap()
-            for rule_id, limit in info_map.items():
-                try:
-                    rule = self.server.balancer.ruleByID(rule_id)
-                    if rule:
-                        rule.setLimit(limit)
-                except:
-                    pass # invalid type
+
+            with self.server.lock:
+                for rule_id, limit in info_map.items():
+                    try:
+                        rule = self.server.balancer.ruleByID(rule_id)
+                        if rule:
+                            rule.setLimit(limit)
+                    except:
+                        pass # invalid type
 
             self.send_head(content = None)
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
         elif self.path == "/balance_enable":
             info_map = self.getInfoMap()
-            for rule_id, enabled in info_map.items():
-                rule = self.server.balancer.ruleByID(rule_id)
-                if rule:
-                    rule.enabled = enabled
+
+            with self.server.lock:
+                for rule_id, enabled in info_map.items():
+                    rule = self.server.balancer.ruleByID(rule_id)
+                    if rule:
+                        rule.enabled = enabled
 
             self.send_head(content = None)
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
@@ -644,11 +759,14 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
                 job_id = match.groups()[0]
 
-                job = self.server.getJobID(job_id)
+                with self.server.lock:
+                    job = self.server.getJobID(job_id)
+
+                    if job:
+                        self.server.removeJob(job, clear)
 
                 if job:
                     self.server.stats("", "Cancelling job")
-                    self.server.removeJob(job, clear)
                     self.send_head(content = None)
                 else:
                     # no such job id
@@ -666,11 +784,14 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
                 job_id = match.groups()[0]
 
-                job = self.server.getJobID(job_id)
+                with self.server.lock:
+                    job = self.server.getJobID(job_id)
+
+                    if job:
+                        job.pause(status)
 
                 if job:
                     self.server.stats("", "Pausing job")
-                    job.pause(status)
                     self.send_head(content = None)
                 else:
                     # no such job id
@@ -685,7 +806,9 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             clear = info_map.get("clear", False)
 
             self.server.stats("", "Clearing jobs")
-            self.server.clear(clear)
+
+            with self.server.lock:
+                self.server.clear(clear)
 
             self.send_head(content = None)
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
@@ -697,15 +820,23 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
                 job_id = match.groups()[1]
                 job_frame = int(match.groups()[2])
 
-                job = self.server.getJobID(job_id)
+                with self.server.lock:
+                    job = self.server.getJobID(job_id)
+
+                    frame = None
+                    if job:
+                        if job_frame != 0:
+                            frame = job[job_frame]
+                            if frame:
+                                frame.reset(all)
+                        else:
+                            job.reset(all)
 
                 if job:
                     if job_frame != 0:
 
-                        frame = job[job_frame]
                         if frame:
                             self.server.stats("", "Reset job frame")
-                            frame.reset(all)
                             self.send_head(content = None)
                         else:
                             # no such frame
@@ -713,7 +844,6 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
                     else:
                         self.server.stats("", "Reset job")
-                        job.reset(all)
                         self.send_head(content = None)
 
                 else: # job not found
@@ -728,10 +858,11 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             self.server.stats("", "New slave connected")
 
             slave_info = netrender.model.RenderSlave.materialize(json.loads(str(self.rfile.read(length), encoding='utf8')), cache = False)
-            
+
             slave_info.address = self.client_address
 
-            slave_id = self.server.addSlave(slave_info)
+            with self.server.lock:
+                slave_id = self.server.addSlave(slave_info)
 
             self.send_head(headers = {"slave-id": slave_id}, content = None)
         # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
@@ -742,14 +873,19 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             slave_id = log_info.slave_id
 
-            slave = self.server.getSeenSlave(slave_id)
+            with self.server.lock:
+                slave = self.server.getSeenSlave(slave_id)
 
-            if slave: # only if slave id is valid
-                job = self.server.getJobID(log_info.job_id)
+                job = None
+                if slave: # only if slave id is valid
+                    job = self.server.getJobID(log_info.job_id)
+
+                    if job:
+                        job.addLog(log_info.frames)
 
+            if slave:
                 if job:
                     self.server.stats("", "Log announcement")
-                    job.addLog(log_info.frames)
                     self.send_head(content = None)
                 else:
                     # no such job id
@@ -773,33 +909,41 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
                 job_id = match.groups()[0]
                 file_index = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                job, rfile = self.getJobFile(job_id, file_index)
 
                 if job:
 
-                    rfile = job.files[file_index]
-
                     if rfile:
-                        main_file = job.files[0].original_path # original path of the first file
+                        file_path = job.getFilePath(file_index)
+                        offset = 0
 
-                        main_path, main_name = os.path.split(main_file)
+                        # resumed upload, append to what was already received
+                        match = content_range_pattern.match(self.headers.get('content-range', ""))
+                        if match:
+                            offset = int(match.groups()[0])
 
-                        if file_index > 0:
-                            file_path = createLocalPath(rfile, job.save_path, main_path, True)
-                        else:
-                            file_path = os.path.join(job.save_path, main_name)
-
-                        # add same temp file + renames as slave
-                        
-                        self.write_file(file_path)
-                        
-                        rfile.filepath = file_path # set the new path
-                        found = rfile.updateStatus() # make sure we have the right file
-                        
-                        if not found: # checksum mismatch
+                        if offset and (not os.path.exists(file_path) or os.path.getsize(file_path) < offset):
+                            self.server.stats("", "File upload resumed past the received data")
+                            self.send_head(http.client.REQUESTED_RANGE_NOT_SATISFIABLE)
+                            return
+
+                        signature = self.write_file(file_path, offset = offset, hashed = True)
+
+                        with self.server.lock:
+                            removed = self.server.getJobID(job_id) is not job
+
+                            if not removed:
+                                rfile.filepath = file_path # set the new path
+                                found = rfile.updateStatus(signature) # make sure we have the right file
+                                started = found and job.testStart()
+
+                        if removed: # job cancelled during the upload
+                            print("job not found", job_id, file_index)
+                            self.send_head(http.client.NO_CONTENT)
+                        elif not found: # checksum mismatch
                             self.server.stats("", "File upload but checksum mismatch, this shouldn't happen")
                             self.send_head(http.client.CONFLICT)
-                        elif job.testStart(): # started correctly
+                        elif started: # started correctly
                             self.server.stats("", "File upload, starting job")
                             self.send_head(content = None)
                         else:
@@ -820,40 +964,46 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             slave_id = self.headers['slave-id']
 
-            slave = self.server.getSeenSlave(slave_id)
+            with self.server.lock:
+                slave = self.server.getSeenSlave(slave_id)
 
             if slave: # only if slave id is valid
                 job_id = self.headers['job-id']
+                job_frame = int(self.headers['job-frame'])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, job_frame)
 
                 if job:
-                    job_frame = int(self.headers['job-frame'])
                     job_result = int(self.headers['job-result'])
                     job_time = float(self.headers['job-time'])
-
-                    frame = job[job_frame]
+                    job_load_time = float(self.headers.get('job-load-time', 0))
 
                     if frame:
                         self.send_head(content = None)
 
-                        if job.hasRenderResult():
-                            if job_result == netrender.model.FRAME_DONE:
-                                frame.addDefaultRenderResult()
-                                self.write_file(job.getResultPath(frame.getRenderFilename()))
+                        has_result = job.hasRenderResult() and job_result == netrender.model.FRAME_DONE
+
+                        if has_result:
+                            self.write_file(job.getResultPath(frame.getRenderFilename()))
 
-                            elif job_result == netrender.model.FRAME_ERROR:
-                                # blacklist slave on this job on error
-                                # slaves might already be in blacklist if errors on the whole chunk
-                                if not slave.id in job.blacklist:
-                                    job.blacklist.append(slave.id)
+                        with self.server.lock:
+                            # the job may have been cancelled while receiving the result
+                            if self.server.getJobID(job_id) is job:
+                                if has_result:
+                                    frame.addDefaultRenderResult()
+                                elif job.hasRenderResult() and job_result == netrender.model.FRAME_ERROR:
+                                    # blacklist slave on this job on error
+                                    # slaves might already be in blacklist if errors on the whole chunk
+                                    if not slave.id in job.blacklist:
+                                        job.blacklist.append(slave.id)
 
-                        slave.finishedFrame(job_frame)
+                                slave.finishedFrame(job_frame)
 
-                        frame.status = job_result
-                        frame.time = job_time
+                                frame.status = job_result
+                                frame.time = job_time
+                                frame.load_time = job_load_time
 
-                        job.testFinished()
+                                job.testFinished()
 
                     else: # frame not found
                         self.send_head(http.client.NO_CONTENT)
@@ -867,38 +1017,41 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             slave_id = self.headers['slave-id']
 
-            slave = self.server.getSeenSlave(slave_id)
+            with self.server.lock:
+                slave = self.server.getSeenSlave(slave_id)
 
             if slave: # only if slave id is valid
                 job_id = self.headers['job-id']
+                job_frame = int(self.headers['job-frame'])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, job_frame)
 
                 if job:
-                    job_frame = int(self.headers['job-frame'])
-
-                    frame = job[job_frame]
-
                     if frame:
                         job_result = int(self.headers['job-result'])
                         job_finished = self.headers['job-finished'] == str(True)
-                        
+
                         self.send_head(content = None)
 
                         if job_result == netrender.model.FRAME_DONE:
                             result_filename = self.headers['result-filename']
-                            
-                            frame.results.append(result_filename)
+
                             self.write_file(job.getResultPath(result_filename))
-                            
-                        if job_finished:
-                            job_time = float(self.headers['job-time'])
-                            slave.finishedFrame(job_frame)
-    
-                            frame.status = job_result
-                            frame.time = job_time
 
-                            job.testFinished()
+                        with self.server.lock:
+                            # the job may have been cancelled while receiving the result
+                            if self.server.getJobID(job_id) is job:
+                                if job_result == netrender.model.FRAME_DONE:
+                                    frame.results.append(result_filename)
+
+                                if job_finished:
+                                    job_time = float(self.headers['job-time'])
+                                    slave.finishedFrame(job_frame)
+
+                                    frame.status = job_result
+                                    frame.time = job_time
+
+                                    job.testFinished()
                     else: # frame not found
                         self.send_head(http.client.NO_CONTENT)
                 else: # job not found
@@ -911,21 +1064,19 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             slave_id = self.headers['slave-id']
 
-            slave = self.server.getSeenSlave(slave_id)
+            with self.server.lock:
+                slave = self.server.getSeenSlave(slave_id)
 
             if slave: # only if slave id is valid
                 job_id = self.headers['job-id']
+                job_frame = int(self.headers['job-frame'])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, job_frame)
 
                 if job:
-                    job_frame = int(self.headers['job-frame'])
-
-                    frame = job[job_frame]
-
                     if frame:
                         self.send_head(content = None)
-                        
+
                         if job.hasRenderResult():
                             self.write_file(os.path.join(os.path.join(job.save_path, "%06d.jpg" % job_frame)))
 
@@ -943,20 +1094,20 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
 
             if match:
                 job_id = match.groups()[0]
+                job_frame = int(match.groups()[1])
 
-                job = self.server.getJobID(job_id)
+                job, frame = self.getJobFrame(job_id, job_frame)
 
                 if job:
-                    job_frame = int(match.groups()[1])
+                    log_path = frame.log_path if frame else None
 
-                    frame = job[job_frame]
-
-                    if frame and frame.log_path:
+                    if log_path:
                         self.send_head(content = None)
 
-                        self.write_file(frame.log_path, 'ab')
+                        self.write_file(log_path, 'ab')
 
-                        self.server.getSeenSlave(self.headers['slave-id'])
+                        with self.server.lock:
+                            self.server.getSeenSlave(self.headers['slave-id'])
 
                     else: # frame not found
                         self.send_head(http.client.NO_CONTENT)
@@ -965,8 +1116,61 @@ class RenderHandler(http.server.BaseHTTPRequestHandler):
             else: # invalid url
                 self.send_head(http.client.NO_CONTENT)
 
-class RenderMasterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+class WorkerPoolMixIn:
+    """Mix-in class to handle each request in one of a fixed pool of threads.
+
+    Unlike socketserver.ThreadingMixIn, which starts a new thread for every
+    request, the number of threads doesn't grow with the number of slaves
+    polling the master. Waiting requests are queued until a worker is free.
+    """
+    workers = 16
+    daemon_threads = True
+    # slaves open a new connection for every request, don't let the listen
+    # backlog refuse them while all the workers are busy
+    request_queue_size = 128
+
+    def startWorkers(self):
+        self.request_queue = queue.Queue(self.workers * 4)
+        self.worker_threads = []
+
+        for i in range(self.workers):
+            thread = threading.Thread(target = self.processRequests)
+            thread.daemon = self.daemon_threads
+            thread.start()
+            self.worker_threads.append(thread)
+
+    def stopWorkers(self):
+        for thread in self.worker_threads:
+            self.request_queue.put(None)
+
+        for thread in self.worker_threads:
+            thread.join()
+
+        self.worker_threads = []
+
+    def processRequests(self):
+        while True:
+            item = self.request_queue.get()
+
+            if item is None: # stop signal
+                break
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self.request_queue.put((request, client_address))
+
+class RenderMasterServer(WorkerPoolMixIn, http.server.HTTPServer):
     def __init__(self, address, handler_class, path, force=False, subdir=True):
+        # guards jobs, slaves and the balancer, see RenderHandler
+        self.lock = threading.Lock()
+
         self.jobs = []
         self.jobs_map = {}
         self.slaves = []
@@ -1050,6 +1254,11 @@ class RenderMasterServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
         for slave in removed:
             self.removeSlave(slave)
 
+    def housekeeping(self):
+        with self.lock:
+            self.timeoutSlaves()
+            self.updateUsage()
+
     def updateUsage(self):
         blend = 0.5
         for job in self.jobs:
@@ -1154,7 +1363,6 @@ def saveMaster(path, httpd):
 
 def runMaster(address, broadcast, clear, force, path, update_stats, test_break,use_ssl=False,cert_path="",key_path=""):
     httpd = createMaster(address, clear, force, path)
-    httpd.timeout = 1
     httpd.stats = update_stats
     if use_ssl:
         import ssl
@@ -1163,23 +1371,29 @@ def runMaster(address, broadcast, clear, force, path, update_stats, test_break,u
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
-    start_time = time.time() - 2
+    # accept connections in their own thread, requests are handled by the
+    # worker pool, this thread only runs the periodic housekeeping
+    httpd.startWorkers()
+    server_thread = threading.Thread(target = httpd.serve_forever, kwargs = {"poll_interval": 0.5})
+    server_thread.start()
 
-    while not test_break():
-        try:
-            httpd.handle_request()
-        except select.error:
-            pass
+    next_housekeeping = time.time()
 
-        if time.time() - start_time >= 2: # need constant here
-            httpd.timeoutSlaves()
+    while not test_break():
+        if time.time() >= next_housekeeping:
+            next_housekeeping = time.time() + HOUSEKEEPING_INTERVAL
 
-            httpd.updateUsage()
+            httpd.housekeeping()
 
             if broadcast:
                 print("broadcasting address")
                 s.sendto(bytes("%i" % address[1], encoding='utf8'), 0, ('<broadcast>', 8000))
-                start_time = time.time()
+
+        time.sleep(0.1)
+
+    httpd.shutdown()
+    server_thread.join()
+    httpd.stopWorkers()
 
     httpd.server_close()
     if clear:
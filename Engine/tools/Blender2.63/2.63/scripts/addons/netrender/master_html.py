@@ -46,6 +46,10 @@ def countFiles(job):
         elif not file == job.files[0]:
            tot_other += 1
     return tot_cache,tot_fluid,tot_other;
+
+# file cache usage reported by a slave
+def cacheText(slave):
+    return "%i hits, %i misses, %.1f MB saved" % (slave.cache_hits, slave.cache_misses, slave.cache_saved / 1048576)
     
     
 def get(handler):
@@ -374,10 +378,10 @@ def get(handler):
         output("<h2>Slaves</h2>")
 
         startTable()
-        headerTable("name", "address", "tags", "last seen", "stats", "job")
+        headerTable("name", "address", "tags", "last seen", "stats", "file cache", "job")
 
         for slave in handler.server.slaves:
-            rowTable(slave.name, slave.address[0], ";".join(sorted(slave.tags)) if slave.tags else "<i>All</i>", time.ctime(slave.last_seen), slave.stats, link(slave.job.name, "/html/job" + slave.job.id) if slave.job else "None")
+            rowTable(slave.name, slave.address[0], ";".join(sorted(slave.tags)) if slave.tags else "<i>All</i>", time.ctime(slave.last_seen), slave.stats, cacheText(slave), link(slave.job.name, "/html/job" + slave.job.id) if slave.job else "None")
         endTable()
 
         output("<h2>Configuration</h2>")
@@ -526,13 +530,14 @@ def get(handler):
             startTable()
             
             if job.hasRenderResult():
-                headerTable("no", "status", "render time", "slave", "log", "result", "")
+                headerTable("no", "status", "render time", "load time", "slave", "log", "result", "")
                 
                 for frame in job.frames:
                     rowTable(
                              frame.number,
                              frame.statusText(),
                              "%.1fs" % frame.time,
+                             "%.1fs" % frame.load_time,
                              frame.slave.name if frame.slave else "&nbsp;",
                              link("view log", logURL(job_id, frame.number)) if frame.log_path else "&nbsp;",
                              link("view result", renderURL(job_id, frame.number))  + " [" +
@@ -19,7 +19,7 @@
 import netrender.versioning as versioning
 from netrender.utils import *
 
-import time
+import time, heapq
 
 # Jobs status
 JOB_WAITING = 0 # before all data has been entered
@@ -121,6 +121,9 @@ class RenderSlave:
         self.total_done = 0
         self.total_error = 0
         self.last_seen = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_saved = 0 # bytes the slave didn't download thanks to its file cache
         
         if info:
             self.name = info.name
@@ -142,9 +145,18 @@ class RenderSlave:
                             "total_done": self.total_done,
                             "total_error": self.total_error,
                             "last_seen": self.last_seen,
-                            "tags": tuple(self.tags)
+                            "tags": tuple(self.tags),
+                            "cache_hits": self.cache_hits,
+                            "cache_misses": self.cache_misses,
+                            "cache_saved": self.cache_saved
                         }
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # slaves pickled before the file cache stats were added
+        for key in ("cache_hits", "cache_misses", "cache_saved"):
+            self.__dict__.setdefault(key, 0)
+
     @staticmethod
     def materialize(data, cache = True):
         if not data:
@@ -164,6 +176,9 @@ class RenderSlave:
         slave.total_error = data["total_error"]
         slave.last_seen = data["last_seen"]
         slave.tags = set(data["tags"])
+        slave.cache_hits = data.get("cache_hits", 0)
+        slave.cache_misses = data.get("cache_misses", 0)
+        slave.cache_saved = data.get("cache_saved", 0)
 
         if cache:
             RenderSlave._slave_map[slave_id] = slave
@@ -266,6 +281,17 @@ class RenderJob:
         self.last_dispatched = 0.0
         self.frames = []
         self.transitions = []
+
+        # kept up to date by addFrame and the frames' status setter
+        self._frame_index = {} # frame number -> position in self.frames
+        self._status_count = {
+                                FRAME_QUEUED: 0,
+                                FRAME_DISPATCHED: 0,
+                                FRAME_DONE: 0,
+                                FRAME_ERROR: 0
+                            }
+        self._queued = [] # heap of positions of queued frames
+        self._queued_set = set()
         
         self._status = None
         
@@ -356,19 +382,69 @@ class RenderJob:
 
     def addFrame(self, frame_number, command = ""):
         frame = RenderFrame(frame_number, command)
-        self.frames.append(frame)
+        self.appendFrame(frame)
         return frame
 
+    def appendFrame(self, frame):
+        position = len(self.frames)
+        self.frames.append(frame)
+        self._frame_index.setdefault(frame.number, position)
+
+        frame._job = self
+        self._status_count[frame.status] += 1
+        if frame.status == FRAME_QUEUED:
+            self._queueFrame(position)
+
+    def indexFrames(self):
+        """Rebuild the frame index and status counters from self.frames"""
+        frames = self.frames
+        self.frames = []
+        self._frame_index = {}
+        self._status_count = dict.fromkeys(self._status_count, 0)
+        self._queued = []
+        self._queued_set = set()
+
+        for frame in frames:
+            self.appendFrame(frame)
+
+    def _queueFrame(self, position):
+        if position not in self._queued_set:
+            self._queued_set.add(position)
+            heapq.heappush(self._queued, position)
+
+    def _frameStatusChanged(self, frame, old_status, new_status):
+        self._status_count[old_status] -= 1
+        self._status_count[new_status] += 1
+
+        if new_status == FRAME_QUEUED:
+            self._queueFrame(self._frame_index[frame.number])
+
+    def queuedFrames(self, count):
+        """First count queued frames, in the order they were added"""
+        queued = self._queued
+        frames = []
+
+        # frames that aren't queued anymore are only removed from the heap here
+        while queued and len(frames) < count:
+            position = heapq.heappop(queued)
+            frame = self.frames[position]
+
+            if frame.status == FRAME_QUEUED:
+                frames.append(position)
+            else:
+                self._queued_set.discard(position)
+
+        # still queued until dispatched, put them back
+        for position in frames:
+            heapq.heappush(queued, position)
+
+        return [self.frames[position] for position in frames]
+
     def __len__(self):
         return len(self.frames)
 
     def countFrames(self, status=FRAME_QUEUED):
-        total = 0
-        for f in self.frames:
-            if f.status == status:
-                total += 1
-
-        return total
+        return self._status_count[status]
 
     def countSlaves(self):
         return len(set((frame.slave for frame in self.frames if frame.status == FRAME_DISPATCHED)))
@@ -377,32 +453,25 @@ class RenderJob:
         return JOB_STATUS_TEXT[self.status]
 
     def framesStatus(self):
-        results = {
-                                FRAME_QUEUED: 0,
-                                FRAME_DISPATCHED: 0,
-                                FRAME_DONE: 0,
-                                FRAME_ERROR: 0
-                            }
-
-        for frame in self.frames:
-            results[frame.status] += 1
-
-        return results
+        return dict(self._status_count)
 
     def __contains__(self, frame_number):
-        for f in self.frames:
-            if f.number == frame_number:
-                return True
-        else:
-            return False
+        return frame_number in self._frame_index
 
     def __getitem__(self, frame_number):
-        for f in self.frames:
-            if f.number == frame_number:
-                return f
-        else:
+        position = self._frame_index.get(frame_number)
+        if position is None:
             return None
 
+        return self.frames[position]
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # jobs pickled before the frame index was added
+        if "_frame_index" not in state:
+            self._status_count = dict.fromkeys(FRAME_STATUS_TEXT, 0)
+            self.indexFrames()
+
     def serialize(self, frames = None,withFiles=True,withFrames=True):
         min_frame = min((f.number for f in frames)) if frames else -1
         max_frame = max((f.number for f in frames)) if frames else -1
@@ -428,7 +497,7 @@ class RenderJob:
            data["files"]=[f.serialize() for f in self.files if f.start == -1 or not frames or (f.start <= max_frame and f.end >= min_frame)]
           
         if (withFrames):
-           data["frames"]=[f.serialize() for f in self.frames if not frames or f in frames]
+           data["frames"]=[f.serialize() for f in (frames if frames else self.frames)]
            
         return data
     @staticmethod
@@ -446,7 +515,8 @@ class RenderJob:
         job.status = data["status"]
         job.transitions = data["transitions"]
         job.files = [RenderFile.materialize(f) for f in data["files"]]
-        job.frames = [RenderFrame.materialize(f) for f in data["frames"]]
+        for f in data["frames"]:
+            job.appendFrame(RenderFrame.materialize(f))
         job.chunks = data["chunks"]
         job.priority = data["priority"]
         job.usage = data["usage"]
@@ -463,13 +533,37 @@ class RenderJob:
 
 class RenderFrame:
     def __init__(self, number = 0, command = ""):
+        self._job = None    # job counting this frame's status, set by RenderJob.appendFrame
+        self._status = FRAME_QUEUED
         self.number = number
         self.time = 0
+        self.load_time = 0 # share of the time the slave spent loading the file
         self.status = FRAME_QUEUED
         self.slave = None
         self.command = command
         self.results = []   # List of filename of result files associated with this frame
 
+    @property
+    def status(self):
+        """Status of the frame (queued, dispatched, done or error)"""
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        old_status = self._status
+        self._status = value
+
+        if self._job is not None and old_status != value:
+            self._job._frameStatusChanged(self, old_status, value)
+
+    def __setstate__(self, state):
+        # frames pickled before status became a property
+        if "status" in state:
+            state["_status"] = state.pop("status")
+            state["_job"] = None
+        state.setdefault("load_time", 0)
+        self.__dict__.update(state)
+
     def statusText(self):
         return FRAME_STATUS_TEXT[self.status]
 
@@ -477,6 +571,7 @@ class RenderFrame:
         return 	{
                             "number": self.number,
                             "time": self.time,
+                            "load_time": self.load_time,
                             "status": self.status,
                             "slave": None if not self.slave else self.slave.serialize(),
                             "command": self.command,
@@ -491,6 +586,7 @@ class RenderFrame:
         frame = RenderFrame()
         frame.number = data["number"]
         frame.time = data["time"]
+        frame.load_time = data.get("load_time", 0)
         frame.status = data["status"]
         frame.slave = RenderSlave.materialize(data["slave"])
         frame.command = data["command"]
@@ -17,7 +17,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import sys, os, platform, shutil
-import http, http.client, http.server
+import http, http.client, http.server, socket, hashlib
 import subprocess, time, threading
 import json
 
@@ -27,6 +27,8 @@ from netrender.utils import *
 import netrender.model
 import netrender.repath
 import netrender.baking
+import netrender.cache
+import netrender.worker
 import netrender.thumbnail as thumbnail
 
 BLENDER_PATH = sys.argv[0]
@@ -65,12 +67,14 @@ def testCancel(conn, job_id, frame_number):
         else:
             return False
 
-def testFile(conn, job_id, slave_id, rfile, job_prefix, main_path=None):
+def testFile(conn, job_id, slave_id, rfile, job_prefix, main_path=None, cache=None):
     job_full_path = createLocalPath(rfile, job_prefix, main_path, rfile.force)
     
     found = os.path.exists(job_full_path)
     
-    if found and rfile.signature != None:
+    if found and cache and cache.holds(rfile.signature, job_full_path):
+        pass # linked from the cache, already verified
+    elif found and rfile.signature != None:
         found_signature = hashFile(job_full_path)
         found = found_signature == rfile.signature
         
@@ -81,25 +85,57 @@ def testFile(conn, job_id, slave_id, rfile, job_prefix, main_path=None):
     if not found:
         # Force prefix path if not found
         job_full_path = createLocalPath(rfile, job_prefix, main_path, True)
-        print("Downloading", job_full_path)
-        temp_path = os.path.join(job_prefix, "slave.temp")
-        with ConnectionContext():
-            conn.request("GET", fileURL(job_id, rfile.index), headers={"slave-id":slave_id})
-        response = conn.getresponse()
 
-        if response.status != http.client.OK:
-            return None # file for job not returned by server, need to return an error code to server
+        if cache and cache.link(rfile.signature, job_full_path):
+            print("Cached", job_full_path)
+            rfile.filepath = job_full_path
+            return job_full_path
 
-        f = open(temp_path, "wb")
-        buf = response.read(1024)
+        print("Downloading", job_full_path)
+        temp_path = os.path.join(job_prefix, "slave_%i.temp" % rfile.index)
+        headers = {"slave-id":slave_id}
+        hasher = hashlib.md5()
 
-        while buf:
-            f.write(buf)
-            buf = response.read(1024)
+        # resume what an interrupted download left behind
+        if os.path.exists(temp_path):
+            headers["range"] = "bytes=%i-" % os.path.getsize(temp_path)
 
-        f.close()
+        try:
+            with ConnectionContext():
+                conn.request("GET", fileURL(job_id, rfile.index), headers=headers)
+            response = conn.getresponse()
 
-        os.renames(temp_path, job_full_path)
+            if response.status == http.client.PARTIAL_CONTENT:
+                hashFile(temp_path, hasher)
+                mode = "ab"
+            elif response.status == http.client.OK:
+                mode = "wb"
+            else:
+                response.read()
+                return None # file for job not returned by server, need to return an error code to server
+
+            length = int(response.getheader("content-length", "-1"))
+            with open(temp_path, mode) as f:
+                copied = copyStream(response, f.write, length, hasher)
+        except (socket.error, http.client.HTTPException) as e:
+            print("Download of %s interrupted (%s)" % (job_full_path, e))
+            conn.close()
+            return None # keep the partial file to resume next time
+
+        if copied < length:
+            print("Download of %s incomplete, %i of %i bytes" % (job_full_path, copied, length))
+            conn.close()
+            return None
+
+        if rfile.signature != None and hasher.hexdigest() != rfile.signature:
+            print("Downloaded %s but signature mismatch!" % job_full_path)
+            os.remove(temp_path)
+            return None
+
+        if cache and cache.accepts(rfile.signature):
+            cache.add(rfile.signature, temp_path, job_full_path)
+        else:
+            os.renames(temp_path, job_full_path)
         
     rfile.filepath = job_full_path
 
@@ -153,11 +189,24 @@ def render_slave(engine, netsettings, threads):
         NODE_PREFIX = os.path.join(slave_path, "slave_" + slave_id)
         verifyCreateDir(NODE_PREFIX)
 
+        # kept for the next sessions using this working path, so it isn't cleared on exit
+        if netsettings.slave_cache_size > 0:
+            cache = netrender.cache.FileCache(os.path.join(slave_path, "cache"), netsettings.slave_cache_size * 1024 * 1024)
+        else:
+            cache = None
+
         engine.update_stats("", "Network render connected to master, waiting for jobs")
 
+        # keeps the file of the last job loaded, in case more of its frames are dispatched here
+        worker = None
+
         while not engine.test_break():
+            headers = {"slave-id":slave_id}
+            if cache:
+                headers.update(cache.statsHeaders())
+
             with ConnectionContext():
-                conn.request("GET", "/job", headers={"slave-id":slave_id})
+                conn.request("GET", "/job", headers=headers)
             response = conn.getresponse()
 
             if response.status == http.client.OK:
@@ -169,6 +218,16 @@ def render_slave(engine, netsettings, threads):
                 job_prefix = os.path.join(NODE_PREFIX, "job_" + job.id)
                 verifyCreateDir(job_prefix)
 
+                if worker and worker.job_id != job.id:
+                    worker.stop()
+                    worker = None
+
+                if cache:
+                    cache.release()
+
+                # baking writes point caches next to the job files, don't let it modify cached files
+                job_cache = cache if job.subtype != netrender.model.JOB_SUB_BAKING else None
+
                 # set tempdir for fsaa temp files
                 # have to set environ var because render is done in a subprocess and that's the easiest way to propagate the setting
                 os.environ["TMP"] = job_prefix
@@ -178,15 +237,17 @@ def render_slave(engine, netsettings, threads):
                     job_path = job.files[0].original_path # original path of the first file
                     main_path, main_file = os.path.split(job_path)
 
-                    job_full_path = testFile(conn, job.id, slave_id, job.files[0], job_prefix)
+                    job_full_path = testFile(conn, job.id, slave_id, job.files[0], job_prefix, cache=job_cache)
                     print("Fullpath", job_full_path)
                     print("File:", main_file, "and %i other files" % (len(job.files) - 1,))
 
                     for rfile in job.files[1:]:
-                        testFile(conn, job.id, slave_id, rfile, job_prefix, main_path)
+                        testFile(conn, job.id, slave_id, rfile, job_prefix, main_path, job_cache)
                         print("\t", rfile.filepath)
                         
-                    netrender.repath.update(job)
+                    # a worker still serving this job already loaded the repathed file
+                    if not (worker and worker.serves(job.id, job_full_path)):
+                        netrender.repath.update(job)
 
                     engine.update_stats("", "Render File " + main_file + " for job " + job.id)
                 elif job.type == netrender.model.JOB_VCS:
@@ -218,14 +279,15 @@ def render_slave(engine, netsettings, threads):
                 start_t = time.time()
 
                 if job.rendersWithBlender():
-                    frame_args = []
+                    if not (worker and worker.serves(job.id, job_full_path)):
+                        if worker:
+                            worker.stop()
+                        worker = netrender.worker.RenderWorker(job.id, job_full_path, job_prefix, job.render, threads)
 
                     for frame in job.frames:
                         print("frame", frame.number)
-                        frame_args += ["-f", str(frame.number)]
 
-                    with NoErrorDialogContext():
-                        process = subprocess.Popen([BLENDER_PATH, "-b", "-noaudio", job_full_path, "-t", str(threads), "-o", os.path.join(job_prefix, "######"), "-E", job.render, "-F", "MULTILAYER"] + frame_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                    process = worker.render([frame.number for frame in job.frames], netsettings.use_slave_thumb)
                         
                 elif job.subtype == netrender.model.JOB_SUB_BAKING:
                     tasks = []
@@ -346,6 +408,17 @@ def render_slave(engine, netsettings, threads):
 
                 avg_t = total_t / len(job.frames)
 
+                if job.rendersWithBlender():
+                    # time to load the file is shared by the frames of the chunk that waited for it
+                    frame_times = process.times
+                    load_t = process.load_time / len(job.frames)
+
+                    for frame in job.frames:
+                        print("Frame %i: load %.2fs render %.2fs" % (frame.number, load_t, frame_times.get(frame.number, 0)))
+                else:
+                    frame_times = {}
+                    load_t = 0
+
                 status = process.returncode
 
                 print("status", status)
@@ -357,6 +430,8 @@ def render_slave(engine, netsettings, threads):
                     headers["job-result"] = str(netrender.model.FRAME_DONE)
                     for frame in job.frames:
                         headers["job-frame"] = str(frame.number)
+                        headers["job-time"] = str(frame_times.get(frame.number, avg_t))
+                        headers["job-load-time"] = str(load_t)
                         if job.hasRenderResult():
                             # send image back to server
 
@@ -364,19 +439,14 @@ def render_slave(engine, netsettings, threads):
 
                             # thumbnail first
                             if netsettings.use_slave_thumb:
-                                thumbname = thumbnail.generate(filename)
+                                # rendered by the worker, which made the thumbnail already if it could
+                                thumbname = process.thumbnails.get(frame.number) or thumbnail.generate(filename)
                                 
                                 if thumbname:
-                                    f = open(thumbname, 'rb')
-                                    with ConnectionContext():
-                                        conn.request("PUT", "/thumb", f, headers=headers)
-                                    f.close()
+                                    sendFile(conn, "PUT", "/thumb", thumbname, headers)
                                     responseStatus(conn)
 
-                            f = open(filename, 'rb')
-                            with ConnectionContext():
-                                conn.request("PUT", "/render", f, headers=headers)
-                            f.close()
+                            sendFile(conn, "PUT", "/render", filename, headers)
                             if responseStatus(conn) == http.client.NO_CONTENT:
                                 continue
 
@@ -390,10 +460,7 @@ def render_slave(engine, netsettings, threads):
                                 headers["result-filename"] = result_filename
                                 headers["job-finished"] = str(result_filepath == frame_results[-1])
                                     
-                                f = open(result_filepath, 'rb')
-                                with ConnectionContext():
-                                    conn.request("PUT", "/result", f, headers=headers)
-                                f.close()
+                                sendFile(conn, "PUT", "/result", result_filepath, headers)
                                 if responseStatus(conn) == http.client.NO_CONTENT:
                                     continue
                             
@@ -406,6 +473,8 @@ def render_slave(engine, netsettings, threads):
                     headers["job-result"] = str(netrender.model.FRAME_ERROR)
                     for frame in job.frames:
                         headers["job-frame"] = str(frame.number)
+                        headers["job-time"] = str(frame_times.get(frame.number, avg_t))
+                        headers["job-load-time"] = str(load_t)
                         # send error result back to server
                         with ConnectionContext():
                             conn.request("PUT", "/render", headers=headers)
@@ -416,6 +485,12 @@ def render_slave(engine, netsettings, threads):
             else:
                 bisleep.sleep()
 
+        if worker:
+            worker.stop()
+
+        if cache:
+            cache.close()
+
         conn.close()
 
         if netsettings.use_slave_clear:
@@ -21,6 +21,8 @@ import subprocess
 
 import bpy
 
+THUMBNAIL_SIZE = 300
+
 def generate(filename, external=True):
     if external:
         process = subprocess.Popen([sys.argv[0],"-b", "-noaudio", "-P", __file__, "--", filename], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -45,24 +47,50 @@ def _internal(filename):
 
     if bpy:
         scene = bpy.data.scenes[0] # FIXME, this is dodgy!
-        scene.render.image_settings.file_format = "JPEG"
-        scene.render.image_settings.quality = 90
-        
-        # remove existing image, if there's a leftover (otherwise open changes the name)
-        if imagename in bpy.data.images:
+        settings = scene.render.image_settings
+        # render workers keep rendering with this scene afterward
+        file_format, quality = settings.file_format, settings.quality
+        settings.file_format = "JPEG"
+        settings.quality = 90
+        img = None
+
+        try:
+            # remove existing image, if there's a leftover (otherwise open changes the name)
+            if imagename in bpy.data.images:
+                img = bpy.data.images[imagename]
+                bpy.data.images.remove(img)
+                img = None
+
+            bpy.ops.image.open(filepath=filename)
             img = bpy.data.images[imagename]
-            bpy.data.images.remove(img)
 
-        bpy.ops.image.open(filepath=filename)
-        img = bpy.data.images[imagename]
-            
-        img.save_render(thumbname, scene=scene)
-        
-        img.user_clear()
-        bpy.data.images.remove(img)
+            # scale down here, only fall back on ImageMagick if that fails
+            width, height = img.size
+            resized = max(width, height) <= THUMBNAIL_SIZE
+            if not resized:
+                factor = THUMBNAIL_SIZE / max(width, height)
+                try:
+                    img.scale(max(1, int(width * factor)), max(1, int(height * factor)))
+                    resized = True
+                except (AttributeError, RuntimeError):
+                    pass
+
+            img.save_render(thumbname, scene=scene)
+        finally:
+            # even when saving fails, don't leave the scaled down image or
+            # the JPEG settings behind
+            if img is not None:
+                img.user_clear()
+                bpy.data.images.remove(img)
+
+            settings.file_format = file_format
+            settings.quality = quality
+
+        if resized:
+            return thumbname
 
         try:
-            process = subprocess.Popen(["convert", thumbname, "-resize", "300x300", thumbname])
+            process = subprocess.Popen(["convert", thumbname, "-resize", "%ix%i" % (THUMBNAIL_SIZE, THUMBNAIL_SIZE), thumbname])
             process.wait()
             return thumbname
         except Exception as exp:
@@ -169,6 +169,7 @@ class RENDER_PT_network_slave_settings(NetRenderButtonsPanel, bpy.types.Panel):
         layout.prop(netsettings, "use_slave_clear")
         layout.prop(netsettings, "use_slave_thumb")
         layout.prop(netsettings, "use_slave_output_log")
+        layout.prop(netsettings, "slave_cache_size")
         layout.label(text="Threads:")
         layout.prop(rd, "threads_mode", expand=True)
         
@@ -291,6 +292,7 @@ class RENDER_PT_network_slaves(NeedValidAddress, NetRenderButtonsPanel, bpy.type
             layout.label(text="Address: " + slave.address[0])
             layout.label(text="Seen: " + time.ctime(slave.last_seen))
             layout.label(text="Stats: " + slave.stats)
+            layout.label(text="File cache: %i hits, %i misses, %.1f MB saved" % (slave.cache_hits, slave.cache_misses, slave.cache_saved / 1048576))
 
 class RENDER_PT_network_slaves_blacklist(NeedValidAddress, NetRenderButtonsPanel, bpy.types.Panel):
     bl_label = "Slaves Blacklist"
@@ -462,6 +464,12 @@ class NetRenderSettings(bpy.types.PropertyGroup):
                         description="Use slave for baking jobs",
                         default = True)
 
+        NetRenderSettings.slave_cache_size = IntProperty(
+                        name="File cache (MB)",
+                        description="Size of the cache of job files shared between jobs, kept on exit (0 to disable)",
+                        default = 4096,
+                        min=0)
+
         NetRenderSettings.use_master_clear = BoolProperty(
                         name="Clear on exit",
                         description="Delete saved files on exit",
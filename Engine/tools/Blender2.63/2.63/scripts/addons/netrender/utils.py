@@ -30,6 +30,9 @@ except:
 
 VERSION = bytes(".".join((str(n) for n in netrender.bl_info["version"])), encoding='utf8')
 
+# size of the blocks files are transferred and hashed in
+BUFFER_SIZE = 1024 * 1024
+
 try:
     system = platform.system()
 except UnicodeDecodeError:
@@ -231,11 +234,84 @@ def renderURL(job_id, frame_number):
 def cancelURL(job_id):
     return "/cancel_%s" % (job_id)
 
-def hashFile(path):
-    f = open(path, "rb")
-    value = hashData(f.read())
-    f.close()
-    return value
+def copyStream(source, write, length = -1, hasher = None):
+    """Copy length bytes (or everything if -1) from source to the write
+    function in blocks, also feeding them to hasher. Returns the number of
+    bytes copied, which is less than length if source ended early."""
+    copied = 0
+
+    while length < 0 or copied < length:
+        buf = source.read(BUFFER_SIZE if length < 0 else min(BUFFER_SIZE, length - copied))
+        if not buf:
+            break
+
+        if write:
+            write(buf)
+        if hasher:
+            hasher.update(buf)
+
+        copied += len(buf)
+
+    return copied
+
+def hashFile(path, hasher = None):
+    # in blocks, files can be much bigger than memory
+    if hasher is None:
+        hasher = hashlib.md5()
+
+    with open(path, "rb") as f:
+        copyStream(f, None, hasher = hasher)
+
+    return hasher.hexdigest()
+
+def sendFile(conn, method, url, file_path, headers = {}, offset = 0):
+    """Send a file as request body in large blocks, starting at offset to
+    resume an upload. Read the response with conn.getresponse()"""
+    size = os.path.getsize(file_path)
+
+    with ConnectionContext():
+        conn.putrequest(method, url)
+        for key, value in headers.items():
+            conn.putheader(key, value)
+        conn.putheader("content-length", str(size - offset))
+        if offset:
+            conn.putheader("content-range", "bytes %i-%i/%i" % (offset, size - 1, size))
+        conn.endheaders()
+
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            copyStream(f, conn.send)
+
+def uploadFile(conn, url, file_path, headers = {}, retries = 3):
+    """PUT a file, resuming from what the master already received when the
+    upload is interrupted. Returns the response status"""
+    offset = 0
+
+    for attempt in range(retries + 1):
+        try:
+            sendFile(conn, "PUT", url, file_path, headers, offset)
+            status = responseStatus(conn)
+            if status != http.client.REQUESTED_RANGE_NOT_SATISFIABLE or attempt == retries:
+                return status
+            # master lost the start of the file, send it whole
+            offset = 0
+            continue
+        except (socket.error, http.client.HTTPException) as e:
+            if attempt == retries:
+                raise
+
+            print("Upload of %s interrupted (%s), resuming" % (file_path, e))
+            conn.close()
+
+        # ask the master how much of the file it has
+        with ConnectionContext():
+            conn.request("HEAD", url, headers = headers)
+        response = conn.getresponse()
+        response.read()
+
+        offset = int(response.getheader("file-size", "0"))
+        if offset >= os.path.getsize(file_path):
+            offset = 0
     
 def hashData(data):
     m = hashlib.md5()
@@ -0,0 +1,246 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import sys, os, re, time
+import subprocess, threading
+
+import bpy
+
+from netrender.utils import *
+import netrender.thumbnail as thumbnail
+
+BLENDER_PATH = sys.argv[0]
+
+# seconds a task waits for render output before letting the slave check for cancels
+READ_TIMEOUT = 1
+
+# seconds a worker gets to exit before it is killed
+EXIT_TIMEOUT = 10
+
+# replies from the worker, in between the render output
+reply_pattern = re.compile("NETRENDER WORKER\[ ([a-z]+) \]: (.*)")
+
+class RenderWorker:
+    """Blender process keeping a job file loaded between the chunks of that
+    job. Frames to render are sent as commands on its stdin."""
+    def __init__(self, job_id, job_full_path, job_prefix, engine, threads):
+        self.job_id = job_id
+        self.job_full_path = job_full_path
+        self.start_time = time.time()
+        self.load_time = None # set when the file is loaded
+        self.lock = threading.Condition()
+        self.output = [] # render output not read by a task yet
+        self.task = None
+        self.first_task = None # pays for loading the file
+
+        with NoErrorDialogContext():
+            self.process = subprocess.Popen([BLENDER_PATH, "-b", "-noaudio", job_full_path, "-t", str(threads), "-P", __file__, "--", os.path.join(job_prefix, "######"), engine], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        self.reader = threading.Thread(target=self._read)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def serves(self, job_id, job_full_path):
+        return self.job_id == job_id and self.job_full_path == job_full_path and self.process.poll() is None
+
+    def render(self, frames, thumbnails = False):
+        """Start rendering frames, returns the task to follow them"""
+        task = RenderTask(self, frames)
+
+        with self.lock:
+            self.task = task
+            if not self.first_task:
+                self.first_task = task
+                task.load_time = self.load_time or 0
+
+        try:
+            self._send("render %i %s" % (thumbnails, " ".join(str(number) for number in frames)))
+        except (IOError, OSError):
+            # worker died since it was last used
+            with self.lock:
+                task.returncode = 1
+
+        return task
+
+    def stop(self):
+        if self.process.poll() is None:
+            try:
+                self._send("quit")
+            except (IOError, OSError):
+                self.terminate()
+
+            self._wait()
+
+    def terminate(self):
+        if self.process.poll() is None:
+            try:
+                self.process.terminate()
+            except OSError:
+                pass
+
+    def _wait(self):
+        # Popen.wait() has no timeout before Python 3.3
+        end_time = time.time() + EXIT_TIMEOUT
+        while self.process.poll() is None:
+            if time.time() > end_time:
+                try:
+                    self.process.kill()
+                except OSError:
+                    pass
+
+                self.process.wait()
+                break
+
+            time.sleep(0.1)
+
+    def _send(self, command):
+        self.process.stdin.write(bytes(command + "\n", encoding='utf8'))
+        self.process.stdin.flush()
+
+    def _read(self):
+        for line in iter(self.process.stdout.readline, b""):
+            match = reply_pattern.match(str(line, encoding='utf8', errors='replace'))
+
+            with self.lock:
+                if match:
+                    self._reply(match.groups()[0], match.groups()[1].strip())
+                else:
+                    self.output.append(line)
+
+                self.lock.notify_all()
+
+        # output closed, the process should be exiting
+        self._wait()
+
+        with self.lock:
+            if self.task and self.task.returncode is None:
+                # worker died during the task
+                self.task.returncode = self.process.returncode or 1
+
+            self.lock.notify_all()
+
+    def _reply(self, kind, values):
+        task = self.task
+
+        if kind == "ready":
+            self.load_time = time.time() - self.start_time
+            if self.first_task:
+                self.first_task.load_time = self.load_time
+        elif not task:
+            pass # task was cancelled
+        elif kind == "frame":
+            number, done, render_time = values.split()
+            task.times[int(number)] = float(render_time)
+            if done != "1":
+                task.failed = True
+        elif kind == "thumb":
+            number, thumbname = values.split(" ", 1)
+            task.thumbnails[int(number)] = thumbname
+        elif kind == "done":
+            task.returncode = 1 if task.failed else 0
+            self.task = None
+
+class RenderTask:
+    """Frames being rendered by a worker. Used like the process rendering a
+    chunk used to be: poll(), terminate(), returncode and stdout.read()"""
+    def __init__(self, worker, frames):
+        self.worker = worker
+        self.frames = frames
+        self.returncode = None
+        self.failed = False
+        self.load_time = 0
+        self.times = {} # frame number -> render time
+        self.thumbnails = {} # frame number -> thumbnail path
+        self.stdout = self
+
+    def poll(self):
+        with self.worker.lock:
+            return self.returncode
+
+    def terminate(self):
+        self.worker.terminate()
+
+    def read(self, size = -1):
+        # all the output received so far, waiting a bit for some while rendering
+        worker = self.worker
+        with worker.lock:
+            if not worker.output and self.returncode is None:
+                worker.lock.wait(READ_TIMEOUT)
+
+            data = b"".join(worker.output)
+            worker.output = []
+
+        return data
+
+def reply(kind, *values):
+    sys.stdout.write("NETRENDER WORKER[ %s ]: %s\n" % (kind, " ".join(str(value) for value in values)))
+    sys.stdout.flush()
+
+def serve(output_path, engine):
+    scene = bpy.context.scene
+    scene.render.filepath = output_path
+    scene.render.engine = engine
+    scene.render.image_settings.file_format = "MULTILAYER"
+
+    reply("ready")
+
+    for line in iter(sys.stdin.readline, ""):
+        command = line.split()
+
+        if not command or command[0] == "quit":
+            break
+        elif command[0] == "render":
+            thumbnails = command[1] == "1"
+
+            for number in map(int, command[2:]):
+                start_time = time.time()
+                scene.frame_set(number)
+
+                try:
+                    done = "FINISHED" in bpy.ops.render.render(write_still=True)
+                except RuntimeError as exp:
+                    print(exp)
+                    done = False
+
+                reply("frame", number, int(done), time.time() - start_time)
+
+                if done and thumbnails:
+                    filename = bpy.path.abspath(scene.render.frame_path(frame=number))
+
+                    # the frame is rendered, a failed thumbnail mustn't stop the
+                    # chunk, the slave makes it in a separate process then
+                    try:
+                        thumbname = thumbnail.generate(filename, external=False)
+                    except (RuntimeError, IOError, OSError) as exp:
+                        print("Error while generating thumbnail")
+                        print(exp)
+                        thumbname = None
+
+                    if thumbname:
+                        reply("thumb", number, thumbname)
+
+            reply("done")
+
+if __name__ == "__main__":
+    try:
+        start = sys.argv.index("--") + 1
+    except ValueError:
+        start = 0
+
+    if start:
+        serve(*sys.argv[start:start + 2])
@@ -25,6 +25,7 @@ import os
 import re
 import struct, binascii
 import time
+import array, io, mmap, sys, zlib
 
 import bpy
 from mathutils import Vector, Matrix
@@ -53,6 +54,40 @@ imp.reload(bel.ob)
 imp.reload(bel.uv)
 '''
 
+# binary format tokens, see the list in load()
+TOKEN_NAME         = 1
+TOKEN_STRING       = 2
+TOKEN_INTEGER      = 3
+TOKEN_GUID         = 5
+TOKEN_INTEGER_LIST = 6
+TOKEN_FLOAT_LIST   = 7
+TOKEN_OBRACE       = 10
+TOKEN_CBRACE       = 11
+TOKEN_OBRACKET     = 14
+TOKEN_CBRACKET     = 15
+TOKEN_DOT          = 18
+TOKEN_COMMA        = 19
+TOKEN_SEMICOLON    = 20
+TOKEN_TEMPLATE     = 31
+TOKEN_ARRAY        = 52
+
+# template member types, as they would be written in a text file
+binaryTypes = {
+    40 : 'WORD',
+    41 : 'DWORD',
+    42 : 'FLOAT',
+    43 : 'DOUBLE',
+    44 : 'CHAR',
+    45 : 'UCHAR',
+    46 : 'SWORD',
+    47 : 'SDWORD',
+    48 : 'void',
+    49 : 'string',
+    50 : 'unicode',
+    51 : 'cstring',
+    52 : 'array',
+}
+
 ###################################################
 
 def load(operator, context, filepath,
@@ -87,11 +122,20 @@ def load(operator, context, filepath,
     namelookup = {}
     imgnamelookup = {}
     chunksize = int(chunksize)
-    reserved_type = (
-        'dword',
-        'float',
-        'string'
-    )
+    # single values in a data block, and their python type
+    castType = {
+        'dword'  : int,
+        'float'  : float,
+        'string' : str,
+        'word'   : int,
+        'double' : float,
+        'char'   : int,
+        'uchar'  : int,
+        'byte'   : int,
+        'sword'  : int,
+        'sdword' : int
+    }
+    scalar_type = tuple(castType)
 
     '''
         'array',
@@ -99,7 +143,7 @@ def load(operator, context, filepath,
         'Vector',
     '''
     '''
-    with * : defined in dXdata
+    with * : defined in castType
     
     WORD     16 bits
     * DWORD     32 bits
@@ -148,25 +192,19 @@ BINARY FORMAT
     
     '''
     
-    # COMMON REGEX
-    space = '[\ \t]{1,}' # at least one space / tab
-    space0 = '[\ \t]{0,}' # zero or more space / tab
-    
     # DIRECTX REGEX TOKENS
-    r_template = r'template' + space + '[\w]*' + space0 + '\{'
-    if quickmode :
-        r_sectionname = r'Mesh' + space + '[\W-]*'
-    else :
-        r_sectionname = r'[\w]*' + space + '[\w-]*' + space0 + '\{'
-    r_refsectionname = r'\{' + space0 + '[\w-]*' + space0 + '\}'
-    r_endsection = r'\{|\}'
+    # file structure : comments, strings, template and section headers,
+    # {references} and end of sections
+    r_struct = re.compile(
+        br'//[^\n]*|#[^\n]*|"[^"]*"'
+        br'|template\s+([\w-]+)\s*\{'
+        br'|([A-Za-z_][\w-]*)(?:[ \t\r\n]+([\w-]+))?\s*(?:<[^>]*>)?\s*\{'
+        br'|\{\s*([\w-]+)?\s*(?:<[^>]*>)?\s*\}'
+        br'|\}' )
     
-    # dX comments
-    r_ignore = r'#|//'
-    
-    #r_frame = r'Frame' + space + '[\w]*'
-    #r_matrix = r'FrameTransformMatrix' + space + '\{[\s\d.,-]*'
-    #r_mesh = r'Mesh' + space + '[\W]*'
+    # dX comments, and strings in data blocks
+    r_comment = re.compile(r'(//|#)[^\n]*')
+    r_value = re.compile(r'"([^"]*)"|([^\s;,"]+)')
 
     ###################
     ## STEP 1 FUNCTIONS
@@ -202,104 +240,112 @@ BINARY FORMAT
         return ( minor, major, format, accuracy )
         
     
-    ##
-    def dXtree(data,quickmode = False) :
+    ## one pass over the whole file (memory-mapped, see dXmap)
+    # records the byte span of the datas of every section :
+    # 'pointer' is the first byte after { and 'end' is the first byte
+    # of the first child section or reference, or the closing }
+    def dXtree(buf,quickmode = False) :
         tokens = {}
         templates = {}
         tokentypes = {}
-        c = 0
-        lvl = 0
-        tree = ['']
-        ptr = 0
-        eol = 0
-        trunkated = False
-        previouslvl = False
-        while True :
-            lines, trunkated = nextFileChunk(data,trunkated)
-            if lines == None : break
-            for l in lines :
-                
-                # compute pointer position
-                ptr += eol
-                c += 1
-                eol = len(l) + 1
-                #print(c,data.tell(),ptr+eol)
-                #if l != '' : print('***',l)
-                #if l == ''  : break
-                l = l.strip()
-                
-                # remove blank and comment lines
-                if l == '' or re.match(r_ignore,l) :
+        tree = ['']     # registered tokens, from root to the current section
+        opened = []     # name of every opened section, False if not registered
+        c = 1
+        last = 0
+        for m in r_struct.finditer(buf) :
+            start = m.start()
+            first = m.group()[:1]
+            if first in (b'/', b'#', b'"') :
+                continue
+            
+            if first == b'}' :
+                if opened :
+                    tokenname = opened.pop()
+                    if tokenname :
+                        tree.pop()
+                        if 'end' not in tokens[tokenname] : tokens[tokenname]['end'] = start
+                continue
+            
+            # line count, only for display
+            c += buf[last:start].count(b'\n')
+            last = start
+            
+            # datas of the current section end at its first child
+            parent = tree[-1]
+            if parent and 'end' not in tokens[parent] : tokens[parent]['end'] = start
+            
+            ## look for templates
+            if m.group(1) :
+                opened.append(False)
+                if use_templates and quickmode == False :
+                    templates[m.group(1).decode()] = {'pointer' : start, 'line' : c}
+            
+            ## look for any token or only Mesh token in quickmode
+            elif m.group(2) :
+                typname = m.group(2).decode()
+                if quickmode and typname.lower() != 'mesh' :
+                    opened.append(False)
                     continue
-                
-                # one line token cases level switch
-                if previouslvl :
-                    lvl -= 1
-                    previouslvl = False
-                
-                #print('%s lines in %.2f\''%(c,time.clock()-t),end='\r')
-                #print(c,len(l)+1,ptr,data.tell())
-                if '{' in l :
-                    lvl += 1
-                    if '}' in l : previouslvl = True #; print('got one line token : \n%s'%l)
-                elif '}' in l :
-                    lvl -= 1
-                #print(c,lvl,tree)
-                
-                if quickmode == False :
-                    ## look for templates
-                    if use_templates and re.match(r_template,l) :
-                        tname = l.split(' ')[1]
-                        templates[tname] = {'pointer' : ptr, 'line' : c}
-                        continue
+                xnam = m.group(3).decode() if m.group(3) else ''
+                tokenname = newToken(tokens,tokentypes,parent,typname,xnam,m.end(),c,len(opened)+1)
+                tree.append(tokenname)
+                opened.append(tokenname)
+            
+            ## look for {references}
+            elif quickmode == False and parent :
+                if m.group(4) : newReference(tokens,parent,m.group(4).decode(),c)
+        
+        return tokens, templates, tokentypes
     
-                    ## look for {references}
-                    if re.match(r_refsectionname,l) :
-                        refname = namelookup[ l[1:-1].strip() ]
-                        #print('FOUND reference to %s in %s at line %s (level %s)'%(refname,tree[lvl-1],c,lvl))
-                        #tree = tree[0:lvl]
-                        parent = tree[lvl-1]
-                        # tag it as a reference, since it's not exactly a child.
-                        # put it in childs since order can matter in sub tokens declaration
-                        tokens[parent]['childs'].append('*'+refname)
-                        if refname not in tokens :
-                            print('reference to %s done before its declaration (line %s)\ncreated dummy'%(refname,c))
-                            tokens[refname] = {}
-                        if 'user' not in tokens[refname] : tokens[refname]['users'] = [parent]
-                        else : tokens[refname]['users'].append(parent)
-                        continue
+    ## register a section in the tree, returns its unique name.
+    # name unnamed tokens, watchout for x duplicate
+    # for blender, referenced token in x should be named and unique..
+    def newToken(tokens,tokentypes,parent,typname,xnam,ptr,c,lvl) :
+        typ = typname.lower()
+        name = xnam if xnam else typname
+        tokenname = namelookup[xnam] = bel.bpyname(name,tokens,4)
+        if lvl == 1 : rootTokens.append(tokenname)
+        if typ not in tokentypes : tokentypes[typ] = [tokenname]
+        else : tokentypes[typ].append(tokenname)
+        if tokenname in tokens :
+            tokens[tokenname]['pointer'] = ptr
+            tokens[tokenname]['line'] = c
+            tokens[tokenname]['parent'] = parent
+            tokens[tokenname]['childs'] = []
+            tokens[tokenname]['type'] = typ
+            tokens[tokenname].pop('end',None)
+        else : tokens[tokenname] = {'pointer': ptr,
+                                    'line'   : c,
+                                    'parent' : parent,
+                                    'childs' : [],
+                                    'users'  : [],
+                                    'type'   : typ
+                                    }
+        if parent and quickmode == False :
+            tokens[parent]['childs'].append(tokenname)
+        return tokenname
+    
+    ## register a {reference} to a section in its parent
+    def newReference(tokens,parent,refname,c) :
+        refname = namelookup.get(refname,refname)
+        # tag it as a reference, since it's not exactly a child.
+        # put it in childs since order can matter in sub tokens declaration
+        tokens[parent]['childs'].append('*'+refname)
+        if refname not in tokens :
+            print('reference to %s done before its declaration (line %s)\ncreated dummy'%(refname,c))
+            tokens[refname] = {}
+        if 'users' not in tokens[refname] : tokens[refname]['users'] = [parent]
+        else : tokens[refname]['users'].append(parent)
+    
+    ## memory-map the file when possible, so large files are not
+    # read and decoded as a whole
+    def dXmap(data) :
+        try :
+            return mmap.mmap(data.fileno(),0,access=mmap.ACCESS_READ)
+        except (AttributeError, ValueError, EnvironmentError) :
+            data.seek(0)
+            return data.read()
     
-                ## look for any token or only Mesh token in quickmode
-                if re.match(r_sectionname,l) :
-                    tokenname = getName(l,tokens)
-                    #print('FOUND %s %s %s %s'%(tokenname,c,lvl,tree))
-                    #print('pointer %s %s'%(data.tell(),ptr))
-                    if lvl == 1 : rootTokens.append(tokenname)
-                    typ = l.split(' ')[0].strip().lower()
-                    tree = tree[0:lvl]
-                    if typ not in tokentypes : tokentypes[typ] = [tokenname]
-                    else : tokentypes[typ].append(tokenname)
-                    parent = tree[-1]
-                    if tokenname in tokens :
-                        tokens[tokenname]['pointer'] = ptr
-                        tokens[tokenname]['line'] = c
-                        tokens[tokenname]['parent'] = parent
-                        tokens[tokenname]['childs'] = []
-                        tokens[tokenname]['type'] = typ
-                        
-                    else : tokens[tokenname] = {'pointer': ptr,
-                                                'line'   : c,
-                                                'parent' : parent,
-                                                'childs' : [],
-                                                'users'  : [],
-                                                'type'   : typ
-                                                }
-                    tree.append(tokenname)
-                    if lvl > 1 and quickmode == False :
-                        tokens[parent]['childs'].append(tokenname)
-                    
-        return tokens, templates, tokentypes
-        
     ## returns file binary chunks
     def nextFileChunk(data,trunkated=False,chunksize=1024) :
         if chunksize == 0 : chunk = data.read()
@@ -314,29 +360,182 @@ BINARY FORMAT
                 if lines[0] == '' : return None, None
                 return lines, False
             return lines, lines.pop()
-        # wip, todo for binaries
-        else :
-            print(chunk)
-            for word in range(0,len(chunk)) :
-                w = chunk[word:word+4]
-                print(word,w,struct.unpack("<l", w),binascii.unhexlify(w))
+        # binaries are read by dXtreeBinary
+        return None, None
 
-    
-    # name unnamed tokens, watchout for x duplicate
-    # for blender, referenced token in x should be named and unique..
-    def getName(l,tokens) :
-        xnam = l.split(' ')[1].strip()
-        
-        #if xnam[0] == '{' : xnam = ''
-        if xnam and xnam[-1] == '{' : xnam = xnam[:-1]
-        
-        name = xnam
-        if len(name) == 0 : name = l.split(' ')[0].strip()
-        
-        namelookup[xnam] = bel.bpyname(name,tokens,4)
+    ## MSZIP COMPRESSED FILES ('tzip', 'bzip')
+    # after the header : a DWORD (uncompressed size) then blocks of
+    # WORD uncompressed size, WORD compressed size, 'CK', deflate datas.
+    # every block uses the previous one as dictionary. zlib can't be given one
+    # in python 3.2 so the dictionary is prepended as a stored deflate block
+    # and removed from the output.
+    # returns the uncompressed file, with a 'txt ' or 'bin ' header
+    def dXdecompress(data) :
+        header = data.read(16)
+        data.read(4)
+        if header[8:12] == b'tzip' : chunks = [ header[:8] + b'txt ' + header[12:] + b'\n' ]
+        else : chunks = [ header[:8] + b'bin ' + header[12:] ]
+        history = b''
+        while True :
+            blockhead = data.read(4)
+            if len(blockhead) < 4 : break
+            usize, csize = struct.unpack('<HH',blockhead)
+            block = data.read(csize)
+            if block[:2] != b'CK' :
+                print('bad MSZIP block at %s'%(data.tell() - csize - 4))
+                break
+            if history :
+                block = b'\x00' + struct.pack('<HH',len(history),len(history) ^ 0xffff) + history + block[2:]
+            else :
+                block = block[2:]
+            chunk = zlib.decompressobj(-15).decompress(block)[len(history):]
+            chunks.append(chunk)
+            history = chunk[-32768:]
+        return io.BytesIO(b''.join(chunks))
 
-        return namelookup[xnam]
-    
+    ## BINARY TOKENS
+    # returns token, value, pointer of the next token.
+    # lists are not decoded here, their value is (pointer, count)
+    def nextBinaryToken(buf,ptr) :
+        token = struct.unpack_from('<H',buf,ptr)[0]
+        ptr += 2
+        if token == TOKEN_NAME or token == TOKEN_STRING :
+            count = struct.unpack_from('<L',buf,ptr)[0]
+            value = buf[ptr+4:ptr+4+count].decode('utf-8', errors='ignore')
+            ptr += 4 + count
+            # strings are followed by their separator
+            if token == TOKEN_STRING and ptr + 2 <= len(buf) and struct.unpack_from('<H',buf,ptr)[0] in (TOKEN_COMMA, TOKEN_SEMICOLON) :
+                ptr += 2
+            return token, value, ptr
+        elif token == TOKEN_INTEGER :
+            return token, struct.unpack_from('<L',buf,ptr)[0], ptr + 4
+        elif token == TOKEN_GUID :
+            return token, buf[ptr:ptr+16], ptr + 16
+        elif token == TOKEN_INTEGER_LIST :
+            count = struct.unpack_from('<L',buf,ptr)[0]
+            return token, (ptr+4, count), ptr + 4 + count * 4
+        elif token == TOKEN_FLOAT_LIST :
+            count = struct.unpack_from('<L',buf,ptr)[0]
+            return token, (ptr+4, count), ptr + 4 + count * (8 if accuracy == 64 else 4)
+        return token, None, ptr
+
+    def guidString(guid) :
+        d1, d2, d3 = struct.unpack_from('<LHH',guid)
+        d4 = binascii.hexlify(guid[8:10]).decode()
+        d5 = binascii.hexlify(guid[10:16]).decode()
+        return '<%08x-%04x-%04x-%s-%s>'%(d1,d2,d3,d4,d5)
+
+    ## binary counterpart of dXtree
+    # fills the same dicts. pointers are offsets of the first data token
+    # of each block in buf, and lines are replaced by the block count
+    def dXtreeBinary(buf,quickmode = False) :
+        tokens = {}
+        templates = {}
+        tokentypes = {}
+        tree = ['']     # registered tokens, from root to the current block
+        opened = []     # True for every opened block registered in tree
+        header = []     # names read before a {
+        c = 0
+        ptr = 0
+        end = len(buf)
+        while ptr < end :
+            token, value, ptr = nextBinaryToken(buf,ptr)
+
+            if token == TOKEN_NAME :
+                header = header[-1:] + [value]
+            
+            elif token == TOKEN_GUID :
+                continue
+            
+            elif token == TOKEN_TEMPLATE :
+                c += 1
+                tname = nextBinaryToken(buf,ptr)[1]
+                if use_templates and quickmode == False :
+                    templates[tname] = {'pointer' : ptr, 'line' : c}
+                while token != TOKEN_CBRACE :
+                    token, value, ptr = nextBinaryToken(buf,ptr)
+            
+            elif token == TOKEN_OBRACE and header :
+                c += 1
+                typname = header[0]
+                typ = typname.lower()
+                xnam = header[1] if len(header) > 1 else ''
+                header = []
+                if quickmode and typ != 'mesh' :
+                    opened.append(False)
+                    continue
+                tokenname = newToken(tokens,tokentypes,tree[-1],typname,xnam,ptr,c,len(opened)+1)
+                tree.append(tokenname)
+                opened.append(True)
+            
+            # { reference }
+            elif token == TOKEN_OBRACE :
+                refname = False
+                while token != TOKEN_CBRACE :
+                    token, value, ptr = nextBinaryToken(buf,ptr)
+                    if token == TOKEN_NAME : refname = value
+                if quickmode or refname == False or tree[-1] == '' : continue
+                newReference(tokens,tree[-1],refname,c)
+            
+            elif token == TOKEN_CBRACE :
+                header = []
+                if opened and opened.pop() : tree.pop()
+            
+            else :
+                header = []
+
+        return tokens, templates, tokentypes
+
+    ## returns the data values of a binary block as a flat list
+    # (nested blocks and references stop the read, data comes first)
+    def readBinaryBlock(buf,token) :
+        ptr = token['pointer']
+        values = []
+        floattype = 'd' if accuracy == 64 else 'f'
+        while True :
+            token, value, ptr = nextBinaryToken(buf,ptr)
+            if token == TOKEN_INTEGER_LIST or token == TOKEN_FLOAT_LIST :
+                s, count = value
+                lst = array.array('I' if token == TOKEN_INTEGER_LIST else floattype)
+                lst.frombytes(buf[s:s + count * lst.itemsize])
+                if sys.byteorder != 'little' : lst.byteswap()
+                values.extend(lst)
+            elif token == TOKEN_STRING or token == TOKEN_INTEGER :
+                values.append(value)
+            elif token in (TOKEN_NAME, TOKEN_OBRACE, TOKEN_CBRACE) or ptr >= len(buf) :
+                break
+        return values
+
+    ## binary counterpart of readTemplate
+    # the template is written back as text and parsed by parseTemplate
+    def readBinaryTemplate(buf,tpl_name,display=False) :
+        ptr = templates[tpl_name]['pointer']
+        block = []
+        append = block.append
+        bracket = False
+        uuid = True
+        token = False
+        while token != TOKEN_CBRACE :
+            token, value, ptr = nextBinaryToken(buf,ptr)
+            if token == TOKEN_CBRACE : append('}')
+            elif token == TOKEN_NAME : append(value if bracket else ' ' + value)
+            elif token == TOKEN_INTEGER : append(str(value))
+            elif token == TOKEN_GUID :
+                # only the template uuid, restrictions guids are dropped
+                if uuid : append(guidString(value))
+                uuid = False
+            elif token == TOKEN_OBRACKET :
+                append('[')
+                bracket = True
+            elif token == TOKEN_CBRACKET :
+                append(']')
+                bracket = False
+            elif token == TOKEN_SEMICOLON : append(';')
+            elif token == TOKEN_COMMA : append(',')
+            elif token == TOKEN_DOT : append('.')
+            elif token in binaryTypes : append(' ' + binaryTypes[token])
+        block = ''.join(block).replace('> ','>').replace('; ',';')
+        parseTemplate(tpl_name,block,display)
     
     ###################
     ## STEP 2 FUNCTIONS
@@ -370,19 +569,6 @@ BINARY FORMAT
                 if fi == len(field) - 1 and len(tokens[tokenname]['childs']) == 0 :
                     print('%s.%s'%(line,tab))
     
-    ## remove eol, comments, spaces from a raw block of datas
-    def cleanBlock(block) :
-        while '//' in block :
-            s = block.index('//')
-            e = block.index('\n',s+1)
-            block = block[0:s] + block[e:]
-        while '#' in block :
-            s = block.index('#')
-            e = block.index('\n',s+1)
-            block = block[0:s] + block[e:]
-        block = block.replace('\n','').replace(' ','').replace('\t ','')
-        return block
-        
     def readToken(tokenname) :
         token = tokens[tokenname]
         datatype = token['type'].lower()
@@ -392,96 +578,79 @@ BINARY FORMAT
             print("can't find any template to read %s (type : %s)"%(tokenname,datatype))
             return False
         #print('> use template %s'%datatype)
-        block = readBlock(data,token)
-        ptr = 0
-        #return dXtemplateData(tpl,block)
-        fields, ptr = dXtemplateData(tpl,block)
+        if format == 'bin' : values = readBinaryBlock(buf,token)
+        else : values = readTextBlock(buf,token)
+        fields, ptr = dXtemplateValues(tpl,values)
         if datatype in templatesConvert :
             fields = eval( templatesConvert[datatype] )
         return fields
     
-    def dXtemplateData(tpl,block,ptr=0) :
-        #print('dxTPL',block[ptr])
+    ## returns the data values of a text block as a flat list of strings
+    def readTextBlock(buf,token) :
+        block = buf[token['pointer']:token.get('end',len(buf))].decode('utf-8', errors='ignore')
+        if '//' in block or '#' in block :
+            block = r_comment.sub('',block)
+        if '"' in block :
+            return [ s if v == '' else v for s, v in r_value.findall(block) ]
+        return block.replace(';',' ').replace(',',' ').split()
+    
+    ## fill a template with a flat list of values (see readBinaryBlock,
+    # readTextBlock). text values are cast to the member types here
+    def dXtemplateValues(tpl,values,ptr=0) :
         pack = []
         append = pack.append
-        namespace = locals()
+        namespace = {}
         for member in tpl['members'] :
-            #print(member)
             datatype = member[0].lower()
             dataname = member[-1]
-            if datatype ==  'array' :
+            if datatype == 'array' :
                 datatype = member[1].lower()
                 s = dataname.index('[') + 1
                 e = dataname.index(']')
-                #print(dataname[s:e])
-                length = eval(dataname[s:e])
-                #print("array %s type %s length defined by '%s' : %s"%(dataname[:s-1],datatype,dataname[s:e],length))
+                length = eval(dataname[s:e],{},namespace)
                 dataname = dataname[:s-1]
-                datavalue, ptr = dXarray(block, datatype, length, ptr)
-                #print('back to %s'%(dataname))
+                if datatype in scalar_type :
+                    datavalue = values[ptr:ptr+length]
+                    if format == 'txt' :
+                        datavalue = list(map(castType[datatype],datavalue))
+                    ptr += length
+                else :
+                    if datatype in templates : itemtpl = templates[datatype]
+                    else : itemtpl = defaultTemplates.get(datatype)
+                    # array of vectors, coords..
+                    if itemtpl and datatype not in templatesConvert and \
+                      all( item[0].lower() in scalar_type for item in itemtpl['members'] ) :
+                        size = len(itemtpl['members'])
+                        datavalue = values[ptr:ptr+length*size]
+                        if format == 'txt' :
+                            for i, item in enumerate(itemtpl['members']) :
+                                datavalue[i::size] = list(map(castType[item[0].lower()],datavalue[i::size]))
+                        datavalue = [ datavalue[i:i+size] for i in range(0,length*size,size) ]
+                        ptr += length*size
+                    else :
+                        datavalue = []
+                        for i in range(length) :
+                            item, ptr = dXvalue(values,datatype,ptr)
+                            datavalue.append(item)
             else :
-                length = 1
-                datavalue, ptr = dXdata(block, datatype, length, ptr)
-    
-            #if len(str(datavalue)) > 50 : dispvalue = str(datavalue[0:25]) + ' [...] ' + str(datavalue[-25:])
-            #else : dispvalue = str(datavalue)
-            #print('%s :  %s %s'%(dataname,dispvalue,type(datavalue)))
-            #exec('%s = datavalue'%(dataname))
+                datavalue, ptr = dXvalue(values,datatype,ptr)
             namespace[dataname] = datavalue
             append( datavalue )
-        return pack, ptr + 1
-    
-    def dXdata(block,datatype,length,s=0,eof=';') :
-        #print('dxDTA',block[s])
-        # at last, the data we need
-        # should be a ';' but one meet ',' often, like in meshface
-        if datatype == 'dword' :
-            e = block.index(';',s+1)
-            try : field = int(block[s:e])
-            except :
-                e = block.index(',',s+1)
-                field = int(block[s:e])
-            return field, e+1
-        elif datatype == 'float' :
-            e = block.index(eof,s+1)
-            return float(block[s:e]), e+1
-        elif datatype == 'string' :
-            e = block.index(eof,s+1)
-            return str(block[s+1:e-1]) , e+1
-        else :
-            if datatype in templates : tpl = templates[datatype]
-            elif datatype in defaultTemplates : tpl = defaultTemplates[datatype]
-            else :
-                print("can't find any template for type : %s"%(datatype))
-                return False
-            #print('> use template %s'%datatype)
-            fields, ptr = dXtemplateData(tpl,block,s)
-            if datatype in templatesConvert :
-                fields = eval( templatesConvert[datatype] )
-            return fields, ptr
+        return pack, ptr
     
-    def dXarray(block, datatype, length, s=0) :
-        #print('dxARR',block[s])
-        lst = []
-        append = lst.append
-        if datatype in reserved_type :
-            eoi=','
-            for i in range(length) :
-                if i+1 == length : eoi = ';'
-                datavalue, s = dXdata(block,datatype,1,s,eoi)
-                append( datavalue )
-        
+    def dXvalue(values,datatype,ptr) :
+        if datatype in scalar_type :
+            if format == 'txt' : return castType[datatype](values[ptr]), ptr + 1
+            return values[ptr], ptr + 1
+        if datatype in templates : tpl = templates[datatype]
+        elif datatype in defaultTemplates : tpl = defaultTemplates[datatype]
         else :
-            eoi = ';,'
-            for i in range(length) :
-                if i+1 == length : eoi = ';;'
-                #print(eoi)
-                e = block.index(eoi,s)
-                #except : print(block,s) ; popo()
-                datavalue, na = dXdata(block[s:e+1],datatype,1)
-                append( datavalue )
-                s = e + 2
-        return lst, s
+            print("can't find any template for type : %s"%(datatype))
+            return False, ptr
+        fields, ptr = dXtemplateValues(tpl,values,ptr)
+        if datatype in templatesConvert :
+            fields = eval( templatesConvert[datatype] )
+        return fields, ptr
     
     ###################################################
 
@@ -505,6 +674,10 @@ BINARY FORMAT
                     go = False
                     break
         block = ''.join(lines)
+        parseTemplate(tpl_name,block,display)
+
+    ## fill a template members from its text definition
+    def parseTemplate(tpl_name,block,display=False) :
         uuid = re.search(r'<.+>',block).group()
         templates[tpl_name]['uuid'] = uuid.lower()
         templates[tpl_name]['members'] = []
@@ -545,41 +718,6 @@ BINARY FORMAT
                 else :
                     print('MATCHES BUILTIN TEMPLATE')
 
-    ##  read any kind of token data block
-    # by default the block is cleaned from inline comment space etc to allow data parsing
-    # useclean = False (retrieve all bytes) if you need to compute a file byte pointer
-    # to mimic the file.tell() function and use it with file.seek() later
-    def readBlock(data,token, clean=True) :
-        data.seek(token['pointer'])
-        lines = []
-        append = lines.append
-        strip = str.strip
-        go = True
-        init = True
-        
-        def cleanLine(l):
-            if '//' in l : l = l[0:l.index('//')]
-            if '#' in l : l = l[0:l.index('#')]
-            return l.strip().replace(' ','').replace('\t','')
-            
-        while go :
-            chunk = data.read(512).decode('utf-8', errors='ignore')
-            chunk = chunk.replace('\r','\n').split('\n')
-            for l in map(cleanLine, chunk) :
-                if l == '' : continue
-                if init :
-                    l = l[l.index('{')+1:]
-                    init = False
-                if '}' in l :
-                    append(l[0:l.index('}')])
-                    go = False
-                    break
-                append(l)
-        
-        block = ''.join(lines)
-        return block
-
-
     def getChilds(tokenname) :
         childs = []
         # '*' in childname means it's a reference. always perform this test
@@ -923,18 +1061,30 @@ BINARY FORMAT
             print('  format : %s'%(format))
             print('  floats are %s bits'%(accuracy))
 
-        if format in [ 'txt' ] : #, 'bin' ] :
+        # compressed files are read as their uncompressed counterpart
+        if format in [ 'tzip', 'bzip' ] :
+            data = dXdecompress(data)
+            format = 'txt' if format == 'tzip' else 'bin'
+
+        if format in [ 'txt', 'bin' ] :
 
             ## FILE READ : STEP 1 : STRUCTURE
             if show_geninfo : print('\nBuilding internal .x tree')
             t = time.clock()
-            tokens, templates, tokentypes = dXtree(data,quickmode)
+            if format == 'bin' :
+                data.seek(16)
+                buf = data.read()
+                tokens, templates, tokentypes = dXtreeBinary(buf,quickmode)
+            else :
+                buf = dXmap(data)
+                tokens, templates, tokentypes = dXtree(buf,quickmode)
             readstruct_time = time.clock()-t
             if show_geninfo : print('builded tree in %.2f\''%(readstruct_time)) # ,end='\r')
 
             ## populate templates with datas
             for tplname in templates :
-                readTemplate(data,tplname,show_templates)
+                if format == 'bin' : readBinaryTemplate(buf,tplname,show_templates)
+                else : readTemplate(data,tplname,show_templates)
 
             ## DATA TREE CHECK
             if show_tree :
@@ -964,11 +1114,13 @@ BINARY FORMAT
 
                     ob = getMesh(obname,tokenname,show_geninfo)
                     ob.matrix_world = global_matrix
+            
+            if type(buf) == mmap.mmap : buf.close()
                     
             print('done in %.2f\''%(time.clock()-start)) # ,end='\r')
             
         else :
-            print('only .x files in text format are currently supported')
+            print('unknown .x format : %s'%format)
             print('please share your file to make the importer evolve')
 
 
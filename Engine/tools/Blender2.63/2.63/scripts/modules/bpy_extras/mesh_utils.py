@@ -20,6 +20,8 @@
 
 __all__ = (
     "mesh_linked_tessfaces",
+    "mesh_linked_polygons",
+    "mesh_linked_vertices",
     "edge_face_count_dict",
     "edge_face_count",
     "edge_loops_from_tessfaces",
@@ -29,6 +31,51 @@ __all__ = (
     )
 
 
+def _linked_groups(tot, item_keys):
+    """
+    Groups the items 0..tot-1 that share a key, using a union-find so each
+    (item, key) pair is only visited once.
+
+    :arg tot: the number of items.
+    :type tot: int
+    :arg item_keys: (item, key) pairs, items sharing a key are linked.
+    :type item_keys: iterable
+    :return: arrays of item indices, in order of their first item.
+    :rtype: list
+    """
+    from array import array
+
+    parent = list(range(tot))
+
+    def find(i):
+        while parent[i] != i:
+            # path halving
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    key_items = {}
+    for i, key in item_keys:
+        i_other = key_items.setdefault(key, i)
+        if i_other != i:
+            root = find(i)
+            root_other = find(i_other)
+            if root != root_other:
+                parent[root] = root_other
+
+    group_index = {}
+    groups = []
+    for i in range(tot):
+        root = find(i)
+        try:
+            groups[group_index[root]].append(i)
+        except KeyError:
+            group_index[root] = len(groups)
+            groups.append(array('i', (i,)))
+
+    return groups
+
+
 def mesh_linked_tessfaces(mesh):
     """
     Splits the mesh into connected faces, use this for seperating cubes from
@@ -39,50 +86,104 @@ def mesh_linked_tessfaces(mesh):
     :return: lists of lists containing faces.
     :rtype: list
     """
+    from array import array
+
+    tessfaces = mesh.tessfaces
+    tot_face = len(tessfaces)
+
+    face_verts = array('i', [0]) * (tot_face * 4)
+    tessfaces.foreach_get("vertices_raw", face_verts)
+
+    def item_keys():
+        for i in range(tot_face):
+            j = i * 4
+            yield i, face_verts[j]
+            yield i, face_verts[j + 1]
+            yield i, face_verts[j + 2]
+            # triangles store 0 as their 4th vertex, quads never do
+            if face_verts[j + 3]:
+                yield i, face_verts[j + 3]
+
+    return [[tessfaces[i] for i in group]
+            for group in _linked_groups(tot_face, item_keys())]
+
+
+def mesh_linked_polygons(mesh, delimit='VERT', uv_layer=None):
+    """
+    Splits the mesh polygons into connected parts in linear time, use this
+    to split a mesh by part or by UV island.
+
+    :arg mesh: the mesh used to group with.
+    :type mesh: :class:`bpy.types.Mesh`
+    :arg delimit: 'VERT' links polygons sharing a vertex, 'UV' only links
+       polygons sharing a vertex with the same UV coordinate.
+    :type delimit: string
+    :arg uv_layer: the UV layer used by 'UV', defaults to the active one,
+       a ValueError is raised when the mesh has none.
+    :type uv_layer: :class:`bpy.types.MeshUVLoopLayer`
+    :return: arrays of polygon indices, one for each connected part.
+    :rtype: list
+    """
+    from array import array
+
+    polygons = mesh.polygons
+    tot_poly = len(polygons)
+    tot_loop = len(mesh.loops)
+
+    loop_starts = array('i', [0]) * tot_poly
+    polygons.foreach_get("loop_start", loop_starts)
+    loop_totals = array('i', [0]) * tot_poly
+    polygons.foreach_get("loop_total", loop_totals)
+    loop_verts = array('i', [0]) * tot_loop
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+
+    if delimit == 'UV':
+        if uv_layer is None:
+            uv_layer = mesh.uv_layers.active
+            if uv_layer is None:
+                raise ValueError("delimit 'UV' needs a mesh with UV layers")
+        loop_uvs = array('f', [0.0, 0.0]) * tot_loop
+        uv_layer.data.foreach_get("uv", loop_uvs)
+
+        def loop_key(loop):
+            return loop_verts[loop], loop_uvs[loop * 2], loop_uvs[loop * 2 + 1]
+    elif delimit == 'VERT':
+        loop_key = loop_verts.__getitem__
+    else:
+        raise ValueError("delimit must be 'VERT' or 'UV', not %r" % delimit)
+
+    def item_keys():
+        for i in range(tot_poly):
+            start = loop_starts[i]
+            for loop in range(start, start + loop_totals[i]):
+                yield i, loop_key(loop)
+
+    return _linked_groups(tot_poly, item_keys())
+
+
+def mesh_linked_vertices(mesh):
+    """
+    Splits the mesh vertices into parts connected by edges, loose vertices
+    are returned as parts of their own.
+
+    :arg mesh: the mesh used to group with.
+    :type mesh: :class:`bpy.types.Mesh`
+    :return: arrays of vertex indices, one for each connected part.
+    :rtype: list
+    """
+    from array import array
+
+    tot_edge = len(mesh.edges)
+    edge_verts = array('i', [0]) * (tot_edge * 2)
+    mesh.edges.foreach_get("vertices", edge_verts)
+
+    def item_keys():
+        for j in range(0, tot_edge * 2, 2):
+            # both vertices of an edge share the edge as a key
+            yield edge_verts[j], j
+            yield edge_verts[j + 1], j
 
-    # Build vert face connectivity
-    vert_faces = [[] for i in range(len(mesh.vertices))]
-    for f in mesh.tessfaces:
-        for v in f.vertices:
-            vert_faces[v].append(f)
-
-    # sort faces into connectivity groups
-    face_groups = [[f] for f in mesh.tessfaces]
-    # map old, new face location
-    face_mapping = list(range(len(mesh.tessfaces)))
-
-    # Now clump faces iteratively
-    ok = True
-    while ok:
-        ok = False
-
-        for i, f in enumerate(mesh.tessfaces):
-            mapped_index = face_mapping[f.index]
-            mapped_group = face_groups[mapped_index]
-
-            for v in f.vertices:
-                for nxt_f in vert_faces[v]:
-                    if nxt_f != f:
-                        nxt_mapped_index = face_mapping[nxt_f.index]
-
-                        # We are not a part of the same group
-                        if mapped_index != nxt_mapped_index:
-                            ok = True
-
-                            # Assign mapping to this group so they
-                            # all map to this group
-                            for grp_f in face_groups[nxt_mapped_index]:
-                                face_mapping[grp_f.index] = mapped_index
-
-                            # Move faces into this group
-                            mapped_group.extend(face_groups[nxt_mapped_index])
-
-                            # remove reference to the list
-                            face_groups[nxt_mapped_index] = None
-
-    # return all face groups that are not null
-    # this is all the faces that are connected in their own lists.
-    return [fg for fg in face_groups if fg]
+    return _linked_groups(len(mesh.vertices), item_keys())
 
 
 def edge_face_count_dict(mesh):
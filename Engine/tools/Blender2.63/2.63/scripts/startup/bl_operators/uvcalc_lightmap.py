@@ -188,6 +188,68 @@ class prettyface(object):
         return self.width, self.height
 
 
+def pair_triangles(tri_lengths):
+    """
+    Pair up triangles with similar edge lengths, returns a list of
+    (tri, tri_or_None) tuples.
+
+    Triangles are sorted by their ordered edge lengths so similar ones end up
+    close together, each one is then paired with the best match among the next
+    few unpaired triangles instead of searching all of them.
+    """
+    # number of unpaired triangles compared with each triangle
+    search_len = 64
+
+    def trilensdiff(t1, t2):
+        return (abs(t1[1][t1[2][0]] - t2[1][t2[2][0]]) +
+                abs(t1[1][t1[2][1]] - t2[1][t2[2][1]]) +
+                abs(t1[1][t1[2][2]] - t2[1][t2[2][2]]))
+
+    tris = sorted(tri_lengths, key=lambda t: (t[1][t[2][2]], t[1][t[2][1]], t[1][t[2][0]]))
+    tot = len(tris)
+
+    # linked list of the unpaired triangles, in sorted order
+    next_index = list(range(1, tot + 1))
+    prev_index = list(range(-1, tot - 1))
+    paired = [False] * tot
+
+    def unlink(i):
+        paired[i] = True
+        n = next_index[i]
+        p = prev_index[i]
+        if p != -1:
+            next_index[p] = n
+        if n != tot:
+            prev_index[n] = p
+
+    pairs = []
+    for i, tri1 in enumerate(tris):
+        if paired[i]:
+            continue
+        unlink(i)
+
+        best_tri_index = -1
+        best_tri_diff = 100000000.0
+
+        j = next_index[i]
+        for _ in range(search_len):
+            if j == tot:
+                break
+            diff = trilensdiff(tri1, tris[j])
+            if diff < best_tri_diff:
+                best_tri_index = j
+                best_tri_diff = diff
+            j = next_index[j]
+
+        if best_tri_index == -1:
+            pairs.append((tri1, None))
+        else:
+            unlink(best_tri_index)
+            pairs.append((tri1, tris[best_tri_index]))
+
+    return pairs
+
+
 def lightmap_uvpack(meshes,
                       PREF_SEL_ONLY=True,
                       PREF_NEW_UVLAYER=False,
@@ -195,40 +257,36 @@ def lightmap_uvpack(meshes,
                       PREF_APPLY_IMAGE=False,
                       PREF_IMG_PX_SIZE=512,
                       PREF_BOX_DIV=8,
-                      PREF_MARGIN_DIV=512
+                      PREF_MARGIN_DIV=512,
+                      progress=None,
                       ):
     '''
     BOX_DIV if the maximum division of the UV map that
     a box may be consolidated into.
     Basically, a lower value will be slower but waist less space
     and a higher value will have more clumpy boxes but more wasted space
+
+    progress is an optional function called with the completed factor (0-1),
+    when it returns True the unwrap is canceled and False is returned.
+    UVs of all the face groups are only written after the last check, so a
+    canceled unwrap leaves the UVs as they were (new UV maps are already
+    added though).
     '''
     import time
+    from array import array
     from math import sqrt
 
     if not meshes:
-        return
+        return True
 
     t = time.time()
 
     if PREF_PACK_IN_ONE:
-        if PREF_APPLY_IMAGE:
-            image = bpy.data.images.new(name="lightmap", width=PREF_IMG_PX_SIZE, height=PREF_IMG_PX_SIZE, alpha=False)
-        face_groups = [[]]
+        face_groups = [([], [], [], [])]
     else:
         face_groups = []
 
     for me in meshes:
-        if PREF_SEL_ONLY:
-            faces = [f for f in me.polygons if f.select]
-        else:
-            faces = me.polygons[:]
-
-        if PREF_PACK_IN_ONE:
-            face_groups[0].extend(faces)
-        else:
-            face_groups.append(faces)
-
         if PREF_NEW_UVLAYER:
             me.uv_textures.new()
 
@@ -237,69 +295,94 @@ def lightmap_uvpack(meshes,
         if not me.uv_textures:
             me.uv_textures.new()
 
-    for face_sel in face_groups:
-        print("\nStarting unwrap")
+        # read the polygon data in bulk
+        polygons = me.polygons
+        tot_poly = len(polygons)
+
+        cos = array('f', [0.0]) * (len(me.vertices) * 3)
+        me.vertices.foreach_get("co", cos)
+        loop_verts = array('i', [0]) * len(me.loops)
+        me.loops.foreach_get("vertex_index", loop_verts)
+        loop_starts = array('i', [0]) * tot_poly
+        polygons.foreach_get("loop_start", loop_starts)
+        loop_totals = array('i', [0]) * tot_poly
+        polygons.foreach_get("loop_total", loop_totals)
+        areas = array('f', [0.0]) * tot_poly
+        polygons.foreach_get("area", areas)
 
-        if len(face_sel) < 4:
-            print("\tWarning, less then 4 faces, skipping")
-            continue
-
-        pretty_faces = [prettyface(f) for f in face_sel if f.loop_total == 4]
-
-        # Do we have any triangles?
-        if len(pretty_faces) != len(face_sel):
-
-            # Now add triangles, not so simple because we need to pair them up.
-            def trylens(f):
-                # f must be a tri
-
-                # cos = [v.co for v in f]
-                cos = [f.id_data.vertices[v].co for v in f.vertices]  # XXX25
+        if PREF_SEL_ONLY:
+            select = [False] * tot_poly
+            polygons.foreach_get("select", select)
+            indices = [i for i in range(tot_poly) if select[i]]
+        else:
+            indices = range(tot_poly)
 
-                lens = [(cos[0] - cos[1]).length, (cos[1] - cos[2]).length, (cos[2] - cos[0]).length]
+        if PREF_PACK_IN_ONE:
+            faces, quads, tris, face_areas = face_groups[0]
+        else:
+            faces, quads, tris, face_areas = [], [], [], []
+            face_groups.append((faces, quads, tris, face_areas))
+
+        for i in indices:
+            f = polygons[i]
+            faces.append(f)
+            face_areas.append(areas[i])
+
+            if loop_totals[i] == 4:
+                quads.append(f)
+            elif loop_totals[i] == 3:
+                # f, edge lengths, (len_min, len_mid, len_max) indices
+                v1, v2, v3 = [loop_verts[l] * 3 for l in range(loop_starts[i], loop_starts[i] + 3)]
+                x1, y1, z1 = cos[v1:v1 + 3]
+                x2, y2, z2 = cos[v2:v2 + 3]
+                x3, y3, z3 = cos[v3:v3 + 3]
+                lens = [sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2),
+                        sqrt((x2 - x3) ** 2 + (y2 - y3) ** 2 + (z2 - z3) ** 2),
+                        sqrt((x3 - x1) ** 2 + (y3 - y1) ** 2 + (z3 - z1) ** 2)]
 
                 lens_min = lens.index(min(lens))
                 lens_max = lens.index(max(lens))
-                for i in range(3):
-                    if i != lens_min and i != lens_max:
-                        lens_mid = i
+                for j in range(3):
+                    if j != lens_min and j != lens_max:
+                        lens_mid = j
                         break
-                lens_order = lens_min, lens_mid, lens_max
-
-                return f, lens, lens_order
+                tris.append((f, lens, (lens_min, lens_mid, lens_max)))
 
-            tri_lengths = [trylens(f) for f in face_sel if f.loop_total == 3]
-            del trylens
+    # written once nothing can cancel anymore
+    placements = []
 
-            def trilensdiff(t1, t2):
-                return (abs(t1[1][t1[2][0]] - t2[1][t2[2][0]]) +
-                        abs(t1[1][t1[2][1]] - t2[1][t2[2][1]]) +
-                        abs(t1[1][t1[2][2]] - t2[1][t2[2][2]]))
+    tot_groups = len(face_groups)
+    for group_index, (face_sel, quads, tri_lengths, face_areas) in enumerate(face_groups):
+        print("\nStarting unwrap")
 
-            while tri_lengths:
-                tri1 = tri_lengths.pop()
+        if len(face_sel) < 4:
+            print("\tWarning, less then 4 faces, skipping")
+            continue
 
-                if not tri_lengths:
-                    pretty_faces.append(prettyface((tri1, None)))
-                    break
+        if progress:
+            def group_progress(fac):
+                return progress((group_index + fac) / tot_groups)
+        else:
+            group_progress = None
 
-                best_tri_index = -1
-                best_tri_diff = 100000000.0
+        pretty_faces = [prettyface(f) for f in quads]
 
-                for i, tri2 in enumerate(tri_lengths):
-                    diff = trilensdiff(tri1, tri2)
-                    if diff < best_tri_diff:
-                        best_tri_index = i
-                        best_tri_diff = diff
+        # Do we have any triangles?
+        if tri_lengths:
+            # Now add triangles, not so simple because we need to pair them up.
+            print("\tPairing %d triangles..." % len(tri_lengths), end="")
+            pretty_faces.extend([prettyface(pair) for pair in pair_triangles(tri_lengths)])
+            print("done")
 
-                pretty_faces.append(prettyface((tri1, tri_lengths.pop(best_tri_index))))
+        if group_progress and group_progress(0.5):
+            print("canceled")
+            return False
 
         # Get the min, max and total areas
         max_area = 0.0
         min_area = 100000000.0
         tot_area = 0
-        for f in face_sel:
-            area = f.area
+        for area in face_areas:
             if area > max_area:
                 max_area = area
             if area < min_area:
@@ -488,6 +571,16 @@ def lightmap_uvpack(meshes,
         # print(margin_w, margin_h)
         print("done")
 
+        if group_progress and group_progress(0.9):
+            print("canceled")
+            return False
+
+        placements.append((face_sel, pretty_faces, boxes2Pack, packWidth, packHeight, margin_w, margin_h))
+
+    if PREF_PACK_IN_ONE and PREF_APPLY_IMAGE:
+        image = bpy.data.images.new(name="lightmap", width=PREF_IMG_PX_SIZE, height=PREF_IMG_PX_SIZE, alpha=False)
+
+    for face_sel, pretty_faces, boxes2Pack, packWidth, packHeight, margin_w, margin_h in placements:
         # Apply the boxes back to the UV coords.
         print("\twriting back UVs", end="")
         for i, box in enumerate(boxes2Pack):
@@ -511,6 +604,8 @@ def lightmap_uvpack(meshes,
 
     print("finished all %.2f " % (time.time() - t))
 
+    return True
+
     # Window.RedrawAll()
 
 
@@ -534,8 +629,24 @@ def unwrap(operator, context, **kwargs):
         operator.report({'ERROR'}, "No mesh object")
         return {'CANCELLED'}
 
+    # progress bar only where the window manager has one, the operator
+    # runs blocking so it can't cancel, that's left to scripts calling
+    # lightmap_uvpack with their own progress function
+    wm = context.window_manager
+    use_progress = hasattr(wm, "progress_begin")
+    if use_progress:
+        def progress(fac):
+            wm.progress_update(fac)
+            return False
+
+        wm.progress_begin(0.0, 1.0)
+        kwargs["progress"] = progress
+
     lightmap_uvpack(meshes, **kwargs)
 
+    if use_progress:
+        wm.progress_end()
+
     if is_editmode:
         bpy.ops.object.mode_set(mode='EDIT', toggle=False)
 
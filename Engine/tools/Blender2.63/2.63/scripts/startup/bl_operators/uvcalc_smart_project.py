@@ -130,7 +130,7 @@ def island2Edge(island):
     unique_points= {}
 
     for f in island:
-        f_uvkey= map(tuple, f.uv)
+        f_uvkey= list(map(tuple, f.uv))
 
 
         for vIdx, edkey in enumerate(f.edge_keys):
@@ -142,7 +142,7 @@ def island2Edge(island):
                 i1= vIdx;	i2= vIdx-1
 
             try:	edges[ f_uvkey[i1], f_uvkey[i2] ] *= 0 # sets any edge with more then 1 user to 0 are not returned.
-            except:	edges[ f_uvkey[i1], f_uvkey[i2] ] = (f.uv[i1] - f.uv[i2]).length,
+            except:	edges[ f_uvkey[i1], f_uvkey[i2] ] = (f.uv[i1] - f.uv[i2]).length
 
     # If 2 are the same then they will be together, but full [a,b] order is not correct.
 
@@ -184,7 +184,59 @@ def pointInEdges(pt, edges):
     return intersectCount % 2
 """
 
-def pointInIsland(pt, island):
+class UvIslandGrid(object):
+    '''
+    Buckets the outline edges and the faces of a UV island in a uniform grid,
+    so intersection tests only look at the edges and faces near a point or
+    an edge instead of the whole island.
+    '''
+    __slots__ = "size", "edges", "faces"
+
+    def __init__(self, w, h, tot_edges):
+        # roughly one edge per cell along the island outline
+        self.size = max(w, h, SMALL_NUM) / max(1.0, tot_edges ** 0.5)
+        self.edges = {}
+        self.faces = {}
+
+    def cells(self, minx, miny, maxx, maxy):
+        size = self.size
+        xmin = int(minx // size)
+        xmax = int(maxx // size)
+        ymin = int(miny // size)
+        ymax = int(maxy // size)
+        return [(x, y) for x in range(xmin, xmax + 1) for y in range(ymin, ymax + 1)]
+
+    def addEdge(self, ed):
+        v1, v2 = ed[0], ed[1]
+        for key in self.cells(min(v1.x, v2.x), min(v1.y, v2.y), max(v1.x, v2.x), max(v1.y, v2.y)):
+            try:	self.edges[key].append(ed)
+            except:	self.edges[key] = [ed]
+
+    def addFace(self, f):
+        xs = [uv.x for uv in f.uv]
+        ys = [uv.y for uv in f.uv]
+        for key in self.cells(min(xs), min(ys), max(xs), max(ys)):
+            try:	self.faces[key].append(f)
+            except:	self.faces[key] = [f]
+
+    def edgesNear(self, v1, v2):
+        found = {}
+        edges = self.edges
+        for key in self.cells(min(v1.x, v2.x), min(v1.y, v2.y), max(v1.x, v2.x), max(v1.y, v2.y)):
+            if key in edges:
+                for ed in edges[key]:
+                    found[id(ed)] = ed
+        return found.values()
+
+    def facesAt(self, pt):
+        size = self.size
+        return self.faces.get((int(pt.x // size), int(pt.y // size)), ())
+
+
+def pointInIsland(pt, island, grid=None):
+    if grid:
+        island = grid.facesAt(pt)
+
     vec1, vec2, vec3 = Vector(), Vector(), Vector()
     for f in island:
         vec1.x, vec1.y = f.uv[0]
@@ -207,15 +259,18 @@ def pointInIsland(pt, island):
 def islandIntersectUvIsland(source, target, SourceOffset):
     # Is 1 point in the box, inside the vertLoops
     edgeLoopsSource = source[6] # Pretend this is offset
-    edgeLoopsTarget = target[6]
+    targetGrid = target[8]
 
-    # Edge intersect test
+    # Edge intersect test, only against the target edges in the grid cells
+    # the source edge passes through
     for ed in edgeLoopsSource:
-        for seg in edgeLoopsTarget:
+        v1 = SourceOffset+ed[0]
+        v2 = SourceOffset+ed[1]
+        for seg in targetGrid.edgesNear(v1, v2):
             i = geometry.intersect_line_line_2d(seg[0],
                                                 seg[1],
-                                                SourceOffset+ed[0],
-                                                SourceOffset+ed[1],
+                                                v1,
+                                                v2,
                                                 )
             if i:
                 return 1 # LINE INTERSECTION
@@ -223,13 +278,18 @@ def islandIntersectUvIsland(source, target, SourceOffset):
     # 1 test for source being totally inside target
     SourceOffset.resize_3d()
     for pv in source[7]:
-        if pointInIsland(pv+SourceOffset, target[0]):
+        if pointInIsland(pv+SourceOffset, target[0], targetGrid):
             return 2 # SOURCE INSIDE TARGET
 
     # 2 test for a part of the target being totally inside the source.
+    # Only target points inside the source bounds can be inside it.
+    sourceW = source[4]
+    sourceH = source[5]
     for pv in target[7]:
-        if pointInIsland(pv-SourceOffset, source[0]):
-            return 3 # PART OF TARGET INSIDE SOURCE.
+        pv = pv-SourceOffset
+        if 0.0 <= pv.x <= sourceW and 0.0 <= pv.y <= sourceH:
+            if pointInIsland(pv, source[0], source[8]):
+                return 3 # PART OF TARGET INSIDE SOURCE.
 
     return 0 # NO INTERSECTION
 
@@ -376,7 +436,14 @@ def mergeUvIslands(islandList):
         # UV Edge list used for intersections as well as unique points.
         edges, uniqueEdgePoints = island2Edge(islandList[islandIdx])
 
-        decoratedIslandList.append([islandList[islandIdx], totFaceArea, efficiency, islandBoundsArea, w,h, edges, uniqueEdgePoints])
+        # Spatial index of the edges and faces for the intersection tests.
+        grid = UvIslandGrid(w, h, len(edges))
+        for ed in edges:
+            grid.addEdge(ed)
+        for f in islandList[islandIdx]:
+            grid.addFace(f)
+
+        decoratedIslandList.append([islandList[islandIdx], totFaceArea, efficiency, islandBoundsArea, w,h, edges, uniqueEdgePoints, grid])
 
 
     # Sort by island bounding box area, smallest face area first.
@@ -408,7 +475,6 @@ def mergeUvIslands(islandList):
     removedCount = 0
 
     areaIslandIdx = 0
-    ctrl = Window.Qual.CTRL
     BREAK= False
     while areaIslandIdx < len(decoratedIslandListAreaSort) and not BREAK:
         sourceIsland = decoratedIslandListAreaSort[areaIslandIdx]
@@ -419,10 +485,6 @@ def mergeUvIslands(islandList):
             efficIslandIdx = 0
             while efficIslandIdx < len(decoratedIslandListEfficSort) and not BREAK:
 
-                if Window.GetKeyQualifiers() & ctrl:
-                    BREAK= True
-                    break
-
                 # Now we have 2 islands, if the efficiency of the islands lowers theres an
                 # increasing likely hood that we can fit merge into the bigger UV island.
                 # this ensures a tight fit.
@@ -518,6 +580,7 @@ def mergeUvIslands(islandList):
                                 for f in sourceIsland[0]:
                                     for uv in f.uv:
                                         uv+= offset
+                                    targetIsland[8].addFace(f)
 
                                 sourceIsland[0][:] = [] # Empty
 
@@ -525,12 +588,16 @@ def mergeUvIslands(islandList):
                                 # Move edge loop into new and offset.
                                 # targetIsland[6].extend(sourceIsland[6])
                                 #while sourceIsland[6]:
-                                targetIsland[6].extend( [ (\
+                                movedEdges = [ (\
                                      (e[0]+offset, e[1]+offset, e[2])\
-                                ) for e in sourceIsland[6] ] )
+                                ) for e in sourceIsland[6] ]
+                                targetIsland[6].extend(movedEdges)
 
                                 sourceIsland[6][:] = [] # Empty
 
+                                for e in movedEdges:
+                                    targetIsland[8].addEdge(e)
+
                                 # Sort by edge length, reverse so biggest are first.
 
                                 try:	 targetIsland[6].sort(key = lambda A: A[2])
@@ -598,58 +665,40 @@ def getUvIslands(faceGroups, me):
         if not faces:
             continue
 
-        # Build edge dict
-        edge_users = {}
+        # Union-find over the faces, joining faces that share an edge
+        # that is not a seam.
+        face_parent = list(range(len(faces)))
+
+        def find(i):
+            while face_parent[i] != i:
+                face_parent[i] = face_parent[face_parent[i]]
+                i = face_parent[i]
+            return i
 
+        edge_face = {}
         for i, f in enumerate(faces):
             for ed_key in f.edge_keys:
                 if ed_key in edge_seams: # DELIMIT SEAMS! ;)
-                    edge_users[ed_key] = [] # so as not to raise an error
-                else:
-                    try:		edge_users[ed_key].append(i)
-                    except:		edge_users[ed_key] = [i]
-
-        # Modes
-        # 0 - face not yet touched.
-        # 1 - added to island list, and need to search
-        # 2 - touched and searched - don't touch again.
-        face_modes = [0] * len(faces) # initialize zero - untested.
-
-        face_modes[0] = 1 # start the search with face 1
-
-        newIsland = []
-
-        newIsland.append(faces[0])
-
-
-        ok = True
-        while ok:
-
-            ok = True
-            while ok:
-                ok= False
-                for i in range(len(faces)):
-                    if face_modes[i] == 1: # search
-                        for ed_key in faces[i].edge_keys:
-                            for ii in edge_users[ed_key]:
-                                if i != ii and face_modes[ii] == 0:
-                                    face_modes[ii] = ok = 1 # mark as searched
-                                    newIsland.append(faces[ii])
-
-                        # mark as searched, don't look again.
-                        face_modes[i] = 2
-
-            islandList.append(newIsland)
-
-            ok = False
-            for i in range(len(faces)):
-                if face_modes[i] == 0:
-                    newIsland = []
-                    newIsland.append(faces[i])
-
-                    face_modes[i] = ok = 1
-                    break
-            # if not ok will stop looping
+                    continue
+                ii = edge_face.setdefault(ed_key, i)
+                if ii != i:
+                    root1 = find(i)
+                    root2 = find(ii)
+                    if root1 != root2:
+                        face_parent[root1] = root2
+
+        # Collect the islands in the order of their first face
+        island_index = {}
+        groupIslands = []
+        for i, f in enumerate(faces):
+            root = find(i)
+            try:
+                groupIslands[island_index[root]].append(f)
+            except KeyError:
+                island_index[root] = len(groupIslands)
+                groupIslands.append([f])
+
+        islandList.extend(groupIslands)
 
 #XXX	Window.DrawProgressBar(0.1, 'Optimizing Rotation for %i UV Islands' % len(islandList))
 
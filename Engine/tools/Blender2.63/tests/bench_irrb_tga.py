@@ -0,0 +1,50 @@
+# Benchmark for the TGA encoder used by the irrb exporter for packed
+# textures.
+#
+#   blender -b -noaudio -P bench_irrb_tga.py -- [size]
+#
+# Writes size x size (default 2048) 32 bit images with writeTGA() and
+# reports the time and file size for noise, banded, flat and float pixels.
+
+import sys, os, time, random, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons'))
+
+import io_export_irrlicht as irrb
+
+class Image:
+    # the bpy.types.Image attributes writeTGA() uses
+    def __init__(self, size, pixels):
+        self.size = (size, size)
+        self.depth = 32
+        self.pixels = pixels
+
+def makePixels(kind, size):
+    count = size * size * 4
+    if kind == 'noise':
+        return [random.randrange(256) / 255.0 for i in range(count)]
+    elif kind == 'banded':
+        return [((i // 4) // 37 % 7) * 36 / 255.0 for i in range(count)]
+    elif kind == 'flat':
+        return [128 / 255.0] * count
+    return [((i // 4) // 37 % 7) / 7.0 for i in range(count)]
+
+def main(size):
+    random.seed(0)
+    handle, fileName = tempfile.mkstemp(suffix='.tga')
+    os.close(handle)
+    try:
+        for kind in ('noise', 'banded', 'flat', 'float'):
+            image = Image(size, makePixels(kind, size))
+            start = time.time()
+            irrb.writeTGA(image, fileName)
+            elapsed = time.time() - start
+            print('{:>7}: {}x{} in {:.2f}s, {:.1f} MB'.format(kind, size,
+                size, elapsed, os.path.getsize(fileName) / (1024.0 * 1024.0)))
+    finally:
+        os.unlink(fileName)
+
+if __name__ == '__main__':
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(int(args[0]) if args else 2048)
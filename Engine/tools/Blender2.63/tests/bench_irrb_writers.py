@@ -0,0 +1,64 @@
+# Micro-benchmark for the chunked .irrmesh writers of the irrb exporter.
+#
+#   blender -b -noaudio -P bench_irrb_writers.py -- [vertex count]
+#
+# Fills mesh buffers with synthetic data and reports the vertices/second
+# written by iMeshBuffer.writeBufferData() (vertices, indices and skin
+# weights) for the standard, 2tcoords and tangents vertex types.
+
+import sys, os, time, io, array, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons'))
+
+import io_export_irrlicht as irrb
+
+VERTEX_TYPES = (('standard', irrb.EVT_STANDARD),
+    ('2tcoords', irrb.EVT_2TCOORDS), ('tangents', irrb.EVT_TANGENTS))
+
+def floats(count):
+    return array.array('f', [random.uniform(-1.0, 1.0) for i in range(count)])
+
+def makeBuffer(vtype, tverts):
+    # same state a buffer has when handed to a serialization worker
+    buffer = irrb.iMeshBuffer.__new__(irrb.iMeshBuffer)
+    tindices = (tverts - 2) * 3
+    weights = ('Armature.irrskel', array.array('I', range(tverts)),
+        array.array('I', [i % 32 for i in range(tverts)]), floats(tverts))
+    buffer.__setstate__({
+        'bufNumber': 0,
+        'uvMatName': 'bench',
+        'meshName': 'bench',
+        'vertexType': vtype,
+        'materialData': '',
+        'scolor': None,
+        'vIndices': array.array('i', range(tverts)),
+        'vPositions': floats(tverts * 3),
+        'vNormals': floats(tverts * 3),
+        'vColors': array.array('I', [random.getrandbits(32)
+            for i in range(tverts)]),
+        'vUV1': floats(tverts * 2),
+        'vUV2': floats(tverts * 2),
+        'vTangents': floats(tverts * 3),
+        'vBinormals': floats(tverts * 3),
+        'indices': array.array('I', [(i // 3) + (i % 3)
+            for i in range(tindices)]),
+        'skinWeights': [weights],
+        'morphTargets': []})
+    return buffer
+
+def main(tverts):
+    random.seed(0)
+    for name, vtype in VERTEX_TYPES:
+        buffer = makeBuffer(vtype, tverts)
+        file = io.StringIO()
+        start = time.time()
+        buffer.writeBufferData(file)
+        elapsed = time.time() - start
+        print('{:>8}: {} vertices in {:.3f}s, {:.0f} vertices/s, ' \
+            '{:.1f} MB'.format(name, tverts, elapsed, tverts / elapsed,
+            file.tell() / (1024.0 * 1024.0)))
+
+if __name__ == '__main__':
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(int(args[0]) if args else 200000)
@@ -0,0 +1,144 @@
+# Load generator for the netrender master.
+#
+#   blender -b -noaudio -P bench_netrender_master.py -- [slaves] [frames] [slow clients]
+#
+# Starts a master on a local port and simulates slaves that register, poll
+# /job for frames and upload a small render result for each of them, while
+# slow clients keep trickling request bodies to the master a few bytes at a
+# time. Reports the requests/second and the /job dispatch latency.
+
+import sys, os, time, json, socket, tempfile, threading, http.client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons'))
+
+import netrender.model
+import netrender.master
+
+# there's no blend file to read the resolution from
+netrender.master.MRenderJob.initInfo = lambda self: None
+
+PORT = 8765
+RESULT = b"x" * 65536
+IDLE_POLLS = 20 # /job requests without work before a slave stops
+IDLE_DELAY = 0.05
+
+def connect():
+    return http.client.HTTPConnection("127.0.0.1", PORT)
+
+def request(conn, method, url, body = None, headers = {}):
+    conn.request(method, url, body, headers)
+    response = conn.getresponse()
+    data = response.read()
+    return response, data
+
+def submitJob(frames):
+    job = netrender.model.RenderJob()
+    job.name = "bench"
+    job.chunks = 1
+    job.priority = 1
+
+    for number in range(1, frames + 1):
+        job.addFrame(number)
+
+    response, data = request(connect(), "POST", "/job", json.dumps(job.serialize()))
+    return response.getheader("job-id")
+
+def runSlave(index, job_id, stats):
+    conn = connect()
+
+    slave = netrender.model.RenderSlave()
+    slave.name = "bench_%i" % index
+    response, data = request(conn, "POST", "/slave", json.dumps(slave.serialize()))
+    slave_id = response.getheader("slave-id")
+
+    idle = 0
+    while idle < IDLE_POLLS:
+        start = time.time()
+        response, data = request(conn, "GET", "/job", headers = {"slave-id": slave_id})
+        stats.add(time.time() - start)
+
+        if response.status != http.client.OK:
+            idle += 1
+            time.sleep(IDLE_DELAY)
+            continue
+
+        idle = 0
+        for frame in json.loads(str(data, encoding='utf8'))["frames"]:
+            request(conn, "PUT", "/render", RESULT, headers = {
+                "slave-id": slave_id,
+                "job-id": job_id,
+                "job-frame": str(frame["number"]),
+                "job-result": str(netrender.model.FRAME_DONE),
+                "job-time": "0.1",
+                "content-length": str(len(RESULT))})
+            stats.add()
+
+def runSlowClient(stop):
+    # a client on a bad connection, registering a slave over two seconds
+    body = bytes(json.dumps(netrender.model.RenderSlave().serialize()), encoding='utf8')
+    while not stop.is_set():
+        s = socket.create_connection(("127.0.0.1", PORT))
+        s.sendall(bytes("POST /slave HTTP/1.0\r\ncontent-length: %i\r\n\r\n" % len(body), encoding='utf8'))
+        for i in range(0, len(body), 8):
+            s.sendall(body[i:i + 8])
+            time.sleep(2.0 * 8 / len(body))
+        s.recv(1024)
+        s.close()
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.latencies = []
+
+    def add(self, latency = None):
+        with self.lock:
+            self.requests += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+def main(slaves, frames, slow_clients):
+    stop = threading.Event()
+    master = threading.Thread(target = netrender.master.runMaster, kwargs = {
+        "address": ("127.0.0.1", PORT), "broadcast": False, "clear": True,
+        "force": False, "path": tempfile.mkdtemp(),
+        "update_stats": lambda *args: None, "test_break": stop.is_set})
+    master.start()
+    time.sleep(1)
+
+    stats = Stats()
+    slow_stop = threading.Event()
+    slow = [threading.Thread(target = runSlowClient, args = (slow_stop,)) for i in range(slow_clients)]
+    try:
+        job_id = submitJob(frames)
+
+        for thread in slow:
+            thread.start()
+
+        start = time.time()
+        threads = [threading.Thread(target = runSlave, args = (i, job_id, stats)) for i in range(slaves)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start - IDLE_POLLS * IDLE_DELAY
+    finally:
+        slow_stop.set()
+        for thread in slow:
+            if thread.is_alive():
+                thread.join()
+        stop.set()
+        master.join()
+
+    latencies = sorted(stats.latencies)
+    print("%i slaves, %i frames, %i slow clients: %.0f requests/s, /job latency p50 %.1fms p95 %.1fms max %.1fms" % (
+        slaves, frames, slow_clients, stats.requests / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.95)] * 1000,
+        latencies[-1] * 1000))
+
+if __name__ == "__main__":
+    args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    args = [int(arg) for arg in args] + [40, 2000, 4][len(args):]
+    main(*args)
@@ -0,0 +1,111 @@
+# Job file transfer benchmark for netrender.
+#
+#   blender -b -noaudio -P bench_netrender_transfer.py -- [size in MB]
+#
+# Starts a master on a local port, uploads a job file of random data to it
+# the way the client does, downloads it again the way a slave does and then
+# resumes an upload interrupted halfway. Reports the throughput of each
+# transfer and checks the files arrive intact.
+
+import sys, os, time, json, shutil, tempfile, threading, http.client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons'))
+
+import netrender.model
+import netrender.master
+import netrender.slave
+import netrender.utils
+
+PORT = 8766
+
+# there's no blend file to read the resolution from
+netrender.master.MRenderJob.initInfo = lambda self: None
+
+def report(name, size, elapsed, ok):
+    print("%s: %i MB in %.2fs, %.0f MB/s, %s" % (name, size >> 20, elapsed,
+        (size >> 20) / elapsed, "ok" if ok else "CORRUPTED"))
+
+def findFile(path, name):
+    for root, dirs, files in os.walk(path):
+        if name in files:
+            return os.path.join(root, name)
+
+def main(size_mb):
+    size = size_mb << 20
+    master_path = tempfile.mkdtemp()
+    work_path = tempfile.mkdtemp()
+
+    stop = threading.Event()
+    master = threading.Thread(target = netrender.master.runMaster, kwargs = {
+        "address": ("127.0.0.1", PORT), "broadcast": False, "clear": True,
+        "force": False, "path": master_path,
+        "update_stats": lambda *args: None, "test_break": stop.is_set})
+    master.start()
+    time.sleep(1)
+
+    try:
+        file_path = os.path.join(work_path, "scene.blend")
+        with open(file_path, "wb") as f:
+            for i in range(size_mb):
+                f.write(os.urandom(1 << 20))
+        signature = netrender.utils.hashFile(file_path)
+
+        conn = http.client.HTTPConnection("127.0.0.1", PORT)
+
+        job = netrender.model.RenderJob()
+        job.name = "bench"
+        job.priority = 1
+        job.addFile(file_path, signed = False)
+        job.files[0].signature = signature
+        job.addFrame(1)
+
+        conn.request("POST", "/job", json.dumps(job.serialize()))
+        response = conn.getresponse()
+        response.read()
+        job_id = response.getheader("job-id")
+        url = netrender.utils.fileURL(job_id, 0)
+
+        # upload
+        start = time.time()
+        netrender.utils.uploadFile(conn, url, file_path)
+        elapsed = time.time() - start
+        master_file = findFile(master_path, "scene.blend")
+        report("upload", size, elapsed, netrender.utils.hashFile(master_file) == signature)
+
+        # download
+        slave = netrender.model.RenderSlave()
+        slave.name = "bench"
+        conn.request("POST", "/slave", json.dumps(slave.serialize()))
+        response = conn.getresponse()
+        response.read()
+        slave_id = response.getheader("slave-id")
+
+        rfile = netrender.model.RenderFile(file_path, 0, 0, 0, signature)
+        rfile.force = True
+        slave_path = os.path.join(work_path, "slave")
+        os.mkdir(slave_path)
+
+        start = time.time()
+        slave_file = netrender.slave.testFile(conn, job_id, slave_id, rfile, slave_path)
+        elapsed = time.time() - start
+        report("download", size, elapsed, bool(slave_file) and netrender.utils.hashFile(slave_file) == signature)
+
+        # resumed upload, the master kept the first half
+        with open(master_file, "r+b") as f:
+            f.truncate(size // 2)
+
+        start = time.time()
+        netrender.utils.sendFile(conn, "PUT", url, file_path, offset = size // 2)
+        netrender.utils.responseStatus(conn)
+        elapsed = time.time() - start
+        report("resumed upload", size - size // 2, elapsed, netrender.utils.hashFile(master_file) == signature)
+    finally:
+        stop.set()
+        master.join()
+        shutil.rmtree(work_path)
+        shutil.rmtree(master_path)
+
+if __name__ == "__main__":
+    args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    main(int(args[0]) if args else 256)
@@ -0,0 +1,142 @@
+# Benchmark for the DirectX .x importer, text versus binary files.
+#
+#   blender -b -noaudio -P bench_x_import.py -- [size]
+#
+# Writes the same size x size (default 200) vertex grid mesh with texture
+# coordinates as a text, a binary ('bin ') and an MSZIP compressed binary
+# ('bzip') .x file, imports each of them with import_x.load() and reports
+# the file size and import time. The meshes handed to bel.mesh.write() have
+# to match the text import.
+
+import sys, os, math, time, struct, zlib, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons_contrib'))
+
+import bpy
+from mathutils import Matrix
+
+import io_directx_bel.bel.mesh
+from io_directx_bel import import_x
+
+IDENTITY = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0,
+            0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+def makeGrid(size):
+    verts = [(x / size, y / size, 0.1 * math.sin(x * 0.3) * math.cos(y * 0.2))
+        for y in range(size) for x in range(size)]
+    faces = [(i, i + 1, i + size + 1, i + size)
+        for i in range(size * (size - 1)) if i % size != size - 1]
+    uvs = [(x / (size - 1.0), y / (size - 1.0))
+        for y in range(size) for x in range(size)]
+    return verts, faces, uvs
+
+def writeText(verts, faces, uvs):
+    out = ['xof 0303txt 0032\n',
+        'Frame Root {\n FrameTransformMatrix {\n  ',
+        ','.join('%f' % v for v in IDENTITY), ';;\n }\n',
+        ' Mesh Grid {\n  %d;\n' % len(verts),
+        ',\n'.join('  %f;%f;%f;' % v for v in verts), ';\n',
+        '  %d;\n' % len(faces),
+        ',\n'.join('  %d;%s;' % (len(f), ','.join(str(i) for i in f)) for f in faces), ';\n',
+        '  MeshTextureCoords {\n   %d;\n' % len(uvs),
+        ',\n'.join('   %f;%f;' % uv for uv in uvs), ';\n  }\n',
+        ' }\n}\n']
+    return bytes(''.join(out), 'ascii')
+
+# binary tokens
+def token(kind):
+    return struct.pack('<H', kind)
+
+def name(value):
+    data = bytes(value, 'ascii')
+    return token(1) + struct.pack('<L', len(data)) + data
+
+def integers(values):
+    return token(6) + struct.pack('<L%dL' % len(values), len(values), *values)
+
+def floats(values):
+    return token(7) + struct.pack('<L%df' % len(values), len(values), *values)
+
+OPEN, CLOSE = token(10), token(11)
+
+def writeBinary(verts, faces, uvs):
+    indices = []
+    for f in faces:
+        indices.append(len(f))
+        indices.extend(f)
+
+    return b''.join([b'xof 0303bin 0032',
+        name('Frame'), name('Root'), OPEN,
+        name('FrameTransformMatrix'), OPEN, floats(IDENTITY), CLOSE,
+        name('Mesh'), name('Grid'), OPEN,
+        integers([len(verts)]), floats([c for v in verts for c in v]),
+        integers([len(faces)] + indices),
+        name('MeshTextureCoords'), OPEN,
+        integers([len(uvs)]), floats([c for uv in uvs for c in uv]),
+        CLOSE, CLOSE, CLOSE])
+
+def compress(data, kind):
+    # MSZIP: the uncompressed size, then 'CK' deflate blocks of up to 32k
+    out = [data[:8], kind, data[12:16], struct.pack('<L', len(data))]
+    body = data[16:]
+    for i in range(0, len(body), 32768):
+        block = body[i:i + 32768]
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        packed = b'CK' + compressor.compress(block) + compressor.flush()
+        out.append(struct.pack('<HH', len(block), len(packed)) + packed)
+    return b''.join(out)
+
+def same(a, b):
+    # text files hold 6 decimals, binary ones 32 bit floats
+    if isinstance(a, float) or isinstance(b, float):
+        return abs(a - b) < 1e-5
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def main(size):
+    grid = makeGrid(size)
+    binary = writeBinary(*grid)
+    files = (('text', writeText(*grid)), ('bin', binary),
+        ('bzip', compress(binary, b'bzip')))
+
+    # keep what the importer hands over to build each mesh
+    imported = []
+    write = io_directx_bel.bel.mesh.write
+    def recordWrite(obname, name, verts, edges, faces, matslots, mats, uvs, *args):
+        imported.append([verts, faces, uvs])
+        return write(obname, name, verts, edges, faces, matslots, mats, uvs, *args)
+    io_directx_bel.bel.mesh.write = recordWrite
+
+    print('{} vertices, {} faces'.format(len(grid[0]), len(grid[1])))
+    meshes = {}
+    try:
+        for kind, data in files:
+            handle, fileName = tempfile.mkstemp(suffix='.x')
+            os.write(handle, data)
+            os.close(handle)
+            try:
+                del imported[:]
+                start = time.time()
+                import_x.load(None, bpy.context, fileName,
+                    global_matrix=Matrix())
+                elapsed = time.time() - start
+            finally:
+                os.unlink(fileName)
+
+            meshes[kind] = imported[:]
+            if not meshes[kind]:
+                result = 'NO MESH'
+            elif same(meshes[kind], meshes['text']):
+                result = 'same mesh'
+            else:
+                result = 'DIFFERENT MESH'
+            print('{:>5}: {:.1f} MB in {:.2f}s, {}'.format(kind,
+                len(data) / (1024.0 * 1024.0), elapsed, result))
+    finally:
+        io_directx_bel.bel.mesh.write = write
+
+if __name__ == '__main__':
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    main(int(args[0]) if args else 200)
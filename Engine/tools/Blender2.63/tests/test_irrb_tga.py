@@ -0,0 +1,130 @@
+# Correctness test for the TGA encoder used by the irrb exporter for packed
+# textures.
+#
+#   blender -b -noaudio -P test_irrb_tga.py
+#
+# Images are encoded with _encodeTGA() and decoded again by the minimal TGA
+# reader below, the pixels have to match the quantized source pixels.
+
+import sys, os, array, random, struct, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    '..', '2.63', 'scripts', 'addons'))
+
+import io_export_irrlicht as irrb
+
+def decodeTGA(data):
+    """Returns (width, height, bpp, bgr(a) bytes) of an uncompressed or run
+    length encoded true color TGA, checks RLE packets don't cross rows"""
+    (idLength, colorMapType, imageType, mapStart, mapLength, mapDepth,
+        xOrigin, yOrigin, width, height, bpp, descriptor) = \
+        struct.unpack_from('<BBBHHBHHHHBB', data)
+    assert idLength == 0 and colorMapType == 0
+    assert descriptor == (8 if bpp == 32 else 0)
+
+    psize = bpp // 8
+    offset = 18 + idLength
+    if imageType == 2:
+        return width, height, bpp, data[offset:offset + width * height * psize]
+
+    assert imageType == 10
+    pixels = bytearray()
+    for y in range(height):
+        x = 0
+        while x < width:
+            packet = data[offset]
+            offset += 1
+            count = (packet & 0x7f) + 1
+            if packet & 0x80:
+                pixels += data[offset:offset + psize] * count
+                offset += psize
+            else:
+                pixels += data[offset:offset + psize * count]
+                offset += psize * count
+            x += count
+        assert x == width, 'packet crosses row {}'.format(y)
+    assert offset == len(data)
+
+    return width, height, bpp, bytes(pixels)
+
+def expectedPixels(pixels, bpp):
+    values = [int(min(max(v, 0.0), 1.0) * 255.0 + 0.5) for v in pixels]
+    result = bytearray()
+    for i in range(0, len(values), 4):
+        result += bytes((values[i + 2], values[i + 1], values[i]))
+        if bpp == 32:
+            result.append(values[i + 3])
+    return bytes(result)
+
+def makePixels(kind, width, height):
+    count = width * height
+    if kind == 'noise':
+        return [random.randrange(256) / 255.0 for i in range(count * 4)]
+    elif kind == 'flat':
+        return [0.2, 0.4, 0.6, 1.0] * count
+    elif kind == 'runs':
+        # runs of all lengths, some longer than a 128 pixel packet
+        result = []
+        while len(result) < count * 4:
+            color = [random.randrange(4) / 3.0 for i in range(4)]
+            result += color * random.choice((1, 2, 3, 127, 128, 129, 300))
+        return result[:count * 4]
+    # float image, values outside [0, 1] are clamped
+    return [random.uniform(-0.5, 1.5) for i in range(count * 4)]
+
+class TestEncodeTGA(unittest.TestCase):
+    SIZES = ((1, 1), (2, 1), (7, 3), (129, 4), (300, 5))
+    KINDS = ('noise', 'flat', 'runs', 'float')
+
+    def setUp(self):
+        random.seed(7)
+        handle, self.fileName = tempfile.mkstemp(suffix='.tga')
+        os.close(handle)
+
+    def tearDown(self):
+        os.unlink(self.fileName)
+
+    def encode(self, width, height, bpp, pixels, rle):
+        irrb._encodeTGA(self.fileName, width, height, bpp,
+            array.array('f', pixels), rle)
+        file = open(self.fileName, 'rb')
+        data = file.read()
+        file.close()
+        return data
+
+    def test_roundtrip(self):
+        for width, height in self.SIZES:
+            for kind in self.KINDS:
+                pixels = makePixels(kind, width, height)
+                for bpp in (24, 32):
+                    for rle in (True, False):
+                        data = self.encode(width, height, bpp, pixels, rle)
+                        self.assertEqual(decodeTGA(data),
+                            (width, height, bpp, expectedPixels(pixels, bpp)),
+                            (width, height, kind, bpp, rle))
+
+    def test_runs_compress(self):
+        width, height = 256, 16
+        pixels = makePixels('flat', width, height)
+        data = self.encode(width, height, 32, pixels, True)
+        # two 128 pixel run packets per row
+        self.assertEqual(len(data), 18 + height * 2 * (1 + 4))
+
+    def test_writeTGA(self):
+        class Image:
+            size = (5, 3)
+            depth = 32
+            pixels = makePixels('runs', 5, 3)
+        self.assertEqual(irrb.writeTGA(Image, self.fileName), 0)
+        file = open(self.fileName, 'rb')
+        data = file.read()
+        file.close()
+        self.assertEqual(decodeTGA(data),
+            (5, 3, 32, expectedPixels(Image.pixels, 32)))
+
+        Image.depth = 8
+        self.assertEqual(irrb.writeTGA(Image, self.fileName), 1)
+
+if __name__ == '__main__':
+    result = unittest.main(argv=sys.argv[:1], exit=False).result
+    sys.exit(not result.wasSuccessful())